@@ -0,0 +1,8 @@
+"""SORCluster detects inversion clusters in SOR data and lines them up with nearby genes.
+
+detect_inversions   SOR and Cluster classes doing the detection math
+cluster_detect      runs detection per accession and writes the cluster files
+cluster_tools       Entrez downloads, GenBank parsing and gene matching
+analyze_clusters    runs gene matching per accession
+cli                 the invcluster command
+"""
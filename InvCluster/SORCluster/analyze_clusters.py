@@ -6,41 +6,148 @@
 # cluster position with the nearby genes.
 """
 
-import time
+import shutil
 
 # I keep my classes and junk in cluster_tools.py
-try:
-    from cluster_tools import *
-except ImportError:
-    print("Clustering tools file not found. Please ensure cluster_tools.py is in the proper directory.")
-    quit()
+from .cluster_tools import *
+from .cluster_detect import load_accession_list
+from .manifest import Manifest
+from .instrument import span
+from .columnar import gene_hits_parquet_path, write_gene_hits_parquet
+from .results_db import has_stage, store_annotation
+from .compressed import find_variant
+
+translations_filename = '__cluster_gene_translations_fasta.txt'
+params_filename = '__result_parameters.txt'
+
+
+# function annotate_accession lines up the clusters of one accession with its genes. The gene file must already
+# exist (see get_entrez_data and find_genes). Translations go to a per-accession fasta file next to the tsv so
+# accessions can be annotated independently; combine_translations gathers them up afterwards.
+# Gene matching is a manifest stage keyed on the cluster and gene files, ntol and max_genes, and is skipped when
+# none of those changed unless force is 'y'. parquet='y' also writes the gene hits as a Parquet file (see columnar),
+# and db names a results database to store the genes and gene hits in (see results_db).
+def annotate_accession(acc_num, gene_file, acc_path, ntol=100000, max_genes=6, draw_graphs='y', force='n',
+                       parquet='n', db=None):
+
+    # Define the file names
+    cluster_file = os.path.join(acc_path, acc_num+'.csv')
+    results_file = os.path.join(acc_path, acc_num+'.tsv')
+    trans_file = os.path.join(acc_path, acc_num+'_translations_fasta.txt')
+    graph_path = os.path.join(acc_path, 'Gene Diagrams')
+
+    manifest = Manifest(acc_path)
+    inputs = manifest.digest_inputs({'clusters': cluster_file, 'genes': gene_file})
+    params = {'ntol': ntol, 'max_genes': max_genes}
+
+    missing = parquet == 'y' and not os.path.exists(gene_hits_parquet_path(acc_path, acc_num))
+    missing = missing or (db is not None and not has_stage(db, acc_num, 'annotate'))
+
+    if force != 'y' and manifest.is_current('annotate', inputs, params) and not missing:
+        print("Gene matching for", acc_num, "is up to date.")
+    else:
+        print("Analyzing clusters for accession number", acc_num)
+
+        # If the translation file exists, delete it
+        if os.path.exists(trans_file):
+            os.remove(trans_file)
+
+        # Load the genes from the gene list onto a bug class
+        my_bug = Bug(accession_num=acc_num)
+        with span('load_genes', acc_num):
+            my_bug.load_genes_from_file(gene_file)
+
+        # Scan for clusters
+        with span('match', acc_num):
+            hits = match_clusters_to_genes(my_bug, cluster_file, results_file, trans_file, graph_path, ntol,
+                                           max_genes, draw_graphs='n')
+        if parquet == 'y':
+            write_gene_hits_parquet(acc_path, acc_num, hits)
+        if db is not None:
+            store_annotation(db, my_bug, hits, ntol, max_genes)
+        manifest.record('annotate', inputs, params, outputs=(results_file, trans_file))
+
+    if draw_graphs == 'y':
+        with span('render', acc_num):
+            render_accession_genes(acc_num, gene_file, acc_path, ntol, max_genes, overwrite=force)
+
+    return
+
+
+# function render_accession_genes draws the gene diagram of every cluster of an accession. It is its own manifest
+# stage, so the diagrams are only redrawn when the clusters, genes, ntol or max_genes changed.
+def render_accession_genes(acc_num, gene_file, acc_path, ntol=100000, max_genes=6, overwrite='n'):
+
+    cluster_file = os.path.join(acc_path, acc_num+'.csv')
+    graph_path = os.path.join(acc_path, 'Gene Diagrams')
+
+    manifest = Manifest(acc_path)
+    inputs = manifest.digest_inputs({'clusters': cluster_file, 'genes': gene_file})
+    params = {'ntol': ntol, 'max_genes': max_genes}
 
+    if overwrite != 'y' and manifest.is_current('render_genes', inputs, params):
+        print("Gene diagrams for", acc_num, "are up to date.")
+        return
 
-def align_clusters_to_genes(max_genes):
+    if not os.path.exists(graph_path):
+        os.makedirs(graph_path)
+
+    my_bug = Bug(accession_num=acc_num)
+    my_bug.load_genes_from_file(gene_file)
+    draw_gene_diagrams(my_bug, cluster_file, graph_path, ntol, max_genes, overwrite='y')
+
+    outputs = [gene_diagram_file(my_bug, cluster, graph_path) for cluster in load_cluster_positions(cluster_file)]
+    manifest.record('render_genes', inputs, params, outputs=outputs)
+
+    return
+
+
+# function combine_translations concatenates the per-accession translation files into the one Oggy uses
+def combine_translations(accessions_list, results_path):
+
+    translations_output = os.path.join(results_path, translations_filename)
+
+    with open(translations_output, 'w') as out:
+        for acc_num in accessions_list:
+            trans_file = os.path.join(results_path, acc_num, acc_num+'_translations_fasta.txt')
+            if os.path.exists(trans_file):
+                with open(trans_file, 'r') as f:
+                    shutil.copyfileobj(f, out)
+
+    return
+
+
+# function write_result_parameters records the annotation settings next to the results
+def write_result_parameters(accessions_input, results_path, ntol, max_genes):
+
+    params_file = os.path.join(results_path, params_filename)
+    with open(params_file, 'w') as f:
+        f.write("Accession list: " + accessions_input + '\n')
+        f.write("Nucleotide tolerance: " + str(ntol) + '\n')
+        f.write("Maximum nearby genes: " + str(max_genes) + '\n')
+
+    return
+
+
+def align_clusters_to_genes(max_genes, working_path=None, force='n'):
 
     # Define our folder and file names holding the data
     entrez_folder_name = 'Entrez Data'
     gene_folder_name = 'Gene Data'
     results_folder_name = 'Cluster Data'
     input_filename = 'accession_list.txt'
-    translations_filename = '__cluster_gene_translations_fasta.txt'
-    params_filename = '__result_parameters.txt'
-
 
     # Define our folder paths
-    desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
-    working_path = os.path.join(desktop_path, "Cluster Detection")
+    if working_path is None:
+        desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
+        working_path = os.path.join(desktop_path, "Cluster Detection")
     results_path = os.path.join(working_path, results_folder_name)
 
-
     entrez_path = os.path.join(working_path, entrez_folder_name)
     gene_path = os.path.join(working_path, gene_folder_name)
 
-
-
-
     # If our folder paths do not exist, make them.
-    paths = [desktop_path, entrez_path, gene_path, results_path]
+    paths = [entrez_path, gene_path, results_path]
     for path in paths:
         if not os.path.exists(path):
             os.makedirs(path)
@@ -48,38 +155,20 @@ def align_clusters_to_genes(max_genes):
 
     # Define our input files
     accessions_input = os.path.join(working_path, input_filename)
-    translations_output = os.path.join(results_path, translations_filename)
-
-    # If the translation file exists, delete it
-    if os.path.exists(translations_output):
-        os.remove(translations_output)
 
     # Define running variables
     ntol = 100000  # number of nucleotides to look at around given cluster position
-    max_genes = 6  # maximum number of genes to assign to a cluster
-    accessions_list = list()  # holds our input accession numbers
-    my_bugs = list()  # holds our bugs
 
     # Load the accession numbers
-    with open(accessions_input, 'r') as f:
-        for line in f:
-            accessions_list.append(line.split('\n')[0])
+    accessions_list = load_accession_list(accessions_input)
 
     # For each accession number...
     for acc_num in accessions_list:
 
-        print("Analyzing clusters for accession number", acc_num)
-
         # Define the file names
         acc_path = os.path.join(results_path, acc_num)
-        entrez_file = os.path.join(entrez_path, acc_num+'.txt')
-        gene_file = os.path.join(gene_path, acc_num+'.csv')
-        cluster_file = os.path.join(acc_path, acc_num+'.csv')
-        results_file = os.path.join(acc_path, acc_num+'.tsv')
-        graph_path = os.path.join(acc_path, 'Gene Diagrams')
-
-        if not os.path.exists(graph_path):
-            os.makedirs(graph_path)
+        entrez_file = find_variant(os.path.join(entrez_path, acc_num+'.txt'))
+        gene_file = find_variant(os.path.join(gene_path, acc_num+'.csv'))
 
         # Get Entrez Data, if necessary
         get_entrez_data(acc_num, entrez_file)
@@ -87,19 +176,11 @@ def align_clusters_to_genes(max_genes):
         # Generate the gene list, if necessary
         find_genes(acc_num, entrez_file, gene_file)
 
-        # Load the genes from the gene list onto a bug class
-        my_bug = Bug(accession_num=acc_num)
-        my_bug.load_genes_from_file(gene_file)
+        annotate_accession(acc_num, gene_file, acc_path, ntol, max_genes, force=force)
 
-        # Scan for clusters
-        match_clusters_to_genes(my_bug, cluster_file, results_file, translations_output, graph_path, ntol, max_genes)
+    combine_translations(accessions_list, results_path)
 
     # Create the parameters file
-    params_file = os.path.join(results_path, params_filename)
-    with open(params_file, 'w') as f:
-        f.write("Accession list: " + accessions_input + '\n')
-        f.write("Nucleotide tolerance: " + str(ntol) + '\n')
-        f.write("Maximum nearby genes: " + str(max_genes) + '\n')
+    write_result_parameters(accessions_input, results_path, ntol, max_genes)
 
-    x = time.clock()
-    print("Done! Operation took", x, "seconds.")
+    return
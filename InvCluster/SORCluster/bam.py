@@ -0,0 +1,257 @@
+"""bam reads SAM and BAM alignment files directly, so SOR data does not have to be exported to csv first. Reads are
+counted the same way the csv export counts them (TLEN not zero), and reads with any bit of a flag mask set are
+skipped as well (by default unmapped, secondary and supplementary alignments). Positions are 1-based like the POS
+column of the csv export.
+
+BAM files are read with a small pure python/numpy decoder: BGZF is a series of gzip members, which the gzip module
+streams for us, and the fixed-size fields of each record are picked out of the decompressed bytes with numpy.
+If pysam is installed, backend='pysam' reads through htslib instead. SAM files may be compressed (see compressed).
+"""
+
+import gzip
+import struct
+import numpy as np
+
+from .ingest import ContigAccumulator
+from .compressed import open_text, plain_name
+
+DEFAULT_FLAG_MASK = 0x4 | 0x100 | 0x800     # unmapped, secondary, supplementary
+CHUNK_BYTES = 1 << 22                       # decompressed BAM bytes handled per chunk
+CHUNK_LINES = 1 << 16                       # SAM lines handled per chunk
+
+# offsets of the fields we need within a BAM record, counted from the start of its block_size
+_REF_ID, _POS, _FLAG, _TLEN = 4, 8, 18, 32
+
+
+# function is_alignment_file tells whether a SOR source is a SAM/BAM file rather than a csv export
+def is_alignment_file(path):
+
+    if plain_name(path).lower().endswith(('.bam', '.sam')):
+        return True
+
+    # a BAM without the extension still starts with a gzip member holding the BAM magic
+    try:
+        with open(path, 'rb') as f:
+            if f.read(2) != b'\x1f\x8b':
+                return False
+        with gzip.open(path, 'rb') as f:
+            return f.read(4) == b'BAM\x01'
+    except (OSError, EOFError):
+        return False
+
+
+# class BamReader reads the reference list and then the alignments of a BAM file, chunk by chunk
+class BamReader:
+
+    def __init__(self, bam_file, flag_mask=DEFAULT_FLAG_MASK, chunk_bytes=CHUNK_BYTES):
+
+        self.path = bam_file
+        self.flag_mask = flag_mask
+        self.chunk_bytes = chunk_bytes
+        self.references = list()        # (name, length) of each reference, in refID order
+
+        self.f = gzip.open(bam_file, 'rb')
+        self.read_header()
+
+    def read_exact(self, n):
+
+        data = self.f.read(n)
+        if len(data) != n:
+            raise ValueError("Truncated BAM file: " + self.path)
+        return data
+
+    def read_header(self):
+
+        if self.read_exact(4) != b'BAM\x01':
+            raise ValueError(self.path + " is not a BAM file.")
+
+        l_text = struct.unpack('<i', self.read_exact(4))[0]
+        self.read_exact(l_text)     # the SAM header text; the binary reference list below is what we need
+
+        n_ref = struct.unpack('<i', self.read_exact(4))[0]
+        for i in range(0, n_ref):
+            l_name = struct.unpack('<i', self.read_exact(4))[0]
+            name = self.read_exact(l_name).rstrip(b'\x00').decode('ascii')
+            l_ref = struct.unpack('<i', self.read_exact(4))[0]
+            self.references.append((name, l_ref))
+        return
+
+    # yields (ref_ids, positions) arrays of the reads that pass the TLEN and flag filters
+    def chunks(self):
+
+        leftover = b''
+        while True:
+            data = self.f.read(self.chunk_bytes)
+            buf = leftover + data
+            if len(buf) == 0:
+                break
+
+            offsets, end = _record_offsets(buf)
+            if len(offsets) > 0:
+                yield _bam_fields(buf, offsets, self.flag_mask)
+            leftover = buf[end:]
+
+            if len(data) == 0:
+                if len(leftover) > 0:
+                    raise ValueError("Truncated BAM record at the end of " + self.path)
+                break
+
+        self.f.close()
+        return
+
+
+# class SamReader does the same for SAM text files
+class SamReader:
+
+    def __init__(self, sam_file, flag_mask=DEFAULT_FLAG_MASK, chunk_lines=CHUNK_LINES):
+
+        self.path = sam_file
+        self.flag_mask = flag_mask
+        self.chunk_lines = chunk_lines
+        self.references = list()
+        self.ref_ids = dict()           # reference name: refID
+
+        self.f = open_text(sam_file, 'r')
+        self.first_line = self.read_header()
+
+    # reads the @SQ lines for the reference list, returning the first alignment line
+    def read_header(self):
+
+        line = self.f.readline()
+        while line.startswith('@'):
+            if line.startswith('@SQ'):
+                tags = dict(field.split(':', 1) for field in line.rstrip('\n').split('\t')[1:] if ':' in field)
+                self.add_reference(tags.get('SN'), int(tags.get('LN', 0)))
+            line = self.f.readline()
+        return line
+
+    def add_reference(self, name, length=0):
+
+        self.ref_ids[name] = len(self.references)
+        self.references.append((name, length))
+        return self.ref_ids[name]
+
+    def chunks(self):
+
+        lines = [self.first_line] if self.first_line != '' else list()
+        for line in self.f:
+            lines.append(line)
+            if len(lines) >= self.chunk_lines:
+                yield self.parse_lines(lines)
+                lines = list()
+        if len(lines) > 0:
+            yield self.parse_lines(lines)
+
+        self.f.close()
+        return
+
+    def parse_lines(self, lines):
+
+        ref_ids, positions = list(), list()
+        for line in lines:
+            fields = line.split('\t', 9)
+            if len(fields) < 10:
+                continue
+            flag, rname, pos, tlen = int(fields[1]), fields[2], int(fields[3]), int(fields[8])
+            if tlen == 0 or flag & self.flag_mask or rname == '*':
+                continue
+            ref_id = self.ref_ids.get(rname)
+            if ref_id is None:
+                ref_id = self.add_reference(rname)
+            ref_ids.append(ref_id)
+            positions.append(pos)
+        return np.array(ref_ids, dtype=np.int64), np.array(positions, dtype=np.int64)
+
+
+# class PysamReader reads SAM or BAM through pysam, for when it is installed
+class PysamReader:
+
+    def __init__(self, path, flag_mask=DEFAULT_FLAG_MASK, chunk_reads=CHUNK_LINES):
+
+        try:
+            import pysam
+        except ImportError:
+            raise ImportError("pysam is not installed; use the builtin backend instead.")
+
+        self.path = path
+        self.flag_mask = flag_mask
+        self.chunk_reads = chunk_reads
+        self.f = pysam.AlignmentFile(path, 'rb' if path.lower().endswith('.bam') else 'r', check_sq=False)
+        self.references = list(zip(self.f.references, self.f.lengths))
+
+    def chunks(self):
+
+        ref_ids, positions = list(), list()
+        for read in self.f.fetch(until_eof=True):
+            if read.template_length == 0 or read.flag & self.flag_mask:
+                continue
+            ref_ids.append(read.reference_id)
+            positions.append(read.reference_start + 1)
+            if len(positions) >= self.chunk_reads:
+                yield np.array(ref_ids, dtype=np.int64), np.array(positions, dtype=np.int64)
+                ref_ids, positions = list(), list()
+        if len(positions) > 0:
+            yield np.array(ref_ids, dtype=np.int64), np.array(positions, dtype=np.int64)
+
+        self.f.close()
+        return
+
+
+# function open_alignments returns the reader for a SAM or BAM file
+def open_alignments(path, flag_mask=DEFAULT_FLAG_MASK, backend='builtin'):
+
+    if backend == 'pysam':
+        return PysamReader(path, flag_mask)
+    if plain_name(path).lower().endswith('.sam'):
+        return SamReader(path, flag_mask)
+    return BamReader(path, flag_mask)
+
+
+# function stream_alignment_counts counts the reads of a SAM/BAM file per position into a ContigAccumulator, one
+# count array per reference, each allocated at the reference length given in the header.
+def stream_alignment_counts(path, genome_length=0, flag_mask=DEFAULT_FLAG_MASK, backend='builtin'):
+
+    reader = open_alignments(path, flag_mask, backend)
+    accumulator = ContigAccumulator(dict(reader.references), genome_length)
+
+    for ref_ids, positions in reader.chunks():
+        # references named in the SAM body but missing from the header are added to the list as they turn up
+        for ref_id in np.unique(ref_ids).tolist():
+            accumulator.accumulator(reader.references[ref_id][0]).add(positions[ref_ids == ref_id])
+    return accumulator
+
+
+# function _record_offsets walks the block sizes of the BAM records in buf. Returns the offset of every complete
+# record and where the first incomplete one starts.
+def _record_offsets(buf):
+
+    offsets = list()
+    off, n = 0, len(buf)
+    unpack = struct.Struct('<i').unpack_from
+    while off + 4 <= n:
+        end = off + 4 + unpack(buf, off)[0]
+        if end > n:
+            break
+        offsets.append(off)
+        off = end
+    return np.array(offsets, dtype=np.int64), off
+
+
+# function _bam_fields picks refID, pos, flag and tlen out of every record at once and applies the filters
+def _bam_fields(buf, offsets, flag_mask):
+
+    a = np.frombuffer(buf, dtype=np.uint8)
+
+    def le_int(at, nbytes):
+        v = np.zeros(len(offsets), dtype=np.uint32)
+        for k in range(0, nbytes):
+            v |= a[offsets + at + k].astype(np.uint32) << np.uint32(8 * k)
+        return v
+
+    ref_ids = le_int(_REF_ID, 4).view(np.int32).astype(np.int64)
+    positions = le_int(_POS, 4).view(np.int32).astype(np.int64) + 1    # BAM is 0-based, POS is 1-based
+    flags = le_int(_FLAG, 2)
+    tlens = le_int(_TLEN, 4).view(np.int32)
+
+    keep = (tlens != 0) & ((flags & flag_mask) == 0) & (ref_ids >= 0)
+    return ref_ids[keep], positions[keep]
@@ -0,0 +1,434 @@
+#! usr/bin/python
+
+"""cli is the invcluster command. Every stage of the pipeline is its own subcommand, so any one of them can be
+rerun without the others:
+
+    fetch     download the GenBank flat files from Entrez          -> <output>/Entrez Data/<acc>.txt
+    parse     pull the CDS records out of the flat files           -> <output>/Gene Data/<acc>.csv
+    detect    find inversion signals in the SOR files              -> <output>/Cluster Data/<acc>/
+    annotate  line the inversion pairs up with nearby genes        -> <output>/Cluster Data/<acc>/<acc>.tsv
+    render    draw the histograms, inversion sites, gene diagrams  -> <output>/Cluster Data/<acc>/...
+    run       all of the above, in order (with --overlap, the stages of different accessions overlap)
+    sweep     try a grid of detection settings      -> <output>/Cluster Data/<acc>/<acc> parameter sweep.csv
+    compare   detect over several samples of one accession on shared windows
+                                                    -> <output>/Cluster Data/<acc>/<acc> sample comparison.csv
+    serve     answer "genes near position X of accession Y" queries on stdin, or over HTTP with --port
+
+The input directory holds config.txt, accession_list.txt and the 'SOR Data' folder, with a <acc>.csv export, or
+a <acc>.bam or <acc>.sam alignment file, per accession. Each accession's results
+folder keeps a manifest of what every stage was run on, and stages whose inputs and parameters have not changed
+are skipped. An interrupted run picks up where it stopped, and changing e.g. max_genes only redoes gene matching
+and the gene diagrams. Use --force to redo everything.
+
+ex. $ invcluster run -i "Cluster Detection" -o results --read-cutoff 2.4e-06 --jobs 4
+"""
+
+import os
+import sys
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .config import load_config
+from .cluster_tools import get_entrez_data, find_genes
+from .cluster_detect import load_accession_list, find_sor_file, detect_accession, draw_accession_graphs
+from .analyze_clusters import annotate_accession, render_accession_genes, combine_translations, \
+    write_result_parameters
+from .sweep import SWEEP_KEYS, sweep_accession, write_sweep_results, sweep_file_path
+from .comparative import sample_name, compare_samples, write_comparison, comparison_file_path
+from .columnar import require_pyarrow
+from .results_db import DB_FILENAME
+from .gene_service import GeneService, serve_stream, serve_http
+from .orchestrate import run_overlapped
+from .compressed import find_variant
+from .instrument import span, settings, recorded_call, add_spans, configure, write_report, print_summary
+
+STAGES = ('fetch', 'parse', 'detect', 'annotate', 'render')
+REPORT_FILENAME = '__run_report.json'   # per-stage time and memory of the last run, see instrument
+
+
+# class Workspace knows where every input and output file of an accession lives. Entrez and gene files are found
+# plain or compressed; new ones are compressed with compress ('gz', 'bz2' or 'zst') if given.
+class Workspace:
+
+    def __init__(self, input_path, output_path, compress=None):
+
+        self.input_path = input_path
+        self.output_path = output_path
+        self.compress = compress
+        self.sor_path = os.path.join(input_path, 'SOR Data')
+        self.entrez_path = os.path.join(output_path, 'Entrez Data')
+        self.gene_path = os.path.join(output_path, 'Gene Data')
+        self.results_path = os.path.join(output_path, 'Cluster Data')
+
+    def sor_file(self, acc_num):
+        return find_sor_file(self.sor_path, acc_num)
+
+    def entrez_file(self, acc_num):
+        return find_variant(os.path.join(self.entrez_path, acc_num + '.txt'), self.compress)
+
+    def gene_file(self, acc_num):
+        return find_variant(os.path.join(self.gene_path, acc_num + '.csv'), self.compress)
+
+    def acc_results_path(self, acc_num):
+        return os.path.join(self.results_path, acc_num)
+
+    def cluster_file(self, acc_num):
+        return os.path.join(self.acc_results_path(acc_num), acc_num + '.csv')
+
+    def analysis_file(self, acc_num):
+        return os.path.join(self.acc_results_path(acc_num), acc_num + ' cluster analysis.csv')
+
+    def results_file(self, acc_num):
+        return os.path.join(self.acc_results_path(acc_num), acc_num + '.tsv')
+
+    # makes the output folders if they are not there yet
+    def make_dirs(self):
+
+        for path in (self.entrez_path, self.gene_path, self.results_path):
+            if not os.path.exists(path):
+                os.makedirs(path)
+        return
+
+
+# each stage function handles a single accession so they can be handed to a worker pool
+
+def fetch_stage(ws, acc_num, options):
+
+    entrez_file = ws.entrez_file(acc_num)
+    if options['force'] == 'y' and os.path.exists(entrez_file):
+        os.remove(entrez_file)
+    get_entrez_data(acc_num, entrez_file)
+    return
+
+
+def parse_stage(ws, acc_num, options):
+
+    gene_file = ws.gene_file(acc_num)
+    if options['force'] == 'y' and os.path.exists(gene_file):
+        os.remove(gene_file)
+    find_genes(acc_num, ws.entrez_file(acc_num), gene_file)
+    return
+
+
+def detect_stage(ws, acc_num, options):
+
+    detect_accession(acc_num, ws.sor_file(acc_num), ws.acc_results_path(acc_num), options['nbin_size'],
+                     options['cbin_cutoff'], options['cbin_size'], options['cluster_min_sep'],
+                     options['cluster_max_sep'], options['ntpair_min_sep'], options['ntpair_max_sep'],
+                     read_cutoff=options['read_cutoff'], draw_graphs='n', force=options['force'],
+                     stride=options['stride'], jobs=options['window_jobs'], top_pairs=options['top_pairs'],
+                     parquet=options['parquet'], db=options['db'])
+    return
+
+
+def annotate_stage(ws, acc_num, options):
+
+    annotate_accession(acc_num, ws.gene_file(acc_num), ws.acc_results_path(acc_num), options['ntol'],
+                       options['max_genes'], draw_graphs='n', force=options['force'], parquet=options['parquet'],
+                       db=options['db'])
+    return
+
+
+def render_stage(ws, acc_num, options):
+
+    draw_accession_graphs(acc_num, ws.sor_file(acc_num), ws.acc_results_path(acc_num), options['nbin_size'],
+                          overwrite=options['force'])
+    render_accession_genes(acc_num, ws.gene_file(acc_num), ws.acc_results_path(acc_num), options['ntol'],
+                           options['max_genes'], overwrite=options['force'])
+    return
+
+
+STAGE_FUNCTIONS = {'fetch': fetch_stage, 'parse': parse_stage, 'detect': detect_stage,
+                   'annotate': annotate_stage, 'render': render_stage}
+
+
+# function run_stage runs one stage over every accession, spread over jobs workers. Downloads are network bound,
+# so fetch uses threads; everything else uses processes. A single accession runs in this process, which lets
+# detection spread its windows (and contigs) over the jobs instead. Each accession's stage is timed as a span (see
+# instrument), and worker processes hand their spans back for the run report.
+def run_stage(stage, ws, accessions, options, jobs=1):
+
+    print("Running stage", stage, "on", len(accessions), "accession(s)...")
+    func = STAGE_FUNCTIONS[stage]
+
+    if jobs <= 1 or len(accessions) <= 1:
+        for acc_num in accessions:
+            with span(stage, acc_num):
+                func(ws, acc_num, options)
+    elif stage == 'fetch':
+        with span(stage), ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(func, ws, acc_num, options) for acc_num in accessions]
+            for future in futures:
+                future.result()
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(recorded_call, settings(), stage, acc_num, func, ws, acc_num, options)
+                       for acc_num in accessions]
+            for future in futures:
+                add_spans(future.result()[1])
+
+    # the annotate stage also refreshes the combined translations and parameter files
+    if stage == 'annotate':
+        combine_translations(accessions, ws.results_path)
+        write_result_parameters(options['accession_file'], ws.results_path, options['ntol'], options['max_genes'])
+
+    return
+
+
+# adds the options every subcommand shares
+def add_common_arguments(sub):
+
+    sub.add_argument('-i', '--input', default='.',
+                     help="folder holding config.txt, accession_list.txt and 'SOR Data' (default: .)")
+    sub.add_argument('-o', '--output', default=None, help="folder to write results into (default: input)")
+    sub.add_argument('-c', '--config', default=None, help="config file (default: <input>/config.txt)")
+    sub.add_argument('-a', '--accessions', nargs='+', default=None,
+                     help="accession numbers to process (default: everything in accession_list.txt)")
+    sub.add_argument('-j', '--jobs', type=int, default=1,
+                     help="number of accessions to process at once (for a single accession, the number of "
+                          "processes detection spreads its windows and contigs over)")
+    sub.add_argument('--profile', default=None, metavar='STAGE',
+                     help="profile a stage (e.g. detect, cluster, detect/load) with cProfile; the statistics are "
+                          "printed and saved next to the run report")
+    sub.add_argument('--trace-memory', default=None, metavar='STAGE',
+                     help="trace the python allocations of a stage with tracemalloc")
+    sub.add_argument('--compress', choices=('gz', 'bz2', 'zst'), default=None,
+                     help="compress new Entrez and gene files (inputs are read compressed or not either way)")
+    return
+
+
+def make_parser():
+
+    parser = argparse.ArgumentParser(prog='invcluster', description='Detect inversion clusters in SOR data and '
+                                                                    'line them up with nearby genes.')
+    subparsers = parser.add_subparsers(dest='stage')
+    subparsers.required = True
+
+    for stage in STAGES + ('run',):
+        sub = subparsers.add_parser(stage)
+        add_common_arguments(sub)
+        sub.add_argument('--force', action='store_true', help="redo stages even if they are up to date")
+        sub.add_argument('--read-cutoff', type=float, default=None,
+                         help="initial screen read density cutoff; if not given, it is set by clicking on the "
+                              "histogram")
+        sub.add_argument('--stride', type=int, default=None,
+                         help="screen with overlapping windows starting every STRIDE nt (less than nbin_size) "
+                              "instead of fixed bins, so inversions straddling a bin edge are not split")
+        sub.add_argument('--top-pairs', type=int, default=1,
+                         help="report up to this many non-overlapping inversion pairs per window (default: 1). "
+                              "The best pair is chosen as always; the others must also lie strictly within the "
+                              "cluster bin separation limits")
+        sub.add_argument('--ntol', type=int, default=100000,
+                         help="nucleotides around a cluster to look for genes in (default: 100000)")
+        sub.add_argument('--parquet', action='store_true',
+                         help="also write the signals and gene hits as Parquet files (needs pyarrow)")
+        sub.add_argument('--db', nargs='?', const='', default=None, metavar='FILE',
+                         help="also store the signals, genes and gene hits in an SQLite database (default file: "
+                              "<output>/Cluster Data/" + DB_FILENAME + ")")
+        if stage == 'run':
+            sub.add_argument('--overlap', action='store_true',
+                             help="download and parse the GenBank files while detection runs, and annotate each "
+                                  "accession as soon as both are done (needs --read-cutoff)")
+            sub.add_argument('--fetch-jobs', type=int, default=4,
+                             help="with --overlap, the number of downloads at once (default: 4)")
+
+    # the sweep takes a list of values for each detection parameter; parameters left out use config.txt
+    sub = subparsers.add_parser('sweep', help="try a grid of detection settings and tabulate pairs and spikes")
+    add_common_arguments(sub)
+    sub.add_argument('--read-cutoff', type=float, nargs='+', required=True, help="read density cutoffs to try")
+    for key in SWEEP_KEYS:
+        if key != 'read_cutoff':
+            sub.add_argument('--' + key.replace('_', '-'), type=int, nargs='+', default=None)
+
+    # the comparison takes the SOR files of the samples, as paths or as names of files in 'SOR Data'
+    sub = subparsers.add_parser('compare', help="detect over several samples of one accession on shared windows "
+                                                "and tabulate their inversion reads side by side")
+    add_common_arguments(sub)
+    sub.add_argument('-s', '--samples', nargs='+', required=True,
+                     help="SOR files of the samples, or their names in 'SOR Data' (e.g. FN545816_t0)")
+    sub.add_argument('--read-cutoff', type=float, required=True, help="initial screen read density cutoff")
+    sub.add_argument('--stride', type=int, default=None,
+                     help="screen with overlapping windows starting every STRIDE nt (less than nbin_size) instead "
+                          "of fixed bins")
+
+    # the gene lookup service answers queries until stopped; the accessions given are loaded up front
+    sub = subparsers.add_parser('serve', help="answer queries for the genes near any position of an accession")
+    add_common_arguments(sub)
+    sub.add_argument('--port', type=int, default=None,
+                     help="answer GET /genes?accession=...&position=... on this localhost port instead of stdin")
+    sub.add_argument('--ntol', type=int, default=100000,
+                     help="default nucleotides around a position to look for genes in (default: 100000)")
+
+    return parser
+
+
+# function run_serve preloads the genes of the accessions and answers queries on stdin, or over HTTP if a port is
+# given. On stdin the answers go to stdout and everything else to stderr.
+def run_serve(args, ws, accessions, options):
+
+    service = GeneService(ws.gene_path, ntol=args.ntol, max_genes=options['max_genes'])
+    with redirect_stdout(sys.stderr):
+        for acc_num in accessions:
+            if service.load(acc_num) is None:
+                print("No gene file for", acc_num, "yet; run the parse stage first.")
+        print("Loaded the genes of", len(service.bugs), "accession(s).")
+
+    if args.port is None:
+        serve_stream(service)
+    else:
+        serve_http(service, args.port)
+    return
+
+
+# function run_compare runs the sample comparison for one accession and writes '<acc> sample comparison.csv'.
+# --jobs is the number of processes analyzing the windows of each sample.
+def run_compare(args, ws, accessions, options):
+
+    if len(accessions) != 1:
+        sys.exit("Please give the one accession the samples belong to with -a.")
+    acc_num = accessions[0]
+
+    sor_files = dict()
+    for sample in args.samples:
+        sor_file = sample if os.path.isfile(sample) else find_sor_file(ws.sor_path, sample)
+        if not os.path.exists(sor_file):
+            sys.exit("SOR file not found for sample " + sample)
+        sor_files[sample_name(sor_file)] = sor_file
+
+    windows, results = compare_samples(acc_num, sor_files, options['nbin_size'], args.read_cutoff,
+                                       options['cbin_size'], options['cbin_cutoff'], options['cluster_min_sep'],
+                                       options['cluster_max_sep'], options['ntpair_min_sep'],
+                                       options['ntpair_max_sep'], stride=args.stride, jobs=args.jobs)
+
+    acc_results_path = ws.acc_results_path(acc_num)
+    if not os.path.exists(acc_results_path):
+        os.makedirs(acc_results_path)
+    comparison_file = comparison_file_path(acc_results_path, acc_num)
+    write_comparison(comparison_file, windows, results)
+    print("Sample comparison saved as", comparison_file)
+
+    return
+
+
+# function run_sweep runs the parameter sweep on each accession and writes '<acc> parameter sweep.csv'. Here
+# --jobs is the number of processes analyzing windows, since a sweep is one accession at a time.
+def run_sweep(args, ws, accessions, options):
+
+    grid = dict()
+    for key in SWEEP_KEYS:
+        values = getattr(args, key)
+        grid[key] = values if values is not None else [options[key]]
+
+    for acc_num in accessions:
+        results = sweep_accession(acc_num, ws.sor_file(acc_num), grid, jobs=args.jobs)
+        acc_results_path = ws.acc_results_path(acc_num)
+        if not os.path.exists(acc_results_path):
+            os.makedirs(acc_results_path)
+        sweep_file = sweep_file_path(acc_results_path, acc_num)
+        write_sweep_results(results, sweep_file)
+        print("Sweep results saved as", sweep_file)
+
+    return
+
+
+def main(argv=None):
+
+    parser = make_parser()
+    args = parser.parse_args(argv)
+
+    input_path = os.path.abspath(args.input)
+    output_path = os.path.abspath(args.output) if args.output is not None else input_path
+    config_file = args.config if args.config is not None else os.path.join(input_path, 'config.txt')
+    accession_file = os.path.join(input_path, 'accession_list.txt')
+
+    # the service writes its answers to stdout, so keep everything else off it
+    with redirect_stdout(sys.stderr if args.stage == 'serve' else sys.stdout):
+        options = load_config(config_file)
+    options['accession_file'] = accession_file
+
+    # overlapping windows have to start less than a window apart, or reads between them are never screened
+    stride = getattr(args, 'stride', None)
+    if stride is not None and not 0 < stride < options['nbin_size']:
+        parser.error("--stride must be a positive number of nt less than nbin_size ({0}).".format(options['nbin_size']))
+
+    if args.accessions is not None:
+        accessions = args.accessions
+    else:
+        accessions = load_accession_list(accession_file)
+
+    ws = Workspace(input_path, output_path, args.compress)
+    ws.make_dirs()
+    configure(args.profile, args.trace_memory)
+
+    if args.stage == 'sweep':
+        with span('sweep'):
+            run_sweep(args, ws, accessions, options)
+        finish_run(ws)
+        return
+
+    if args.stage == 'serve':
+        run_serve(args, ws, accessions, options)
+        return
+
+    if args.stage == 'compare':
+        with span('compare', accessions[0] if len(accessions) == 1 else None):
+            run_compare(args, ws, accessions, options)
+        finish_run(ws)
+        return
+
+    options['read_cutoff'] = args.read_cutoff
+    options['ntol'] = args.ntol
+    options['stride'] = args.stride
+    options['top_pairs'] = args.top_pairs
+    options['force'] = 'y' if args.force else 'n'
+    options['parquet'] = 'y' if args.parquet else 'n'
+    options['db'] = None
+    if args.db is not None:
+        options['db'] = os.path.abspath(args.db) if args.db != '' else os.path.join(ws.results_path, DB_FILENAME)
+    options['window_jobs'] = args.jobs if len(accessions) == 1 else 1
+
+    # better to find out pyarrow is missing now than after the first accession is done, or deep in a worker process
+    if args.parquet:
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            sys.exit(str(e))
+
+    if args.stage == 'run' and args.overlap:
+        if args.read_cutoff is None:
+            sys.exit("Please give --read-cutoff when running with --overlap.")
+        options['window_jobs'] = 1
+        with span('run'):
+            run_overlapped(ws, accessions, options, STAGE_FUNCTIONS, jobs=args.jobs, fetch_jobs=args.fetch_jobs)
+        combine_translations(accessions, ws.results_path)
+        write_result_parameters(options['accession_file'], ws.results_path, options['ntol'], options['max_genes'])
+        finish_run(ws)
+        return
+
+    stages = STAGES if args.stage == 'run' else (args.stage,)
+
+    # the interactive threshold needs a person clicking on a window, which worker processes cannot do. A single
+    # accession is detected in this process (its windows only go to a pool after the threshold is set), so only
+    # several accessions at once need the cutoff given.
+    if 'detect' in stages and args.jobs > 1 and len(accessions) > 1 and args.read_cutoff is None:
+        sys.exit("Please give --read-cutoff when running detection on several accessions with more than one job.")
+
+    for stage in stages:
+        run_stage(stage, ws, accessions, options, jobs=args.jobs)
+
+    finish_run(ws)
+
+
+# function finish_run writes the run report (see instrument) into the results folder and prints its summary
+def finish_run(ws):
+
+    report_file = os.path.join(ws.results_path, REPORT_FILENAME)
+    write_report(report_file)
+    print_summary()
+    print("Run report saved as", report_file)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,34 @@
 #! usr/bin/python
 
-"""cluster_detect detects inversion signals in SOR files by accession numbers"""
-
-from detect_inversions import *
+"""cluster_detect detects inversion signals in SOR files by accession numbers.
+
+detect runs the detection of one accession in process and returns a Detection (a numpy table of the signals and
+the per-window results) without touching any results files; detect_accession adds the manifest and writes the
+analysis and cluster files from that with write_detection_results.
+"""
+
+from .detect_inversions import *
+from .manifest import Manifest
+from .instrument import span, settings, start_worker, current_path, add_spans, take_spans
+from .columnar import signals_parquet_path, write_signals_parquet
+from .results_db import has_stage, store_detection
+from .compressed import find_variant
+from .bam import DEFAULT_FLAG_MASK
+from concurrent.futures import ProcessPoolExecutor
 import os
 
 
-def detect_inversion_clusters(nbin_size, cbin_cutoff, cbin_size, c_min_sep, c_max_sep, n_min_sep, n_max_sep):
-
-    # define paths for file saving and loading
-    desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
-    working_path = os.path.join(desktop_path, "Cluster Detection")
-    results_path = os.path.join(working_path, 'Cluster Data')
-    sor_path = os.path.join(working_path, 'SOR Data')
-
-    accession_file = os.path.join(working_path, 'accession_list.txt')
-
-    # variables, make it so it loads by config file!
-    nbin_size = nbin_size  # number of nts per bin in the initial SOR read frequency histogram
-    cbin_size = cbin_size  # number of nts I want each cluster bin to be
-    cluster_max_sep = c_max_sep  # furthest away two bins can be when considering inversion sites
-    cluster_min_sep = c_min_sep  # closest two bins can be when considering inversion sites
-    cluster_bin_cutoff_perc = cbin_cutoff  # eliminate data below this percentile in the cluster analysis
-    nt_min_sep = n_min_sep
-    nt_max_sep = n_max_sep
+# function load_accession_list reads the accession numbers to be processed, one per line
+def load_accession_list(accession_file):
 
     accession_list = list()  # list of accession numbers to be processed
     # load accession names from list
     with open(accession_file, 'r') as a:
         try:
             for line in a:
-                accession_list.append(line.split('\n')[0])
+                acc_num = line.split('\n')[0].strip()
+                if acc_num != '':
+                    accession_list.append(acc_num)
         except IOError as e:
             print("Error: Improper accession file.")
             quit(e.errno)
@@ -39,137 +37,520 @@ def detect_inversion_clusters(nbin_size, cbin_cutoff, cbin_size, c_min_sep, c_ma
     if len(accession_list) == 0:
         print("No accession numbers detected!")
 
-    # for each accession number...
-    for acc_num in accession_list:
+    return accession_list
 
-        # define the input and output files
-        sor_file = os.path.join(sor_path, acc_num+'.csv')
 
-        acc_results_path = os.path.join(results_path, acc_num)
-        if not os.path.exists(acc_results_path):
-            os.makedirs(acc_results_path)
+# function find_sor_file returns the SOR file of an accession: a csv export, or failing that a BAM or SAM file.
+# The csv and SAM files may be compressed (<acc>.csv.gz, .bz2 or .zst, see compressed).
+def find_sor_file(sor_path, acc_num):
+
+    for ext in ('.csv', '.bam', '.sam'):
+        sor_file = os.path.join(sor_path, acc_num + ext)
+        if ext != '.bam':
+            sor_file = find_variant(sor_file)
+        if os.path.exists(sor_file):
+            return sor_file
+    return os.path.join(sor_path, acc_num + '.csv')
 
-        graph_path = os.path.join(acc_results_path, "Cluster Graphs")
-        if not os.path.exists(graph_path):
-            os.makedirs(graph_path)
 
+# function window_key turns a candidate window into the string its analysis is stored under in the manifest.
+# Windows of a SOR with several contigs carry the contig name as a third element.
+def window_key(window):
 
-        # load SOR class, possible to make it so it loops through SOR files
-        SOR_bug = SOR(acc_num, sor_file, binsize=nbin_size)
+    key = '{0!r}:{1!r}'.format(float(window[0]), float(window[1]))
+    if len(window) > 2:
+        key = str(window[2]) + ':' + key
+    return key
 
-        # load up SOR thresholding
-        SOR_bug.make_interactive_graphical_threshold(save_path=os.path.join(acc_results_path, acc_num + '_histogram'))
-
-        print("Read density cutoff:", SOR_bug.read_cutoff)
-
-        # for each cluster in the bug
-        for cluster in SOR_bug.clusters:
-
-            data_subset = SOR_bug.subset(cluster[0], cluster[1])
-
-            # create a Cluster analysis class
-            c = Cluster(data_subset, cbinsize=cbin_size, cperc=cluster_bin_cutoff_perc,
-                        clustersepmin=cluster_min_sep, clustersepmax=cluster_max_sep,
-                        ntsepmin=nt_min_sep, ntsepmax=nt_max_sep)
-
-            # if the signal is junk, print out some statement for now
-            if c.is_single_signal == 1:
-                print("Solitary signal found at:", c.signal)
-                SOR_bug.spikes.append((c.signal[0], c.signal[0]))
-                SOR_bug.signals.append((c.signal[0], c.signal[0]))
-                SOR_bug.clust_dist.append(0)
-                SOR_bug.clust_sum.append(c.signal[1])
-                SOR_bug.clust_proportion_perc.append('{:.4}'.format(100*(c.signal[1] / c.data_sum)))
-                SOR_bug.total_clust_prop_perc.append('{:.4}'.format(100*(c.signal[1] / SOR_bug.data_sum)))
-                SOR_bug.cluster_map_int.append('N')
-                SOR_bug.final_cbin_sizes.append(c.final_cbin_size)
 
-            # otherwise, draw it here
-            else:
-                print("Cluster pair found at:", c.best_nt_pair[0], c.best_nt_pair[1])
-                c_figname = os.path.join(graph_path, acc_num + '_cluster_' + str(c.best_nt_pair[0][0]))
-                c.draw_inversion_site(c_figname, show_fig='n')
-                SOR_bug.true_clusters.append(c.best_nt_pair)
-                SOR_bug.signals.append((c.best_nt_pair[0][0], c.best_nt_pair[1][0]))
-                SOR_bug.clust_dist.append(c.best_nt_pair_dist)
-                SOR_bug.clust_sum.append(c.best_nt_pair_sum)
-                SOR_bug.clust_proportion_perc.append('{:.4}'.format(100 * (c.best_nt_pair_sum / c.data_sum)))
-                SOR_bug.total_clust_prop_perc.append('{:.4}'.format(100 * (c.best_nt_pair_sum/ SOR_bug.data_sum)))
-                SOR_bug.cluster_map_int.append('Y')
-                SOR_bug.final_cbin_sizes.append(c.final_cbin_size)
+# function analyze_window runs the Cluster analysis on one candidate window of the SOR and returns the result as a
+# plain dictionary, which is what gets stored in the manifest. With top_pairs > 1, further true pairs found in the
+# window are listed under 'more_pairs', as results of their own (see signal_rows).
+def analyze_window(SOR_bug, window, cbin_size, cbin_cutoff, c_min_sep, c_max_sep, n_min_sep, n_max_sep,
+                   top_pairs=1, verbose='y'):
 
-        # now lets dump the relevant data to disk
+    result = dict()
+    if len(window) > 2:
+        if SOR_bug.contig != window[2]:
+            SOR_bug.select_contig(window[2])
+        result['contig'] = window[2]
 
-        # cluster stats and data
-        num_signals = len(SOR_bug.clusters)                 # number of total signals detected
-        all_signals = SOR_bug.signals                       # list of all signal positions
-        local_props = SOR_bug.clust_proportion_perc         # list of percent read counts of inv. to cluster reads
-        global_props = SOR_bug.total_clust_prop_perc        # list of percent read counts of inv. to all reads
-        true_clusters = SOR_bug.true_clusters               # list of true clusters
-        num_true_clusters = len(SOR_bug.true_clusters)      # number of true cluster pairs detected
-        spikes = SOR_bug.spikes                             # list of spikes
-        num_spikes = len(SOR_bug.spikes)                    # number of spikes detected
-        is_inv_true = SOR_bug.cluster_map_int               # a list to tell us if we had a pair
-        c_dist = SOR_bug.clust_dist                         # list of inversion pair nt span
-        c_reads = SOR_bug.clust_sum                         # list of cluster read sums
+    data_subset = SOR_bug.subset(window[0], window[1])
 
-        # run parameters not already defined at the top
-        read_cutoff = SOR_bug.read_cutoff                   # read density cutoff
-        final_ibin = SOR_bug.final_bin_size                 # the ultimate nt size of the bins
-        final_cbins = SOR_bug.final_cbin_sizes              # final nt sizes of cluster bins list
+    # create a Cluster analysis class
+    with span('cluster', SOR_bug.accession_num, window=window_key(window)):
+        c = Cluster(data_subset, cbinsize=cbin_size, cperc=cbin_cutoff,
+                    clustersepmin=c_min_sep, clustersepmax=c_max_sep,
+                    ntsepmin=n_min_sep, ntsepmax=n_max_sep, range_max=SOR_bug.range_max(), top_pairs=top_pairs)
 
-        analysis_file = os.path.join(acc_results_path, acc_num + ' cluster analysis.csv')
-        cluster_file = os.path.join(acc_results_path, acc_num + '.csv')
+    # if the signal is junk, print out some statement for now
+    if c.is_single_signal == 1:
+        if verbose == 'y':
+            print("Solitary signal found at:", c.signal)
+        result.update({'signal': (int(c.signal[0]), int(c.signal[0])), 'is_pair': 'N', 'dist': 0,
+                       'reads': int(c.signal[1]), 'cluster_reads': int(c.data_sum),
+                       'final_cbin_size': float(c.final_cbin_size)})
+        return result
 
-        # if we have an analysis file here, delete it
-        if os.path.exists(analysis_file):
-            os.remove(analysis_file)
-        if os.path.exists(cluster_file):
-            os.remove(cluster_file)
+    if verbose == 'y':
+        print("Cluster pair found at:", c.best_nt_pair[0], c.best_nt_pair[1])
+    result.update({'signal': (int(c.best_nt_pair[0][0]), int(c.best_nt_pair[1][0])), 'is_pair': 'Y',
+                   'dist': int(c.best_nt_pair_dist), 'reads': int(c.best_nt_pair_sum),
+                   'cluster_reads': int(c.data_sum), 'final_cbin_size': float(c.final_cbin_size)})
 
-        # let's write the cluster stats and data to a results file
+    more_pairs = list()
+    for nt_pair, dist, reads in c.more_nt_pairs:
+        if verbose == 'y':
+            print("Cluster pair found at:", nt_pair[0], nt_pair[1])
+        pair = dict(result)
+        pair.update({'signal': (int(nt_pair[0][0]), int(nt_pair[1][0])), 'dist': int(dist), 'reads': int(reads)})
+        more_pairs.append(pair)
+    if len(more_pairs) > 0:
+        result['more_pairs'] = more_pairs
+    return result
 
-        append_to_csv(['Accession Number:', acc_num], analysis_file)
 
-        labels = ['Number of signals detected', 'Number of inversion pairs detected', 'Number of signal peaks detected']
-        data = [num_signals, num_true_clusters, num_spikes]
-        for i in range(0, len(labels)):
-            d = (labels[i], data[i])
-            append_to_csv(d, analysis_file)
-        append_to_csv([''], analysis_file)
+# function signal_rows lists the signals of a window result: the result itself, then any further pairs found in
+# the same window
+def signal_rows(result):
+    return [result] + result.get('more_pairs', list())
 
-        header = ['Signal Start', 'Signal End', 'True Pair?', 'Inversion Length', 'Combined Read Count',
-                  'Percent Read to Cluster', 'Percent Read to All SORs']
-        append_to_csv(header, analysis_file)
-        append_to_csv(header, cluster_file)
-        for i in range(0, num_signals):
-            data = [all_signals[i][0], all_signals[i][1], is_inv_true[i], c_dist[i], c_reads[i], local_props[i],
-                    global_props[i]]
-            append_to_csv(data, analysis_file)
-            if is_inv_true[i] == 'Y':
-                append_to_csv(data, cluster_file)
-        append_to_csv([''], analysis_file)
 
-        # now write run parameters
-        append_to_csv(['RUN PARAMETERS:'], analysis_file)
-        labels = ['Initial Density Cutoff', 'nt bin target for initial screen', 'nt bin achieved',
-                  'nt cluster bin target', 'nt cluster bins achieved', 'Minimum cluster bin distance',
-                  'Maximum cluster bin distance', 'Cluster bin count percentile cutoff', 'Minimum inversion size',
-                  'Maximum inversion size']
-        data = [read_cutoff, nbin_size, final_ibin, c.bin_size, final_cbins, c.c_sep_min, c.c_sep_max,
-                c.count_percentile_threshold, c.n_sep_min, c.n_sep_max]
-        for i in range(0, len(labels)):
-            d = (labels[i], data[i])
-            append_to_csv(d, analysis_file)
+# function score_signals adds the enrichment and log10 p-value of signal_significance to every signal of the window
+# results that does not have them yet. The signals of each contig are scored all at once. Returns how many were.
+def score_signals(SOR_bug, results):
 
+    rows = [row for r in results for row in signal_rows(r) if 'log10_p' not in row]
+    for contig in SOR_bug.contig_names:
+        contig_rows = [row for row in rows if row.get('contig') == contig]
+        if len(contig_rows) == 0:
+            continue
 
+        SOR_bug.select_contig(contig)
+        enrichment, log10_p = signal_significance(SOR_bug.positions, SOR_bug.cum_counts,
+                                                  [row['signal'][0] for row in contig_rows],
+                                                  [row['signal'][1] for row in contig_rows],
+                                                  [row['reads'] for row in contig_rows])
+        for row, e, p in zip(contig_rows, enrichment.tolist(), log10_p.tolist()):
+            row['enrichment'], row['log10_p'] = e, p
 
+    return len(rows)
+
+
+_worker_sor = None  # each pool worker loads its own SOR (memory-mapped from the index, so this is cheap)
+
+
+# function worker_args returns the _init_worker arguments that load the SOR of SOR_bug again in a pool worker the
+# same way: with its alignment flag mask, ignored positions, index and verbose settings, and the parent's
+# instrument settings
+def worker_args(SOR_bug, sor_file):
+    return (SOR_bug.accession_num, sor_file, SOR_bug.flag_mask, list(SOR_bug.ignored_positions), SOR_bug.index,
+            SOR_bug.verbose, settings())
+
+
+def _init_worker(acc_num, sor_file, flag_mask=DEFAULT_FLAG_MASK, ignore=(), index='y', verbose='y', config=None):
+
+    global _worker_sor
+    if config is not None:
+        start_worker(config)
+    _worker_sor = SOR(acc_num, sor_file, ignore=list(ignore), index=index, flag_mask=flag_mask, verbose=verbose)
+
+
+# runs one window in a pool worker, returning its result and the spans recorded for it (see merge_task_results)
+def _analyze_task(task):
+
+    window, cluster_setting = task
+    return analyze_window(_worker_sor, window, *cluster_setting, verbose='n'), take_spans()
+
+
+# function merge_task_results adds the spans of _analyze_task results to this process's report, under the span
+# open here, and returns the window results
+def merge_task_results(task_results):
+
+    parent = current_path()
+    results = list()
+    for result, records in task_results:
+        add_spans(records, parent)
+        results.append(result)
+    return results
+
+
+# function analyze_windows runs analyze_window on every window, over a process pool of jobs workers if jobs > 1.
+# The windows of different contigs are independent, so they are spread over the pool together.
+def analyze_windows(SOR_bug, sor_file, windows, cluster_setting, jobs=1, verbose='y'):
+
+    if jobs <= 1 or len(windows) <= 1:
+        return [analyze_window(SOR_bug, window, *cluster_setting, verbose=verbose) for window in windows]
+
+    tasks = [(window, tuple(cluster_setting)) for window in windows]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=worker_args(SOR_bug, sor_file)) as pool:
+        return merge_task_results(pool.map(_analyze_task, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+
+
+# function threshold_contigs runs the initial screen on every contig of the SOR in turn and returns the threshold
+# data the manifest keeps: the candidate windows of all contigs, the cutoff, the bin size achieved (one per contig
+# if there are several) and the read total of the whole file. An interactive cutoff is set on the first contig and
+# used for the rest.
+def threshold_contigs(SOR_bug, read_cutoff=None, stride=None):
+
+    windows, final_bin_sizes, data_sum = list(), list(), 0
+    for contig in SOR_bug.contig_names:
+        SOR_bug.select_contig(contig)
+        if read_cutoff is None:
+            SOR_bug.make_interactive_graphical_threshold(stride=stride)
+            read_cutoff = SOR_bug.read_cutoff
+        else:
+            SOR_bug.make_graphical_threshold(read_cutoff, stride=stride)
+        windows += SOR_bug.clusters
+        final_bin_sizes.append(SOR_bug.final_bin_size)
+        data_sum += SOR_bug.data_sum
 
+    SOR_bug.select_contig(SOR_bug.contig_names[0])
+    return {'windows': windows, 'read_cutoff': read_cutoff,
+            'final_bin_size': final_bin_sizes[0] if len(final_bin_sizes) == 1 else final_bin_sizes,
+            'data_sum': data_sum}
+
+
+# the columns of a signal table, one row per signal. window is the index of the candidate window the signal was
+# found in, and the percentages are its reads over those of the window and of the whole SOR file. A contig column
+# (empty for single contig genomes) is added by signal_table, sized to the longest contig name.
+SIGNAL_FIELDS = [('window', np.int64), ('start', np.int64), ('end', np.int64), ('is_pair', np.bool_),
+                 ('length', np.int64), ('reads', np.int64), ('cluster_reads', np.int64),
+                 ('percent_cluster', np.float64), ('percent_total', np.float64), ('enrichment', np.float64),
+                 ('log10_p', np.float64)]
 
 
+# function signal_table turns the per-window results into a numpy structured array with a row per signal (see
+# SIGNAL_FIELDS). data_sum is the read total of the SOR file. Signals not scored yet get nan for their significance.
+def signal_table(results, data_sum):
+
+    rows = [(k, row) for k, r in enumerate(results) for row in signal_rows(r)]
+    contigs = [str(row.get('contig', '')) for k, row in rows]
+    table = np.zeros(len(rows), dtype=SIGNAL_FIELDS + [('contig', 'U' + str(max([1] + [len(c) for c in contigs])))])
+
+    table['window'] = [k for k, row in rows]
+    table['start'] = [row['signal'][0] for k, row in rows]
+    table['end'] = [row['signal'][1] for k, row in rows]
+    table['is_pair'] = [row['is_pair'] == 'Y' for k, row in rows]
+    table['length'] = [row['dist'] for k, row in rows]
+    table['reads'] = [row['reads'] for k, row in rows]
+    table['cluster_reads'] = [row['cluster_reads'] for k, row in rows]
+    table['percent_cluster'] = 100 * (table['reads'] / table['cluster_reads'])
+    table['percent_total'] = 100 * (table['reads'] / data_sum)
+    table['enrichment'] = [row.get('enrichment', np.nan) for k, row in rows]
+    table['log10_p'] = [row.get('log10_p', np.nan) for k, row in rows]
+    table['contig'] = contigs
+
+    return table
+
+
+# class Detection holds the detection results of one accession, as returned by detect and detect_accession.
+# signals is the signal table (see signal_table), windows the analyze_window result of every candidate window in
+# screening order, threshold the initial screen (see threshold_contigs) and params the settings used.
+class Detection:
+
+    def __init__(self, acc_num, windows, threshold, params):
+
+        self.accession_num = acc_num                                # accession number
+        self.windows = windows                                      # analyze_window result per candidate window
+        self.threshold = threshold                                  # windows, cutoff, bin size and read total
+        self.params = params                                        # detection settings
+        self.signals = signal_table(windows, threshold['data_sum'])  # one row per signal
+
+    # the signals that are true inversion pairs
+    @property
+    def pairs(self):
+        return self.signals[self.signals['is_pair']]
+
+    # the signals that are solitary spikes
+    @property
+    def spikes(self):
+        return self.signals[~self.signals['is_pair']]
+
+    # whether the signals were found on several contigs (and so carry a contig name)
+    @property
+    def has_contigs(self):
+        return len(self.windows) > 0 and 'contig' in self.windows[0]
+
+
+# function detect runs the detection of one accession in process and returns a Detection, without the manifest and
+# without writing any results: sor is a SOR file or an already loaded SOR. The density cutoff has to be given.
+# With jobs > 1 the windows are spread over that many processes, each loading the SOR file for itself, so this
+# needs the file rather than a loaded SOR. By default nothing is written or printed: index='y' reads and keeps the
+# binary index next to a SOR file (see SOR; without it, every worker parses the file again), and verbose='y' reports
+# the loading and prints every signal as it is found.
+def detect(acc_num, sor, nbin_size, cbin_cutoff, cbin_size, c_min_sep, c_max_sep, n_min_sep, n_max_sep, read_cutoff,
+           stride=None, jobs=1, top_pairs=1, index='n', verbose='n'):
+
+    if isinstance(sor, SOR):
+        SOR_bug, sor_file = sor, None
+        SOR_bug.bin_size = nbin_size
+        jobs = 1
+    else:
+        SOR_bug, sor_file = SOR(acc_num, sor, binsize=nbin_size, index=index, verbose=verbose), sor
+
+    threshold = threshold_contigs(SOR_bug, read_cutoff, stride)
+    cluster_setting = (cbin_size, cbin_cutoff, c_min_sep, c_max_sep, n_min_sep, n_max_sep, top_pairs)
+    results = analyze_windows(SOR_bug, sor_file, threshold['windows'], cluster_setting, jobs, verbose)
+    score_signals(SOR_bug, results)
+
+    params = {'nbin_size': nbin_size, 'cbin_size': cbin_size, 'cbin_cutoff': cbin_cutoff, 'c_min_sep': c_min_sep,
+              'c_max_sep': c_max_sep, 'n_min_sep': n_min_sep, 'n_max_sep': n_max_sep, 'top_pairs': top_pairs,
+              'stride': stride}
+    return Detection(acc_num, results, threshold, params)
+
+
+# function write_detection_results writes the analysis and cluster files of a Detection
+def write_detection_results(analysis_file, cluster_file, detection):
+
+    signals = detection.signals
+    threshold, params = detection.threshold, detection.params
+    num_signals = len(signals)                                              # number of total signals detected
+    num_true_clusters = len(detection.pairs)                                # number of true cluster pairs detected
+    num_spikes = num_signals - num_true_clusters                            # number of spikes detected
+
+    # if we have an analysis file here, delete it
+    if os.path.exists(analysis_file):
+        os.remove(analysis_file)
+    if os.path.exists(cluster_file):
+        os.remove(cluster_file)
+
+    # let's write the cluster stats and data to a results file
+
+    append_to_csv(['Accession Number:', detection.accession_num], analysis_file)
+
+    labels = ['Number of signals detected', 'Number of inversion pairs detected', 'Number of signal peaks detected']
+    data = [num_signals, num_true_clusters, num_spikes]
+    for i in range(0, len(labels)):
+        d = (labels[i], data[i])
+        append_to_csv(d, analysis_file)
+    append_to_csv([''], analysis_file)
+
+    # the contig of each signal is only written for genomes with more than one
+    contigs = detection.has_contigs
+
+    header = ['Signal Start', 'Signal End', 'True Pair?', 'Inversion Length', 'Combined Read Count',
+              'Percent Read to Cluster', 'Percent Read to All SORs', 'Enrichment', 'Log10 P-value']
+    if contigs:
+        header.append('Contig')
+    append_to_csv(header, analysis_file)
+    append_to_csv(header, cluster_file)
+    for s in signals:
+        data = [int(s['start']), int(s['end']), 'Y' if s['is_pair'] else 'N', int(s['length']), int(s['reads']),
+                '{:.4}'.format(float(s['percent_cluster'])), '{:.4}'.format(float(s['percent_total'])),
+                '{:.1f}'.format(float(s['enrichment'])), '{:.1f}'.format(float(s['log10_p']))]
+        if contigs:
+            data.append(str(s['contig']))
+        append_to_csv(data, analysis_file)
+        if s['is_pair']:
+            append_to_csv(data, cluster_file)
+    append_to_csv([''], analysis_file)
+
+    # now write run parameters
+    append_to_csv(['RUN PARAMETERS:'], analysis_file)
+    labels = ['Initial Density Cutoff', 'nt bin target for initial screen', 'nt bin achieved',
+              'nt cluster bin target', 'nt cluster bins achieved', 'Minimum cluster bin distance',
+              'Maximum cluster bin distance', 'Cluster bin count percentile cutoff', 'Minimum inversion size',
+              'Maximum inversion size']
+    data = [threshold['read_cutoff'], params['nbin_size'], threshold['final_bin_size'], params['cbin_size'],
+            [r['final_cbin_size'] for r in detection.windows], params['c_min_sep'], params['c_max_sep'],
+            params['cbin_cutoff'], params['n_min_sep'], params['n_max_sep']]
+    for i in range(0, len(labels)):
+        d = (labels[i], data[i])
+        append_to_csv(d, analysis_file)
+
+    return
+
+
+# function detect_accession runs the cluster detection for one accession number and writes the analysis and
+# cluster files into acc_results_path. If read_cutoff is None, the density cutoff is set interactively.
+# draw_graphs='n' skips the histogram and inversion site pictures (the render stage can draw them later).
+#
+# The work is split into stages recorded in the accession's manifest: density binning (keyed on the SOR file,
+# nbin_size and the cutoff) and the Cluster analysis of each candidate window (keyed on the SOR file and the
+# cluster parameters). Up to date stages are skipped, windows analyzed before are reused, the SOR file is only
+# loaded if something actually needs it, and the output files are only rewritten if a result changed.
+# force='y' ignores the manifest and redoes everything. A stride (in nt, smaller than nbin_size) switches the
+# initial screen to overlapping windows merged into candidate regions, see SOR.apply_sliding_cutoff.
+# Each contig of the SOR file is screened on its own, and with jobs > 1 the windows still to be analyzed (of all
+# contigs) are spread over that many processes. top_pairs is how many non-overlapping pairs to report per window.
+# Returns the Detection written out (see detect for running detection without any files). parquet='y' also
+# writes the signal table as a Parquet file (see columnar), and db names a results database to store the signals
+# in (see results_db).
+def detect_accession(acc_num, sor_file, acc_results_path, nbin_size, cbin_cutoff, cbin_size, c_min_sep, c_max_sep,
+                     n_min_sep, n_max_sep, read_cutoff=None, draw_graphs='y', force='n', stride=None, jobs=1,
+                     top_pairs=1, parquet='n', db=None):
+
+    if not os.path.exists(acc_results_path):
+        os.makedirs(acc_results_path)
+
+    analysis_file = os.path.join(acc_results_path, acc_num + ' cluster analysis.csv')
+    cluster_file = os.path.join(acc_results_path, acc_num + '.csv')
+
+    manifest = Manifest(acc_results_path)
+    sor_inputs = manifest.digest_inputs({'sor': sor_file})
+    loaded = list()     # holds the SOR class once some stage has needed it
+
+    # loads the SOR class the first time a stage needs it
+    def load_sor():
+        if len(loaded) == 0:
+            with span('load', acc_num):
+                loaded.append(SOR(acc_num, sor_file, binsize=nbin_size))
+        return loaded[0]
+
+    # density binning stage. An interactive cutoff is remembered, so a rerun does not ask for it again.
+    threshold_params = {'nbin_size': nbin_size, 'read_cutoff': 'interactive' if read_cutoff is None else read_cutoff,
+                        'stride': stride}
+    threshold_changed = force == 'y' or not manifest.is_current('threshold', sor_inputs, threshold_params)
+
+    if threshold_changed:
+        SOR_bug = load_sor()
+        with span('threshold', acc_num):
+            data = threshold_contigs(SOR_bug, read_cutoff, stride)
+        manifest.record('threshold', sor_inputs, threshold_params, data=data)
+    else:
+        print("Density binning for", acc_num, "is up to date.")
+    threshold = manifest.data('threshold')
+
+    print("Read density cutoff:", threshold['read_cutoff'])
+
+    # cluster analysis stage, one window at a time
+    cluster_params = {'cbin_size': cbin_size, 'cbin_cutoff': cbin_cutoff, 'c_min_sep': c_min_sep,
+                      'c_max_sep': c_max_sep, 'n_min_sep': n_min_sep, 'n_max_sep': n_max_sep, 'top_pairs': top_pairs}
+    previous = dict()
+    if force != 'y' and manifest.matches('clusters', sor_inputs, cluster_params):
+        previous = manifest.data('clusters')
+
+    analyzed = dict(previous)
+    todo = [window for window in threshold['windows'] if window_key(window) not in previous]
+    if len(todo) > 0:
+        cluster_setting = (cbin_size, cbin_cutoff, c_min_sep, c_max_sep, n_min_sep, n_max_sep, top_pairs)
+        analyses = analyze_windows(load_sor(), sor_file, todo, cluster_setting, jobs)
+        analyzed.update(zip([window_key(window) for window in todo], analyses))
+
+    window_results = dict()
+    results = list()
+    for window in threshold['windows']:
+        key = window_key(window)
+        window_results[key] = analyzed[key]
+        results.append(window_results[key])
+
+    # significance of every signal against its flanks; results from before this was added get it too
+    scored = 0
+    if any('log10_p' not in row for r in results for row in signal_rows(r)):
+        SOR_bug = load_sor()
+        with span('significance', acc_num):
+            scored = score_signals(SOR_bug, results)
+
+    clusters_changed = threshold_changed or scored > 0 or sorted(window_results) != sorted(previous)
+
+    detection = Detection(acc_num, results, threshold, dict(cluster_params, nbin_size=nbin_size, stride=stride))
+
+    written = clusters_changed or not manifest.is_current('clusters', sor_inputs, cluster_params)
+    if written:
+        write_detection_results(analysis_file, cluster_file, detection)
+        manifest.record('clusters', sor_inputs, cluster_params, outputs=(analysis_file, cluster_file),
+                        data=window_results)
+    else:
+        print("Cluster analysis for", acc_num, "is up to date.")
+
+    if parquet == 'y' and (written or not os.path.exists(signals_parquet_path(acc_results_path, acc_num))):
+        write_signals_parquet(acc_results_path, detection)
+    if db is not None and (written or not has_stage(db, acc_num, 'detect')):
+        store_detection(db, detection)
+
+    if draw_graphs == 'y':
+        SOR_bug = loaded[0] if len(loaded) > 0 else None
+        with span('render', acc_num):
+            draw_accession_graphs(acc_num, sor_file, acc_results_path, nbin_size, SOR_bug=SOR_bug, overwrite=force)
+
+    return detection
+
+
+# function read_analysis_parameter looks up a labelled value (e.g. 'Initial Density Cutoff') in an analysis file
+def read_analysis_parameter(analysis_file, label):
+
+    with open(analysis_file, 'r') as f:
+        for row in csv.reader(f):
+            if len(row) > 1 and row[0] == label:
+                return row[1]
+    return None
+
+
+# function draw_accession_graphs redraws the density histogram and inversion site pictures of an accession from
+# its SOR file and the results already written by detect_accession. It is a manifest stage of its own, keyed on
+# the SOR, analysis and cluster files, and is skipped when those have not changed unless overwrite is 'y'.
+def draw_accession_graphs(acc_num, sor_file, acc_results_path, nbin_size, SOR_bug=None, overwrite='n'):
+
+    analysis_file = os.path.join(acc_results_path, acc_num + ' cluster analysis.csv')
+    cluster_file = os.path.join(acc_results_path, acc_num + '.csv')
+    graph_path = os.path.join(acc_results_path, "Cluster Graphs")
+    histogram_file = os.path.join(acc_results_path, acc_num + '_histogram.png')
+
+    manifest = Manifest(acc_results_path)
+    inputs = manifest.digest_inputs({'sor': sor_file, 'analysis': analysis_file, 'clusters': cluster_file})
+    params = {'nbin_size': nbin_size}
+
+    if overwrite != 'y' and manifest.is_current('render_sites', inputs, params):
+        print("Cluster graphs for", acc_num, "are up to date.")
+        return
+
+    if not os.path.exists(graph_path):
+        os.makedirs(graph_path)
+
+    if SOR_bug is None:
+        SOR_bug = SOR(acc_num, sor_file, binsize=nbin_size)
+
+    # one histogram per contig; only genomes with several contigs get the contig in the file names
+    read_cutoff = float(read_analysis_parameter(analysis_file, 'Initial Density Cutoff'))
+    outputs = list()
+    for contig in SOR_bug.contig_names:
+        SOR_bug.select_contig(contig)
+        h_densities, den_bin_edges = SOR_bug.make_density_histogram()
+        SOR_bug.read_cutoff = read_cutoff
+        if len(SOR_bug.contig_names) > 1:
+            histogram_file = os.path.join(acc_results_path, acc_num + '_' + contig + '_histogram.png')
+        SOR_bug.save_density_histogram(h_densities, histogram_file)
+        outputs.append(histogram_file)
+
+    with open(cluster_file, 'r') as f:
+        for row in csv.DictReader(f):
+            pos1, pos2 = int(row['Signal Start']), int(row['Signal End'])
+            c_figname = os.path.join(graph_path, acc_num + '_cluster_' + str(pos1))
+            if 'Contig' in row:
+                SOR_bug.select_contig(row['Contig'])
+                c_figname = os.path.join(graph_path, acc_num + '_' + row['Contig'] + '_cluster_' + str(pos1))
+            data_subset = SOR_bug.subset(pos1 - 1000, pos2 + 1000)
+            draw_inversion_site(data_subset, pos1, pos2, c_figname)
+            outputs.append(c_figname + '.png')
+
+    manifest.record('render_sites', inputs, params, outputs=outputs)
+
+    return
+
+
+def detect_inversion_clusters(nbin_size, cbin_cutoff, cbin_size, c_min_sep, c_max_sep, n_min_sep, n_max_sep,
+                              working_path=None, read_cutoff=None, force='n', stride=None):
 
+    # define paths for file saving and loading
+    if working_path is None:
+        desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
+        working_path = os.path.join(desktop_path, "Cluster Detection")
+    results_path = os.path.join(working_path, 'Cluster Data')
+    sor_path = os.path.join(working_path, 'SOR Data')
 
+    accession_file = os.path.join(working_path, 'accession_list.txt')
+    accession_list = load_accession_list(accession_file)
 
+    # for each accession number...
+    for acc_num in accession_list:
 
+        # define the input and output files
+        sor_file = find_sor_file(sor_path, acc_num)
+        acc_results_path = os.path.join(results_path, acc_num)
 
+        detect_accession(acc_num, sor_file, acc_results_path, nbin_size, cbin_cutoff, cbin_size, c_min_sep,
+                         c_max_sep, n_min_sep, n_max_sep, read_cutoff=read_cutoff, force=force, stride=stride)
 
+    return
@@ -1,13 +1,16 @@
 # cluster_tools holds my classes
 
 # IMPORTS
+# reportlab, BioPython and requests are heavy (or may be missing entirely), so they are only imported
+# when a gene diagram is drawn or Entrez data is fetched. Parsing and matching need none of them.
+# Entrez and gene files may be compressed; compressed.open_text reads and writes them either way.
 import re
 import csv
 import os
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from Bio.Graphics import GenomeDiagram
-from Bio.SeqFeature import SeqFeature, FeatureLocation
+import bisect
+
+from .instrument import span
+from .compressed import open_text
 
 
 # class Sequence is a sequence of nucleotides
@@ -38,11 +41,15 @@ class Gene:
         self.locus_tag = locus_tag
         self.seq_start = 0  # nucleotide position of start
         self.seq_end = 1  # nucleotide position of end
+        self.segments = list()  # (start, end) of each piece of a gene in pieces (join), as written in the location
+        self.partial = ''  # '<' and/or '>' if the start and/or end of the gene lies beyond the sequenced bounds
         self.notes = 'I am a gene! Hear me roar.'
         self.function = 'What am I expected to do? Beg?'
+        self.contig = None  # name of the LOCUS record (chromosome, plasmid) the gene is on
 
 
-# class Bug holds some attributes, a sequence, and a list of genes
+# class Bug holds some attributes, a sequence, and a list of genes. Genomes with several chromosomes or plasmids
+# also get their genes split up per contig (LOCUS record), so clusters are only matched to genes on their own contig.
 class Bug:
 
     # initialize
@@ -51,8 +58,56 @@ class Bug:
         # define class vars
         self.sequence = Sequence()
         self.genes = list()
+        self.contigs = dict()   # contig name: genes on it, in file order
         self.name = name
         self.accession_num = accession_num
+        self._reach = dict()    # id of a gene list: (the list, running maximum of its gene ends, indices of its
+                                # genes in pieces), built when needed
+
+    # adds a gene to the gene list and to the list of its contig
+    def add_gene(self, gene):
+
+        self.genes.append(gene)
+        self.contigs.setdefault(gene.contig, list()).append(gene)
+        self._reach.clear()
+        return
+
+    # returns the index of the first gene in genes (a list returned by contig_genes) that reaches position pos or
+    # beyond; every gene before it lies wholly below pos, apart from genes in pieces (see genes_in_pieces), which are
+    # left out so one spanning the whole genome across the origin does not hold every search back to the start.
+    # Genes are in file order rather than sorted, so this bisects the running maximum of the gene ends (or starts,
+    # whichever is larger).
+    def first_gene_reaching(self, genes, pos):
+        return bisect.bisect_left(self._gene_index(genes)[1], pos)
+
+    # returns the indices in genes (a list returned by contig_genes) of the genes in more than one piece
+    def genes_in_pieces(self, genes):
+        return self._gene_index(genes)[2]
+
+    # builds (or looks up) the running maximum of the gene ends and the genes in pieces of a gene list
+    def _gene_index(self, genes):
+
+        cached = self._reach.get(id(genes))
+        if cached is None or cached[0] is not genes:
+            reach, furthest = list(), float('-inf')
+            for gene in genes:
+                if len(gene.segments) <= 1:
+                    furthest = max(furthest, gene.seq_start, gene.seq_end)
+                reach.append(furthest)
+            cached = (genes, reach, [k for k, gene in enumerate(genes) if len(gene.segments) > 1])
+            self._reach[id(genes)] = cached
+        return cached
+
+    # returns the genes on a contig. Contig None, or a gene file without contigs, means all of the genes; contig
+    # names match with or without a version suffix (FN545816 and FN545816.1).
+    def contig_genes(self, contig):
+
+        if contig is None or list(self.contigs) == [None]:
+            return self.genes
+        for name in self.contigs:
+            if name is not None and same_contig(name, contig):
+                return self.contigs[name]
+        return list()
 
     # load genes from gene file onto bug genes
     def load_genes_from_file(self, gene_file):
@@ -63,7 +118,7 @@ class Bug:
             return
 
         # open the gene file and start slapping it into the bug class
-        with open(gene_file, 'r') as f:
+        with open_text(gene_file, 'r') as f:
             reader = csv.DictReader(f)
 
             for row in reader:
@@ -71,11 +126,16 @@ class Bug:
                 try:
                     this_gene = Gene(row['locus_tag'], row['gene'], row['is_complement'])
                     this_gene.seq_start, this_gene.seq_end = int(row['loc_start']), int(row['loc_end'])
+                    if row.get('segments'):
+                        this_gene.segments = [tuple(int(x) for x in part.split('..'))
+                                              for part in row['segments'].split(';')]
+                    this_gene.partial = row.get('partial') or ''
                     this_gene.translation.sequence = Sequence(sequence=row['translation'], code='protein')
                     this_gene.function = row['product']
+                    this_gene.contig = row.get('contig') or None
 
                     # add the gene to the gene list for the bug
-                    self.genes.append(this_gene)
+                    self.add_gene(this_gene)
                 except ValueError:
                     # May occur if the locations are invalid
                     pass
@@ -87,13 +147,9 @@ class Bug:
         return
 
 
-# I use requests to get data from Entrez.
-try:
-    import requests
-except ImportError:
-    print("Requests module not found. Please download requests into python directory.")
-    requests = None
-    quit()
+# function same_contig tells whether two contig names are the same sequence, ignoring any version suffix
+def same_contig(a, b):
+    return a == b or a.split('.')[0] == b.split('.')[0]
 
 
 # function stringify combines the elements in a list and returns a string separated by semicolons
@@ -114,6 +170,12 @@ def get_entrez_data(acc_num, entrez_file, db='nucleotide', rettype='gb', retmode
         print("Entrez file for", acc_num, "is already downloaded.")
         return
 
+    # I use requests to get data from Entrez, but only load it once we actually need to download something.
+    try:
+        import requests
+    except ImportError:
+        raise ImportError("Requests module not found. Please download requests into python directory.")
+
     print("Now downloading Entrez Data for accession number", acc_num, "...")
 
     # Generate the URL
@@ -139,9 +201,8 @@ def get_entrez_data(acc_num, entrez_file, db='nucleotide', rettype='gb', retmode
     # Turn the request into a file at entrez_path
     print("Saving data as", entrez_file, "...")
 
-    with open(entrez_file, 'w') as f:
-        for line in r.text:
-            f.write(line)
+    with open_text(entrez_file, 'w') as f:
+        f.write(r.text)
 
     print("Saved successfully.")
 
@@ -169,12 +230,13 @@ def find_genes(acc_num, entrez_file, gene_file, parse_mode='gbflat'):
     print("Parsing gene data from", entrez_file, "using parse mode", parse_mode, "...")
 
     if parse_mode == 'gbflat':
-        parse_gbflat_genes(entrez_file, gene_file)
+        with span('gene_parse', acc_num):
+            parse_gbflat_genes(entrez_file, gene_file)
 
     # Now check the gene data quickly. Sometimes, the gb file for certain accession numbers (usually the ones
     # that start with NZ_) require a gbwithparts request. In that case, redownload and recall.
 
-    with open(gene_file, 'r') as f:
+    with open_text(gene_file, 'r') as f:
 
         # get the second line
         f.readline()
@@ -199,15 +261,88 @@ def find_genes(acc_num, entrez_file, gene_file, parse_mode='gbflat'):
     return
 
 
+# tokens of a GenBank feature location: operators, brackets, range marks, numbers and references to other records
+# (e.g. 'J00194.1:100..202'); anything else is a single character token that fails the parse
+_LOCATION_TOKEN = re.compile(r'[A-Za-z][^(),:]*:|complement|join|order|[(),^<>]|\.\.|\.|\d+|\S')
+
+# the shape nearly every CDS has, start..end or complement(start..end), which is read without tokenizing
+_SIMPLE_LOCATION = re.compile(r'(complement\()?(<?)(\d+)\.\.(>?)(\d+)(\)?)$')
+
+
+# function parse_location reads a GenBank feature location such as 'complement(join(<1..206,4000..4312))'. Returns
+# the (start, end) segments on this record in the order written, whether the feature is on the complementary
+# strand ('Y' or 'N'; for a mix of strands the first segment decides) and its partial marks ('<' for an unknown
+# start, '>' for an unknown end, both, or ''). join and order are both read as a list of segments, single bases
+# and between-base sites (102^103) are segments too, and segments on other records are left out. Returns None for a
+# location that cannot be read.
+def parse_location(text):
+
+    simple = _SIMPLE_LOCATION.match(text)
+    if simple is not None:
+        opening, lower, start, upper, end, closing = simple.groups()
+        if (opening is None) == (closing == ''):
+            return [(int(start), int(end))], 'N' if opening is None else 'Y', lower + upper
+
+    tokens = _LOCATION_TOKEN.findall(text)
+    segments = list()
+    try:
+        i = _parse_location(tokens, 0, False, segments)
+    except (IndexError, ValueError):
+        return None
+    if i != len(tokens) or len(segments) == 0:
+        return None
+
+    is_complement = 'Y' if segments[0][2] else 'N'
+    partial = ('<' if any(s[3] for s in segments) else '') + ('>' if any(s[4] for s in segments) else '')
+    return [(s[0], s[1]) for s in segments], is_complement, partial
+
+
+# reads one location starting at token i into segments as (start, end, complement, lower partial, upper partial),
+# returning the index of the token after it
+def _parse_location(tokens, i, complement, segments):
+
+    operator = tokens[i]
+    if operator in ('complement', 'join', 'order'):
+        if tokens[i + 1] != '(':
+            raise ValueError(operator + " without (")
+        inner = not complement if operator == 'complement' else complement
+        i = _parse_location(tokens, i + 2, inner, segments)
+        while operator != 'complement' and tokens[i] == ',':
+            i = _parse_location(tokens, i + 1, inner, segments)
+        if tokens[i] != ')':
+            raise ValueError(operator + " without )")
+        return i + 1
+
+    remote = operator.endswith(':')
+    if remote:
+        i += 1
+
+    lower_partial = tokens[i] == '<'
+    if lower_partial:
+        i += 1
+    start = end = int(tokens[i])
+    i += 1
+
+    upper_partial = False
+    if i < len(tokens) and tokens[i] in ('..', '.', '^'):
+        i += 1
+        if tokens[i] in ('<', '>'):
+            upper_partial = tokens[i] == '>'
+            i += 1
+        end = int(tokens[i])
+        i += 1
+
+    if not remote:
+        segments.append((start, end, complement, lower_partial, upper_partial))
+    return i
+
+
 # this gene parser grabs data from gbflat files.
 def parse_gbflat_genes(entrez_file, gene_file):
 
-    # Define regex passphrases
-    match_comp_loc = re.compile('(?<=complement\()[a-z-0-9. ]*', re.I)  # captures complement(.....)
-
-    with open(entrez_file, 'r') as e:
+    with open_text(entrez_file, 'r') as e:
 
-        with open(gene_file, 'w') as g:
+        with open_text(gene_file, 'w') as g:
 
             # make g into a csv writer
             writer = csv.writer(g, delimiter=',')
@@ -218,9 +353,13 @@ def parse_gbflat_genes(entrez_file, gene_file):
                              'gene',
                              'protein_id',
                              'product',
-                             'translation'))
+                             'translation',
+                             'contig',
+                             'segments',
+                             'partial'))
 
             end_file = -1
+            contig = ''     # name of the LOCUS record being read; files may hold several (chromosomes, plasmids)
 
             # while we haven't reached the end of the file, continue scanning for data
             while end_file == -1:
@@ -232,6 +371,9 @@ def parse_gbflat_genes(entrez_file, gene_file):
                 if data_line == '':
                     end_file = 1
 
+                if data_line.startswith('LOCUS'):
+                    contig = data_line.split()[1]
+
                 # CDS string is within the first ten characters if a new CDS is being described.
                 if 'CDS' in data_line[0:10]:
 
@@ -243,43 +385,39 @@ def parse_gbflat_genes(entrez_file, gene_file):
                     product = 'N/A'
                     translation = 'N/A'
 
+                    gene_contig = contig
+
                     try:
 
-                        # the first line contains location data. It may be a variety of forms...
-
-                        # May look like a complementary sequence, like complement(xxx...xxx). Regex nails this.
-                        if 'complement' in data_line:
-                            is_complement = 'Y'
-                            try:
-                                locs = match_comp_loc.findall(data_line).pop().split('..')
-                                loc_start = locs[0]
-                                loc_end = locs[1]
-                            except IndexError:
-                                loc_start = 'N/A'
-                                loc_end = 'N/A'
-
-                        # May be a join sequence, usually for pseudogenes. join(xxx.xxx, xxx.xxx).
-                        elif 'join' in data_line:
-                            try:
-                                loc_start = data_line.split('(')[1].split(')')[0].split(',')[0].split('..')[0]
-                                loc_end = data_line.split('(')[1].split(')')[0].split(',')[1].split('..')[1]
-                            except IndexError:
-                                loc_start = 'N/A'
-                                loc_end = 'N/A'
-
-                        # Just be the nice standard (xxx.xxx)
+                        # the location starts in column 22 of the first line. A long one (a join of many
+                        # pieces) carries on over the next lines until its brackets close.
+                        location = data_line[21:].strip()
+                        while location.count('(') > location.count(')'):
+                            data_line = e.readline()
+                            if data_line == '':
+                                end_file = 1
+                                break
+                            location += data_line.strip()
+
+                        # the gene spans its lowest to its highest position; the segments are kept so genes in
+                        # pieces can be matched exactly
+                        parsed = parse_location(location)
+                        if parsed is None:
+                            loc_start, loc_end, segments, partial = 'N/A', 'N/A', '', ''
                         else:
-                            try:
-                                loc_start = (data_line.split(' ')[len(data_line.split(' ')) - 1]).split('..')[0]
-                                loc_end = ((data_line.split(' ')[len(data_line.split(' ')) - 1]).split('..')[1])[:-1]
-                            except IndexError:
-                                loc_start = 'N/A'
-                                loc_end = 'N/A'
+                            spans, is_complement, partial = parsed
+                            if len(spans) == 1:
+                                loc_start, loc_end = spans[0]
+                                segments = '{0}..{1}'.format(loc_start, loc_end)
+                            else:
+                                loc_start = min(min(span) for span in spans)
+                                loc_end = max(max(span) for span in spans)
+                                segments = ';'.join('{0}..{1}'.format(*span) for span in spans)
 
                         # Alright, so the CDS ends when the first ten chars of the newline read 'gene'. So let's
                         # loop until we either hit the start of the new sequence or the end of the file.
 
-                        while data_line.split('gene')[0] != '     ' and end_file == -1:
+                        while not data_line.startswith('     gene') and end_file == -1:
 
                             # get the next line
                             data_line = e.readline()
@@ -288,6 +426,10 @@ def parse_gbflat_genes(entrez_file, gene_file):
                             if data_line == '':
                                 end_file = 1
 
+                            # the last CDS of a record reads on into the next one
+                            if data_line.startswith('LOCUS'):
+                                contig = data_line.split()[1]
+
                             # look for data in this line
                             if '/gene' in data_line:
                                 gene = data_line.split('"')[1]
@@ -325,13 +467,8 @@ def parse_gbflat_genes(entrez_file, gene_file):
 
                                     payload = payload + part
 
-                                # I cannot figure out where these blank spaces come from...so split and anneal.
-                                parts = payload.split(' ')
-                                final_payload = ''
-                                for part in parts:
-                                    final_payload += part
-
-                                translation = final_payload
+                                # I cannot figure out where these blank spaces come from...so take them out.
+                                translation = payload.replace(' ', '')
 
                         # alright, now we have all the data for the CDS. Write the row onto the file.
                         writer.writerow((loc_start,
@@ -341,7 +478,10 @@ def parse_gbflat_genes(entrez_file, gene_file):
                                          gene,
                                          protein_id,
                                          product,
-                                         translation))
+                                         translation,
+                                         gene_contig,
+                                         segments,
+                                         partial))
 
                     # sometimes I get an index error due to reasons...just pass on through.
                     except IndexError:
@@ -352,19 +492,10 @@ def parse_gbflat_genes(entrez_file, gene_file):
     return
 
 
-# function match_clusters takes cluster positions and looks for a given maximum number of genes in the
-# proximity of the cluster by relying on gene data in class Bug
-def match_clusters_to_genes(bug, cluster_file, results_file, trans_file, graph_path, ntol=2000, max_genes=5):
-
-    print("Matching cluster data to genes for accession number", bug.accession_num, "...")
+# function load_cluster_positions reads the signal start and end positions out of a cluster file, sorted. Cluster
+# files of genomes with several contigs give (start, end, contig).
+def load_cluster_positions(cluster_file):
 
-    # Check for cluster data
-    if not os.path.exists(cluster_file):
-        print("Cluster file for", bug.accession_num, "not found!! Exiting...")
-        quit()
-
-    print("Loading clustering data from", cluster_file, "...")
-    # Open cluster data as csv file and add to list cluster_positions
     cluster_positions = list()
     with open(cluster_file, 'r') as f:
         reader = csv.DictReader(f)
@@ -373,121 +504,201 @@ def match_clusters_to_genes(bug, cluster_file, results_file, trans_file, graph_p
             pos_start = int(row['Signal Start'])
             pos_end = int(row['Signal End'])
 
-            cluster_positions.append((pos_start, pos_end))
+            if 'Contig' in row:
+                cluster_positions.append((pos_start, pos_end, row['Contig']))
+            else:
+                cluster_positions.append((pos_start, pos_end))
 
     # I prefer the clusters to be sorted :)
-    cluster_positions = sorted(cluster_positions)
-    num_pos = len(cluster_positions)
+    return sorted(cluster_positions)
 
-    print("Loaded", num_pos, "cluster locations.")
 
-    print("Finding genes around given clusters...")
+# function find_nearby_genes looks for at most max_genes genes within ntol nucleotides of a (start, end) cluster.
+# Returns the loci, products and translations of the genes closest to the middle of the cluster. A cluster given
+# as (start, end, contig) only looks at the genes on that contig. Genes lying wholly below the cluster range are
+# skipped over with a bisection (see Bug.first_gene_reaching), since none of them can be a hit. A gene in pieces
+# spans its lowest to its highest position but only counts if one of its pieces reaches into the cluster range, so
+# a gene across the origin of a circular genome (join(N..end,1..M), loc_start 1 and loc_end the genome end) hits
+# clusters near either end of the genome and none in between.
+def find_nearby_genes(bug, cluster, ntol=2000, max_genes=5):
 
-    # open the results file as a csv writer tab delim.
-    with open(results_file, 'w') as f:
-        writer = csv.writer(f, delimiter='\t')
+    genes = bug.contig_genes(cluster[2] if len(cluster) > 2 else None)
 
-        writer.writerow(("Cluster Pos", "Number Nearby Genes", "Loci", "Products"))
+    pos_start = cluster[0]
+    pos_end = cluster[1]
+    cluster_pos = (pos_end + pos_start) / 2
 
-        # For each cluster...
-        for cluster_pos in cluster_positions:
+    cluster_min = pos_start - ntol
+    cluster_max = pos_end + ntol
+
+    i = bug.first_gene_reaching(genes, cluster_min)  # index position
+    total_genes = len(genes)
 
-            # initialize values
-            loc_start = -1
-            loc_end = 1
+    loci = list()
+    products = list()
+    translations = list()
 
-            pos_start = cluster_pos[0]
-            pos_end = cluster_pos[1]
-            cluster_pos = (pos_end + pos_start) / 2
+    # hit_scores list tells us the difference of distance of the middle of the gene to the cluster
+    hit_scores = list()
 
-            cluster_min = pos_start - ntol
-            cluster_max = pos_end + ntol
-            cluster = (pos_start, pos_end)
+    # walk the genes until one begins past the cluster max position. Genes in pieces can be listed anywhere in the
+    # file (one across the origin often comes first or last), so those outside the walk are looked at too.
+    stop = i
+    while (stop < total_genes) and (genes[stop].seq_start <= cluster_max):
+        stop += 1
+    nearby = sorted(list(range(i, stop)) + [k for k in bug.genes_in_pieces(genes) if k < i or k >= stop])
 
-            i = 0  # index position
+    for i in nearby:
 
-            loci = list()
-            products = list()
-            translations = list()
-            protein_id = list()
+        loc_start = genes[i].seq_start
+        loc_end = genes[i].seq_end
+        loc_avg = loc_start + ((loc_end - loc_start) / 2)
 
-            # hit_scores list tells us the difference of distance of the middle of the gene to the cluster
-            hit_scores = list()
+        # a gene in pieces (join) only counts if one of its pieces reaches into the cluster range
+        segments = genes[i].segments
+        if len(segments) > 1 and not any(min(seg) <= cluster_max and max(seg) >= cluster_min for seg in segments):
+            continue
 
-            # while the beginning of the gene location does not exceed the cluster max position
-            while loc_start <= cluster_max:
+        # does the end of the gene peek into the cluster range?
+        if (loc_end >= cluster_min) and (loc_start <= cluster_min):
+            loci.append(genes[i].locus_tag)
+            products.append(genes[i].function)
+            translations.append(genes[i].translation.sequence.sequence)
+            hit_scores.append(cluster_pos - loc_avg)
 
-                loc_start = bug.genes[i].seq_start
-                loc_end = bug.genes[i].seq_end
-                loc_avg = loc_start + ((loc_end - loc_start) / 2)
+        # does it lie square in the middle?
+        if (loc_start >= cluster_min) and (loc_end <= cluster_max):
+            loci.append(genes[i].locus_tag)
+            products.append(genes[i].function)
+            translations.append(genes[i].translation.sequence.sequence)
+            hit_scores.append(abs(cluster_pos - loc_avg))
 
-                # does the end of the gene peek into the cluster range?
-                if (loc_end >= cluster_min) and (loc_start <= cluster_min):
-                    loci.append(bug.genes[i].locus_tag)
-                    products.append(bug.genes[i].function)
-                    translations.append(bug.genes[i].translation.sequence.sequence)
-                    hit_scores.append(cluster_pos - loc_avg)
+        # does it clip in at the end?
+        if (loc_start <= cluster_max) and (loc_end >= cluster_max):
+            loci.append(genes[i].locus_tag)
+            products.append(genes[i].function)
+            translations.append(genes[i].translation.sequence.sequence)
+            hit_scores.append(loc_avg - cluster_pos)
 
-                # does it lie square in the middle?
-                if (loc_start >= cluster_min) and (loc_end <= cluster_max):
-                    loci.append(bug.genes[i].locus_tag)
-                    products.append(bug.genes[i].function)
-                    translations.append(bug.genes[i].translation.sequence.sequence)
-                    hit_scores.append(abs(cluster_pos - loc_avg))
+    # if there were no nearby loci, report it as such
+    if len(loci) == 0:
+        loci.append('No nearby loci')
+        products.append('N/A')
+        translations.append('N/A')
 
-                # does it clip in at the end?
-                if (loc_start <= cluster_max) and (loc_end >= cluster_max):
-                    loci.append(bug.genes[i].locus_tag)
-                    products.append(bug.genes[i].function)
-                    translations.append(bug.genes[i].translation.sequence.sequence)
-                    hit_scores.append(loc_avg - cluster_pos)
+    # if the number of genes we got exceeded our threshold, trim off the edges
+    if len(loci) > max_genes:
 
-                i += 1
+        excess = len(loci) - max_genes
 
-            # if there were no nearby loci, report it as such
-            if len(loci) == 0:
-                loci.append('No nearby loci')
-                products.append('N/A')
-                translations.append('N/A')
+        for x in range(0, excess):
+            sorted_scores = sorted(hit_scores, reverse=True)
 
-            # if the number of genes we got exceeded our threshold, trim off the edges
-            if len(loci) > max_genes:
+            # r is our element to remove based on the highest distance score
+            r = hit_scores.index(sorted_scores[0])
+            loci.pop(r)
+            products.pop(r)
+            translations.pop(r)
+            hit_scores.pop(r)
 
-                excess = len(loci) - max_genes
+    return loci, products, translations
 
-                for x in range(0, excess):
-                    sorted_scores = sorted(hit_scores, reverse=True)
 
-                    # r is our element to remove based on the highest distance score
-                    r = hit_scores.index(sorted_scores[0])
-                    loci.pop(r)
-                    products.pop(r)
-                    translations.pop(r)
-                    hit_scores.pop(r)
+# function match_clusters takes cluster positions and looks for a given maximum number of genes in the
+# proximity of the cluster by relying on gene data in class Bug. Set draw_graphs to 'n' to skip the gene diagrams.
+# Returns the hits written to the results file, one {'cluster', 'loci', 'products'} dictionary per cluster.
+def match_clusters_to_genes(bug, cluster_file, results_file, trans_file, graph_path, ntol=2000, max_genes=5,
+                            draw_graphs='y'):
+
+    print("Matching cluster data to genes for accession number", bug.accession_num, "...")
+
+    # Check for cluster data
+    if not os.path.exists(cluster_file):
+        print("Cluster file for", bug.accession_num, "not found!! Exiting...")
+        quit()
+
+    print("Loading clustering data from", cluster_file, "...")
+    # Open cluster data as csv file and add to list cluster_positions
+    cluster_positions = load_cluster_positions(cluster_file)
+    num_pos = len(cluster_positions)
+
+    print("Loaded", num_pos, "cluster locations.")
+
+    print("Finding genes around given clusters...")
+
+    hits = list()
+
+    # open the results file as a csv writer tab delim.
+    with open(results_file, 'w') as f:
+        writer = csv.writer(f, delimiter='\t')
+
+        # genomes with several contigs get the contig of each cluster as an extra column
+        contigs = len(cluster_positions) > 0 and len(cluster_positions[0]) > 2
+        if contigs:
+            writer.writerow(("Cluster Pos", "Number Nearby Genes", "Loci", "Products", "Contig"))
+        else:
+            writer.writerow(("Cluster Pos", "Number Nearby Genes", "Loci", "Products"))
+
+        # For each cluster...
+        for cluster in cluster_positions:
+
+            cluster_pos = (cluster[1] + cluster[0]) / 2
+            loci, products, translations = find_nearby_genes(bug, cluster, ntol, max_genes)
 
             # write a gene diagram for this set!
-            graph_file = os.path.join(graph_path, bug.accession_num + '_' + str(int(cluster_pos)) + '.pdf')
-            draw_cluster_gene_diagram(bug, cluster, loci, graph_file)
+            if draw_graphs == 'y':
+                draw_cluster_gene_diagram(bug, cluster, loci, gene_diagram_file(bug, cluster, graph_path))
 
             # finally, write the row!
-            writer.writerow((cluster_pos, str(len(loci)), stringify(loci), stringify(products)))
+            row = (cluster_pos, str(len(loci)), stringify(loci), stringify(products))
+            writer.writerow(row + (cluster[2],) if contigs else row)
+            hits.append({'cluster': cluster, 'loci': loci, 'products': products})
 
             # Oggy needs a file with all the translations, so write that shit up.
             with open(trans_file, 'a') as h:
-                i = 0
+                j = 0
                 for t in translations:
-                    header = '>' + bug.accession_num + '_' + loci[i] + '\n'
+                    header = '>' + bug.accession_num + '_' + loci[j] + '\n'
                     h.write(header)
                     h.write(t + '\n')
-                    i += 1
+                    j += 1
 
     print("Linkage complete!\n")
+    return hits
+
+
+# function gene_diagram_file names the gene diagram pdf of a cluster, named after the middle of the cluster (and its
+# contig, if it has one)
+def gene_diagram_file(bug, cluster, graph_path):
+
+    cluster_pos = (cluster[1] + cluster[0]) / 2
+    name = bug.accession_num + '_' + str(int(cluster_pos))
+    if len(cluster) > 2:
+        name = bug.accession_num + '_' + cluster[2] + '_' + str(int(cluster_pos))
+    return os.path.join(graph_path, name + '.pdf')
+
+
+# function draw_gene_diagrams draws the gene diagram of every cluster in a cluster file without redoing the tsv.
+# Diagrams that already exist are left alone unless overwrite is 'y'.
+def draw_gene_diagrams(bug, cluster_file, graph_path, ntol=2000, max_genes=5, overwrite='n'):
+
+    for cluster in load_cluster_positions(cluster_file):
+        graph_file = gene_diagram_file(bug, cluster, graph_path)
+        if overwrite != 'y' and os.path.exists(graph_file):
+            continue
+        loci, products, translations = find_nearby_genes(bug, cluster, ntol, max_genes)
+        draw_cluster_gene_diagram(bug, cluster, loci, graph_file)
+
     return
 
 
 # use BioPython tools and the final result file to draw a gene diagram showing our inversion sites
 def draw_cluster_gene_diagram(bug, cluster, loci, fig_path):
 
+    from reportlab.lib.units import cm
+    from Bio.Graphics import GenomeDiagram
+    from Bio.SeqFeature import SeqFeature, FeatureLocation
+
     # compile a dict such that {locus_tag}:{start, end, strand, product}
     data_dict = dict()
     for tag in loci:
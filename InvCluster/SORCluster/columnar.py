@@ -0,0 +1,117 @@
+#! usr/bin/python
+
+"""columnar writes the detection and gene matching results as Parquet files next to the csv and tsv files, for
+gathering up the results of many genomes at once. The columns are typed: positions and read counts are integers,
+percentages and p-values floats, and the loci and products near a cluster are lists rather than one
+semicolon-joined string. Signals without a contig (single contig genomes) have a null contig.
+
+    <acc> signals.parquet    one row per signal, pairs and spikes alike (see is_pair)
+    <acc> gene hits.parquet  one row per inversion pair, with the genes found near it
+
+pyarrow is only needed if Parquet output is asked for, so it is imported then.
+"""
+
+import os
+import glob
+
+SIGNALS_SUFFIX = ' signals.parquet'
+GENE_HITS_SUFFIX = ' gene hits.parquet'
+
+
+# function require_pyarrow imports pyarrow and pyarrow.parquet, or says how to get them
+def require_pyarrow():
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow module not found. Please install pyarrow for Parquet output.")
+    return pyarrow, pyarrow.parquet
+
+
+# function signals_parquet_path names the signal table of an accession
+def signals_parquet_path(acc_results_path, acc_num):
+    return os.path.join(acc_results_path, acc_num + SIGNALS_SUFFIX)
+
+
+# function gene_hits_parquet_path names the gene hit table of an accession
+def gene_hits_parquet_path(acc_results_path, acc_num):
+    return os.path.join(acc_results_path, acc_num + GENE_HITS_SUFFIX)
+
+
+# function signal_arrow_table turns the signal table of a Detection (see cluster_detect.signal_table) into an Arrow
+# table, with the accession number added as a column
+def signal_arrow_table(detection):
+
+    pa, pq = require_pyarrow()
+    signals = detection.signals
+
+    columns = {'accession': pa.array([detection.accession_num] * len(signals), type=pa.string()),
+               'contig': pa.array([str(c) if c != '' else None for c in signals['contig']], type=pa.string())}
+    for name in signals.dtype.names:
+        if name != 'contig':
+            columns[name] = pa.array(signals[name])
+    return pa.table(columns)
+
+
+# function gene_hit_arrow_table turns the gene hits returned by match_clusters_to_genes into an Arrow table: the
+# cluster, its middle, and the loci and products of the genes near it as list columns (empty if there were none)
+def gene_hit_arrow_table(acc_num, hits):
+
+    pa, pq = require_pyarrow()
+
+    loci, products = list(), list()
+    for hit in hits:
+        found = hit['loci'] != ['No nearby loci']
+        loci.append(hit['loci'] if found else list())
+        products.append(hit['products'] if found else list())
+
+    return pa.table({
+        'accession': pa.array([acc_num] * len(hits), type=pa.string()),
+        'contig': pa.array([hit['cluster'][2] if len(hit['cluster']) > 2 else None for hit in hits],
+                           type=pa.string()),
+        'start': pa.array([hit['cluster'][0] for hit in hits], type=pa.int64()),
+        'end': pa.array([hit['cluster'][1] for hit in hits], type=pa.int64()),
+        'cluster_pos': pa.array([(hit['cluster'][0] + hit['cluster'][1]) / 2 for hit in hits], type=pa.float64()),
+        'num_genes': pa.array([len(x) for x in loci], type=pa.int64()),
+        'loci': pa.array(loci, type=pa.list_(pa.string())),
+        'products': pa.array(products, type=pa.list_(pa.string()))})
+
+
+# function write_parquet saves an Arrow table as a Parquet file, writing to a temporary file first so a reader never
+# sees half of one
+def write_parquet(table, parquet_file):
+
+    pa, pq = require_pyarrow()
+    tmp_file = parquet_file + '.tmp'
+    pq.write_table(table, tmp_file)
+    os.replace(tmp_file, parquet_file)
+    return
+
+
+# function write_signals_parquet writes the signal table of a Detection into the accession's results folder
+def write_signals_parquet(acc_results_path, detection):
+
+    parquet_file = signals_parquet_path(acc_results_path, detection.accession_num)
+    write_parquet(signal_arrow_table(detection), parquet_file)
+    return parquet_file
+
+
+# function write_gene_hits_parquet writes the gene hits of an accession into its results folder
+def write_gene_hits_parquet(acc_results_path, acc_num, hits):
+
+    parquet_file = gene_hits_parquet_path(acc_results_path, acc_num)
+    write_parquet(gene_hit_arrow_table(acc_num, hits), parquet_file)
+    return parquet_file
+
+
+# function gather_parquet reads the signal ('signals') or gene hit ('gene hits') tables of every accession under
+# results_path into one Arrow table
+def gather_parquet(results_path, kind='signals'):
+
+    pa, pq = require_pyarrow()
+    suffix = SIGNALS_SUFFIX if kind == 'signals' else GENE_HITS_SUFFIX
+    files = sorted(glob.glob(os.path.join(glob.escape(results_path), '*', '*' + suffix)))
+    if len(files) == 0:
+        return None
+    return pa.concat_tables([pq.read_table(f) for f in files])
@@ -0,0 +1,138 @@
+#! usr/bin/python
+
+"""comparative runs detection over several SOR files of the same accession (a time series, or conditions) at once
+and tabulates the inversion reads of every sample side by side.
+
+Each SOR file is loaded once. The samples are screened on the same density bins of each contig, and a window is a
+candidate if it passes the cutoff in any sample, so every sample is analyzed over the same windows. The Cluster
+analysis is then run per sample on those shared windows, and the result is one table with a row per window and,
+per sample, the signal found there, its read count, its share of the window's reads and its significance.
+"""
+
+import os
+import csv
+import numpy as np
+
+from .detect_inversions import SOR, histogram_edges, binned_counts, range_counts, merged_regions
+from .cluster_detect import analyze_windows, score_signals
+from .compressed import plain_name
+
+
+# function sample_name names a sample after its SOR file, e.g. 'SOR Data/FN545816_t0.csv' -> 'FN545816_t0' (and the
+# same for 'FN545816_t0.csv.gz')
+def sample_name(sor_file):
+    return os.path.splitext(os.path.basename(plain_name(sor_file)))[0]
+
+
+# function union_contigs lists the contigs of all samples, in the order they are first seen
+def union_contigs(samples):
+
+    contigs = list()
+    for SOR_bug in samples:
+        contigs += [contig for contig in SOR_bug.contig_names if contig not in contigs]
+    return contigs
+
+
+# function union_windows screens every sample holding the contig on the same bins (or, with a stride, the same
+# sliding windows) spanning all of their reads, and returns the windows that pass read_cutoff in at least one.
+# Each sample's densities are scaled by its own read total, so a shallow sample counts as much as a deep one.
+def union_windows(samples, contig, nbin_size, read_cutoff, stride=None):
+
+    present = list()
+    for SOR_bug in samples:
+        if contig in SOR_bug.contig_names:
+            SOR_bug.select_contig(contig)
+            if SOR_bug.data_sum > 0:
+                present.append(SOR_bug)
+    if len(present) == 0:
+        return list()
+
+    pos_min = min(int(SOR_bug.pos_min) for SOR_bug in present)
+    pos_max = max(int(SOR_bug.pos_max) for SOR_bug in present)
+    edges = histogram_edges(pos_min, pos_max, int((pos_max - pos_min) / nbin_size))
+    width = edges[1] - edges[0]
+
+    if stride is None:
+        passing = np.zeros(len(edges) - 1, dtype=bool)
+        for SOR_bug in present:
+            counts = binned_counts(SOR_bug.positions, SOR_bug.cum_counts, edges)
+            passing |= counts / np.diff(edges) / counts.sum() >= read_cutoff
+        return [(float(edges[i]), float(edges[i]) + width) for i in np.flatnonzero(passing)]
+
+    starts = np.arange(pos_min, pos_max, stride, dtype=np.float64)
+    passing = np.zeros(len(starts), dtype=bool)
+    for SOR_bug in present:
+        passing |= range_counts(SOR_bug.positions, SOR_bug.cum_counts, starts, starts + width) / width / \
+            SOR_bug.data_sum >= read_cutoff
+    return merged_regions(starts[passing], width)
+
+
+# function compare_samples runs detection over the SOR files of one accession (sample name: SOR file) on shared
+# windows. Returns the windows, tagged with their contig if the samples hold more than one, and per sample a list
+# with the analyze_window result of each window, or None where the sample has no reads in it. With jobs > 1 each
+# sample's windows are spread over that many processes.
+def compare_samples(acc_num, sor_files, nbin_size, read_cutoff, cbin_size, cbin_cutoff, c_min_sep, c_max_sep,
+                    n_min_sep, n_max_sep, stride=None, jobs=1):
+
+    samples = [SOR(acc_num, sor_files[name], binsize=nbin_size) for name in sor_files]
+    contigs = union_contigs(samples)
+
+    windows = list()
+    for contig in contigs:
+        contig_windows = union_windows(samples, contig, nbin_size, read_cutoff, stride)
+        windows += contig_windows if len(contigs) == 1 else [(start, end, contig) for start, end in contig_windows]
+    print("Found", len(windows), "candidate windows over", len(samples), "samples of", acc_num)
+
+    cluster_setting = (cbin_size, cbin_cutoff, c_min_sep, c_max_sep, n_min_sep, n_max_sep)
+    results = dict()
+    for name, SOR_bug in zip(sor_files, samples):
+
+        # windows on a contig the sample lacks, or holding none of its reads, have nothing to analyze
+        has_reads = list()
+        for window in windows:
+            contig = window[2] if len(window) > 2 else contigs[0]
+            if contig in SOR_bug.contig_names:
+                SOR_bug.select_contig(contig)
+                has_reads.append(SOR_bug.window_count(window[0], window[1]) > 0)
+            else:
+                has_reads.append(False)
+
+        todo = [window for window, found in zip(windows, has_reads) if found]
+        print("Analyzing", len(todo), "windows of sample", name, "...")
+        analyses = iter(analyze_windows(SOR_bug, sor_files[name], todo, cluster_setting, jobs))
+        results[name] = [next(analyses) if found else None for found in has_reads]
+        score_signals(SOR_bug, [r for r in results[name] if r is not None])
+
+    return windows, results
+
+
+# function write_comparison writes the comparison table: a row per window, and per sample the signal found in it,
+# whether it is a true pair, its read count, its percentage of the window's reads and its log10 p-value against the
+# local background (blank where the sample has no reads in the window)
+def write_comparison(comparison_file, windows, results):
+
+    contigs = any(len(window) > 2 for window in windows)
+    header = ['Window Start', 'Window End'] + (['Contig'] if contigs else [])
+    for name in results:
+        header += [name + ' Signal', name + ' True Pair?', name + ' Combined Read Count',
+                   name + ' Percent Read to Cluster', name + ' Log10 P-value']
+
+    with open(comparison_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for k, window in enumerate(windows):
+            row = [window[0], window[1]] + ([window[2]] if contigs else [])
+            for name in results:
+                r = results[name][k]
+                if r is None:
+                    row += ['', '', 0, '', '']
+                else:
+                    row += ['{0}-{1}'.format(*r['signal']), r['is_pair'], r['reads'],
+                            '{:.4}'.format(100 * (r['reads'] / r['cluster_reads'])), '{:.1f}'.format(r['log10_p'])]
+            writer.writerow(row)
+    return
+
+
+# function comparison_file_path names the comparison table of an accession
+def comparison_file_path(acc_results_path, acc_num):
+    return os.path.join(acc_results_path, acc_num + ' sample comparison.csv')
@@ -0,0 +1,97 @@
+"""compressed opens the text files of the pipeline (SOR exports, SAM files, GenBank flat files and gene tables)
+whether they are plain or compressed with gzip, bzip2 or zstandard, streaming the decompression so nothing is
+unpacked to disk first. Files being read are recognized by their first bytes, whatever they are called; files
+being written are compressed according to their extension (.gz, .bz2 or .zst).
+
+gzip and bzip2 come with python. zstandard uses the compression.zstd module of python 3.14 and later, or else the
+zstandard package, imported only when a .zst file turns up.
+"""
+
+import io
+import os
+import bz2
+import gzip
+
+# magic bytes each compression format starts with
+MAGIC = ((b'\x1f\x8b', 'gz'), (b'BZh', 'bz2'), (b'\x28\xb5\x2f\xfd', 'zst'))
+SUFFIXES = ('.gz', '.bz2', '.zst')
+
+
+# function compression_of returns the compression of a file ('gz', 'bz2' or 'zst') from its first bytes, or None for
+# a plain (or missing) file
+def compression_of(path):
+
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4)
+    except OSError:
+        return None
+    for magic, kind in MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+# function compression_suffix returns the compression extension a path ends with ('' if none)
+def compression_suffix(path):
+
+    for suffix in SUFFIXES:
+        if path.lower().endswith(suffix):
+            return suffix
+    return ''
+
+
+# function plain_name strips the compression extension off a path, e.g. 'FN545816.sam.gz' -> 'FN545816.sam'
+def plain_name(path):
+    return path[:len(path) - len(compression_suffix(path))]
+
+
+# function find_variant returns path if it exists, otherwise the first compressed version of it that does
+# (path + '.gz', '.bz2' or '.zst'). If there is none, it returns the name a new file should get: path, plus the
+# extension of compress ('gz', 'bz2' or 'zst') if given.
+def find_variant(path, compress=None):
+
+    if os.path.exists(path):
+        return path
+    for suffix in SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path + '.' + compress if compress else path
+
+
+def _zstd_open(path, mode, newline):
+
+    try:
+        from compression import zstd
+        return zstd.open(path, mode + 't', newline=newline)
+    except ImportError:
+        pass
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard module not found. Please install zstandard to read or write .zst files.")
+
+    if mode == 'r':
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor().stream_writer(open(path, mode + 'b'), closefd=True)
+    return io.TextIOWrapper(stream, newline=newline)
+
+
+# function open_text opens a text file for reading ('r') or writing ('w', 'a'), decompressing or compressing on the
+# fly as described above. newline is passed on as for open.
+def open_text(path, mode='r', newline=None):
+
+    if mode == 'r':
+        kind = compression_of(path)
+    else:
+        kind = compression_suffix(path)[1:] or None
+
+    if kind == 'gz':
+        return gzip.open(path, mode + 't', newline=newline)
+    if kind == 'bz2':
+        return bz2.open(path, mode + 't', newline=newline)
+    if kind == 'zst':
+        return _zstd_open(path, mode, newline)
+    return open(path, mode, newline=newline)
@@ -0,0 +1,43 @@
+"""config loads the run parameters out of config.txt. The file has a header line followed by name=value lines,
+and everything after the line holding '!' is documentation and ignored.
+"""
+
+import sys
+
+# parameters every run needs, in the order they are written in config.txt
+CONFIG_KEYS = ('nbin_size', 'cbin_cutoff', 'cbin_size', 'cluster_min_sep', 'cluster_max_sep', 'ntpair_min_sep',
+               'ntpair_max_sep', 'max_genes')
+
+
+# function load_config reads config_file into a name:int dictionary, exiting if any parameter is missing
+def load_config(config_file):
+
+    params = dict()
+
+    try:
+        with open(config_file, 'r') as f:
+            header = f.readline()
+            print("Loaded:", header)
+
+            for line in f:
+                if '!' in line:
+                    break
+
+                try:
+                    label = line.split('=')[0].strip()
+                    value = line.split('=')[1]
+
+                    if label in CONFIG_KEYS:
+                        params[label] = int(value)
+                except IndexError:
+                    pass
+
+    except FileNotFoundError as e:
+        sys.exit("Config file not found: {0}".format(e.errno))
+
+    # do we have any bad vars?
+    for key in CONFIG_KEYS:
+        if key not in params:
+            sys.exit("Warning! {0} not found in config file. Please ensure variable is set.".format(key))
+
+    return params
@@ -9,76 +9,268 @@ Affiliation: Tufts University, Camilli Lab
 
 #IMPORTS
 
-import seaborn as sns
-from collections import defaultdict
-import matplotlib.pyplot as plt
+# seaborn and matplotlib are only needed for drawing, so they are imported on first use in the drawing
+# methods. That way SOR and Cluster can be used for pure detection without loading the plotting stack.
 import numpy as np
+import heapq
+import json
 import csv
-import sys
-
-
-# class SOR holds the master SOR data
+import os
+
+from .ingest import stream_sor_counts, peak_memory_mb
+from .bam import is_alignment_file, stream_alignment_counts, DEFAULT_FLAG_MASK
+
+SOR_INDEX_VERSION = 3   # bump if the layout (or contig order) of the binary SOR index changes
+PAIR_TILE_CELLS = 1 << 20   # bin pairs scored at once by score_bin_pairs; bounds its memory at a few tens of MB
+SIGNAL_FLANK = 1000         # nt either side of a signal giving its background rate, see signal_significance
+
+
+# class SOR holds the master SOR data. The read counts are kept as three arrays: the sorted unique positions, the
+# read count at each position and a running (prefix) sum of the counts, so the number of reads in any window is
+# just two lookups. The first time a SOR file is loaded these arrays are saved in a binary index next to it
+# (see write_sor_index), and later runs memory-map the index instead of parsing the csv again. The SOR file can also
+# be a SAM or BAM file (see bam.py); flag_mask then picks which alignments are skipped. index='n' neither reads nor
+# writes the index, and verbose='n' keeps loading quiet.
+#
+# Genomes with several chromosomes or plasmids keep each contig on its own position axis. The arrays of all contigs
+# are stored one after the other (contig_bounds says where each starts), and select_contig points positions, counts
+# and cum_counts at one of them, so everything below works on one contig at a time. The first contig is selected
+# to begin with; a SOR file without contig names is a single contig named None.
 class SOR:
 
-    def __init__(self, acc, sor_file, binsize=20000, ignore=[]):
+    def __init__(self, acc, sor_file, binsize=20000, ignore=[], index='y', genome_length=0,
+                 flag_mask=DEFAULT_FLAG_MASK, contig=None, verbose='y'):
 
         self.accession_num = acc                # accession number
-        self.pos_freq_dict = defaultdict(int)   # contains pos:freq data
-        self.pos_array = np.array([])           # contains all unique positions
+        self.genome_length = genome_length      # if known, the read count array is allocated at this size up front
+        self.positions = np.array([], dtype=np.int64)   # sorted unique positions of the selected contig
+        self.counts = np.array([], dtype=np.int64)      # read count at each position
+        self.cum_counts = np.zeros(1, dtype=np.int64)   # cum_counts[i] is the number of reads at positions[:i]
+        self.contig_names = [None]              # contig names, in the order they are stored
+        self.contig_bounds = np.zeros(2, dtype=np.int64)    # contig k is all_positions[bounds[k]:bounds[k + 1]]
+        self.contig = None                      # name of the selected contig
+        self.all_positions = self.positions     # positions, counts and running sums of every contig; the running
+        self.all_counts = self.counts           # sums restart at 0 for each contig, so contig k's are
+        self.all_cum_counts = self.cum_counts   # all_cum_counts[bounds[k] + k:bounds[k + 1] + k + 1]
         self.ignored_positions = ignore         # when loading the SOR file, ignore these positions
         self.data_sum = 0                       # sum of read counts in data
+        self.flag_mask = flag_mask              # SAM flag bits of alignments to skip, for SAM/BAM sources
+        self.index = index                      # whether the binary index is read and written ('y'/'n')
+        self.verbose = verbose                  # whether loading reports what it read ('y'/'n')
+        self._pos_freq_dict = None              # pos:freq dictionary, only built if someone asks for it
+        self._range_max = dict()                # contig: RangeMax over its counts, built when first needed
+
+        # loads sor data into these attributes, from the index if there is an up to date one
+        indexed = None
+        index_mask = flag_mask if is_alignment_file(sor_file) else None
+        if index == 'y':
+            indexed = load_sor_index(sor_index_path(sor_file), sor_file, index_mask)
+
+        if indexed is not None:
+            (self.all_positions, self.all_counts, self.all_cum_counts, self.contig_names,
+             self.contig_bounds) = indexed
+        else:
+            self.load_sor(sor_file)
+            if index == 'y':
+                write_sor_index(sor_index_path(sor_file), sor_file, self.all_positions, self.all_counts,
+                                self.all_cum_counts, self.contig_names, self.contig_bounds, index_mask)
 
-        self.load_sor(sor_file)                 # loads sor data into these attributes
-
-        self.pos_min = self.pos_array.min()     # minimum position
-        self.pos_max = self.pos_array.max()     # maximum position
+        self.pos_min = 0                        # minimum position
+        self.pos_max = 0                        # maximum position
+        self.select_contig(self.contig_names[0] if contig is None else contig)
 
         self.bin_size = binsize                 # how many nucleotides each bin should span
         self.final_bin_size = 0                 # what we ended up getting
 
-        # useful output parameters
+        # useful output parameters (the analysis of each window is kept by cluster_detect, see Detection)
         self.clusters = list()                  # list of clusters filtered out of the initial screen
-        self.signals = list()                   # list of all screened clusters
-        self.true_clusters = list()             # signals that turn out to be a true pair of clusters
-        self.spikes = list()                    # signals that turn out to be solitary spikes or otherwise
-        self.clust_dist = list()                # list of distances between best nt
-        self.clust_sum = list()                 # list of scores sums of best nt
-        self.clust_proportion_perc = list()     # list of percent proportions of reads to cluster
-        self.total_clust_prop_perc = list()     # list of percent proportions of reads to data total
-        self.cluster_map_int = list()           # list of 1 and -1 reporting true or spikes; for output index mapping
-        self.final_cbin_sizes = list()          # list of final cluster bin sizes
         self.read_cutoff = 0                    # ultimate density value used in thresholding
 
+    # all unique positions, sorted
+    @property
+    def pos_array(self):
+        return self.positions
+
+    # pos:freq dictionary of the whole SOR. Built on first use; the arrays are what everything else works on.
+    @property
+    def pos_freq_dict(self):
+        if self._pos_freq_dict is None:
+            self._pos_freq_dict = dict(zip(self.positions.tolist(), self.counts.tolist()))
+        return self._pos_freq_dict
+
+    # returns the range maximum table of the selected contig, for finding the position with the most reads in any
+    # window. It is built the first time it is asked for and shared by every Cluster analyzed on this SOR.
+    def range_max(self):
+
+        if self.contig not in self._range_max:
+            self._range_max[self.contig] = RangeMax(self.positions, self.counts)
+        return self._range_max[self.contig]
+
+    # sets the position and count arrays of the selected contig and recomputes the running sum
+    def set_counts(self, positions, counts):
+
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.cum_counts = np.concatenate(([0], np.cumsum(self.counts))).astype(np.int64)
+        self._pos_freq_dict = None
+        return
+
+    # points positions, counts and cum_counts at one contig (no copying unless positions are ignored)
+    def select_contig(self, contig):
+
+        if contig not in self.contig_names:
+            raise KeyError("Contig " + str(contig) + " is not in the SOR data of " + self.accession_num)
+
+        k = self.contig_names.index(contig)
+        i, j = int(self.contig_bounds[k]), int(self.contig_bounds[k + 1])
+        self.contig = contig
+        self.positions = self.all_positions[i:j]
+        self.counts = self.all_counts[i:j]
+        self.cum_counts = self.all_cum_counts[i + k:j + k + 1]
+        self._pos_freq_dict = None
+
+        if len(self.ignored_positions) > 0:
+            keep = ~np.isin(self.positions, np.array(list(self.ignored_positions)))
+            self.set_counts(self.positions[keep], self.counts[keep])
+
+        self.data_sum = int(self.cum_counts[-1])
+        if len(self.positions) > 0:
+            self.pos_min = self.positions.min()
+            self.pos_max = self.positions.max()
+        return
+
+    # adds the selected contig to candidate windows, when there is more than one contig to tell apart
+    def tag_windows(self, windows):
+
+        if len(self.contig_names) == 1:
+            return windows
+        return [(start, end, self.contig) for start, end in windows]
+
     # loads sor data from file into attributes
     def load_sor(self, sor_file):
 
-        with open(sor_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    # ignore TLEN values that are less than zero.
-                    if int(row['TLEN']) != 0:
-                        if int(row['POS']) not in self.ignored_positions:
-                            self.pos_freq_dict[int(row['POS'])] += 1
-                            self.data_sum += 1
-
-                except csv.Error as e:
-                    print("Error occurred! Please ensure headers on file include TLEN and POS.")
-                    sys.exit('file {}, line {}: {}'.format(sor_file, reader.line_num, e))
-        self.pos_array = np.sort(np.array(list(self.pos_freq_dict)))
+        # the file is streamed in chunks into a count per genome position, so memory is bounded by the genome size
+        if is_alignment_file(sor_file):
+            accumulator = stream_alignment_counts(sor_file, genome_length=self.genome_length,
+                                                  flag_mask=self.flag_mask)
+        else:
+            accumulator = stream_sor_counts(sor_file, genome_length=self.genome_length)
+        self.contig_names, self.all_positions, self.all_counts, self.contig_bounds = accumulator.finish()
+        self.all_cum_counts = contig_running_sums(self.all_counts, self.contig_bounds)
+
+        if self.verbose != 'y':
+            return
+
+        positions = self.all_positions
+        peak = peak_memory_mb()
+        contigs = '' if len(self.contig_names) == 1 else ' on {0} contigs'.format(len(self.contig_names))
+        print("Loaded", accumulator.reads, "reads at", str(len(positions)) + " positions" + contigs, "from", sor_file,
+              "(count array {0:.1f} MB, peak memory {1} MB)".format(
+                  accumulator.nbytes() / (1024 * 1024), 'unknown' if peak is None else '{0:.1f}'.format(peak)))
         return
 
+    # returns the index range [i, j) of the positions lying within pos_start and pos_end (inclusive)
+    def position_range(self, pos_start, pos_end):
+
+        i = int(np.searchsorted(self.positions, pos_start, side='left'))
+        j = int(np.searchsorted(self.positions, pos_end, side='right'))
+        return i, j
+
+    # returns the number of reads between pos_start and pos_end (inclusive) from two prefix sum lookups
+    def window_count(self, pos_start, pos_end):
+
+        i, j = self.position_range(pos_start, pos_end)
+        return int(self.cum_counts[j] - self.cum_counts[i])
+
     # returns a subset of the pos_freq_dict given a start and an end
     def subset(self, pos_start, pos_end):
 
-        sub_dict = dict()
-        for element in self.pos_array:
-            if (element >= pos_start) and (element <= pos_end):
-                sub_dict[element] = self.pos_freq_dict[element]
-        return sub_dict
+        i, j = self.position_range(pos_start, pos_end)
+        return dict(zip(self.positions[i:j].tolist(), self.counts[i:j].tolist()))
+
+    # makes the genome-wide read density histogram used for the initial screen
+    def make_density_histogram(self):
+
+        seq_size = self.pos_max - self.pos_min
+        nbins = int(seq_size / self.bin_size)
+
+        # make a frequency histogram straight from the running sums, no need to expand the reads
+
+        den_bin_edges = histogram_edges(self.pos_min, self.pos_max, nbins)
+        h_counts = binned_counts(self.positions, self.cum_counts, den_bin_edges)
+        h_densities = h_counts / np.diff(den_bin_edges) / h_counts.sum()
+        self.final_bin_size = den_bin_edges[1] - den_bin_edges[0]
+
+        return h_densities, den_bin_edges
+
+    # returns the read totals of the windows [starts[k], ends[k]) for arrays of starts and ends, any bin size
+    def window_counts(self, starts, ends):
+        return range_counts(self.positions, self.cum_counts, starts, ends)
+
+    # sets the read density cutoff and keeps the histogram bins that pass it as potential clusters
+    def apply_read_cutoff(self, read_cutoff, h_densities, den_bin_edges):
+
+        self.read_cutoff = read_cutoff
+        self.clusters = list()
+
+        # the left-sided bin edges of passing bins represent the left side of a potential cluster
+        self.clusters = self.tag_windows(candidate_windows(h_densities, den_bin_edges, self.read_cutoff))
+
+        return
+
+    # sliding version of apply_read_cutoff. Windows as wide as the histogram bins start every stride nt, so a pair
+    # of peaks sitting on either side of a bin edge still falls in one window. Each window's read total is two
+    # prefix sum lookups, and its density is scaled like the histogram's so the same cutoff applies. Passing windows
+    # that overlap or touch are merged into one candidate region before any Cluster analysis.
+    def apply_sliding_cutoff(self, read_cutoff, stride):
+
+        if self.final_bin_size == 0:
+            self.make_density_histogram()
+        width = self.final_bin_size
+
+        self.read_cutoff = read_cutoff
+        self.clusters = list()
+
+        starts = np.arange(self.pos_min, self.pos_max, stride, dtype=np.float64)
+        densities = self.window_counts(starts, starts + width) / width / self.data_sum
+        self.clusters = self.tag_windows(merged_regions(starts[densities >= read_cutoff], width))
+        return
+
+    # saves a picture of the density histogram with the read cutoff drawn on it
+    def save_density_histogram(self, h_densities, save_path):
+
+        import matplotlib.pyplot as plt
+
+        fig, ax1 = plt.subplots()
+        ax1.plot(h_densities)  # plot density histogram along axis.
+        plt.title(self.accession_num + " SOR Density Histogram; Bins=" + str(len(h_densities)))
+        plt.xlabel("Bin Number")
+        plt.ylabel("Bin read density")
+        plt.axhline(self.read_cutoff, color='r')
+        plt.savefig(save_path)
+        plt.close()
+
+        return
+
+    # same as the interactive threshold, but with a known density cutoff so nobody has to click on anything.
+    # If stride is given, the screen uses overlapping windows instead (see apply_sliding_cutoff).
+    def make_graphical_threshold(self, read_cutoff, save_path='n', stride=None):
+
+        h_densities, den_bin_edges = self.make_density_histogram()
+        self.apply_read_cutoff(read_cutoff, h_densities, den_bin_edges)
+        if stride is not None:
+            self.apply_sliding_cutoff(read_cutoff, stride)
+
+        if save_path != 'n':
+            self.save_density_histogram(h_densities, save_path)
+
+        return
 
     # creates an interactive graph of histogram data useful for setting thresholds of cluster detection
-    def make_interactive_graphical_threshold(self, save_path='n'):
+    # The cutoff is always picked on the fixed bins; with a stride, the screen then uses overlapping windows.
+    def make_interactive_graphical_threshold(self, save_path='n', stride=None):
+
+        import matplotlib.pyplot as plt
 
         # class HLineBuilder allows us to define a density cutoff in the initial screen.
         class HLineBuilder:
@@ -95,19 +287,8 @@ class SOR:
                 self.y_final = y1
                 self.line.figure.canvas.draw()
 
-        seq_size = self.pos_max - self.pos_min
-        nbins = int(seq_size / self.bin_size)
-
-        data = list()
-        for pos in self.pos_array:
-            for i in range(0, self.pos_freq_dict[pos]):
-                data.append(pos)
-        data = np.array(data)
-
-        # make a frequency histogram
-
-        h_densities, den_bin_edges = np.histogram(data, bins=nbins, density=True)
-        self.final_bin_size = den_bin_edges[1] - den_bin_edges[0]
+        h_densities, den_bin_edges = self.make_density_histogram()
+        nbins = len(h_densities)
 
         # Plot the density histogram, providing visual representation of read densities
         fig, ax1 = plt.subplots()
@@ -125,29 +306,14 @@ class SOR:
         plt.show()
 
         # Our cutoff is equal to the y value of the last line drawn
-        self.read_cutoff = r.y_final
         plt.close()
+        self.apply_read_cutoff(r.y_final, h_densities, den_bin_edges)
+        if stride is not None:
+            self.apply_sliding_cutoff(r.y_final, stride)
 
         # If we have a save path, recreate the graph and save it
         if save_path != 'n':
-            fig, ax1 = plt.subplots()
-            ax1.plot(h_densities)  # plot density histogram along axis.
-            plt.title(self.accession_num + " SOR Density Histogram; Bins=" + str(nbins))
-            plt.xlabel("Bin Number")
-            plt.ylabel("Bin read density")
-            plt.axhline(self.read_cutoff, color='r')
-            plt.savefig(save_path)
-            plt.close()
-
-        # add the left-sided bin edges to a list if they pass; these represent the left side of a potential cluster
-        h_bin_left_pos_list = list()
-        for i in range(0, len(h_densities)):
-            if h_densities[i] >= self.read_cutoff:
-                h_bin_left_pos_list.append(float(den_bin_edges[i]))
-
-        for left_bin_edge in h_bin_left_pos_list:
-            right_bin_edge = left_bin_edge + self.final_bin_size
-            self.clusters.append((left_bin_edge, right_bin_edge))
+            self.save_density_histogram(h_densities, save_path)
 
         return
 
@@ -155,10 +321,20 @@ class SOR:
 # class Cluster is given a position-frequency dictionary and can do the inversion nucleotide calculations
 # I designed it to just do all the damn calculations when it is called. You can used class methods to
 # draw graphs and stuff after that is all done anyways.
+# The position with the most reads in a stretch (the peak of the whole cluster, the best nucleotide of a bin) comes
+# from a RangeMax. Pass the SOR's (SOR.range_max) to share it between clusters; otherwise one is made for the dict.
+# pair_search='numpy' scores all the bin pairs at once with score_bin_pairs; 'loops' lists and filters the pairs
+# one by one in python, as the original version did.
+# With top_pairs > 1, up to top_pairs - 1 more pairs of bins not used by the best pair are looked for (see
+# top_bin_pairs), for windows holding more than one invertible element; those that pass assess_nt_pair end up in
+# more_nt_pairs. The two are admitted by different rules: the best pair goes through the original filter, which lets
+# every second pair of a run of too close or too far apart ones through (see score_bin_pairs), so that results
+# match earlier versions, while the further pairs only ever come from bins properly sep_min to sep_max apart.
 class Cluster:
 
     def __init__(self, pos_freq_dict, cbinsize=40, cperc=98,
-                 clustersepmin=0, clustersepmax=10000, ntsepmin=0, ntsepmax=10000):
+                 clustersepmin=0, clustersepmax=10000, ntsepmin=0, ntsepmax=10000, range_max=None,
+                 pair_search='numpy', top_pairs=1):
 
         self.pos_freq_dict = pos_freq_dict                  # position:frequency dictionary of this cluster
         self.pos_array = np.array(list(pos_freq_dict))      # unique position array of this cluster
@@ -167,10 +343,15 @@ class Cluster:
         self.pos_max = self.pos_array.max()                 # maximum position
         self.data_sum = 0                                   # sum of read counts in cluster
 
-        # minimum and maximum frequency values
-        self.freq_min = np.array(list(pos_freq_dict.values())).min()
-        self.freq_max = np.array(list(pos_freq_dict.values())).max()
-        self.pos_freq_max = list(pos_freq_dict.keys())[list(pos_freq_dict.values()).index(self.freq_max)]
+        # sorted positions with their counts and running sums, for binning without expanding the reads
+        self.positions = np.sort(self.pos_array)
+        self.counts = np.array([pos_freq_dict[pos] for pos in self.positions.tolist()], dtype=np.int64)
+        self.cum_counts = np.concatenate(([0], np.cumsum(self.counts))).astype(np.int64)
+
+        # range maximum queries over the counts, and the minimum and maximum frequency values
+        self.range_max = range_max if range_max is not None else RangeMax(self.positions, self.counts)
+        self.freq_min = self.counts.min()
+        self.pos_freq_max, self.freq_max = self.range_max.max_in(self.pos_min, self.pos_max)
 
         self.bin_size = cbinsize                            # how many nucleotides each bin should span
         self.c_sep_min = clustersepmin                      # limit to how close cluster pairs can be
@@ -178,6 +359,8 @@ class Cluster:
         self.n_sep_min = ntsepmin                           # limit to how close nucleotide pairs can be
         self.n_sep_max = ntsepmax                           # limit to how far nt pairs can be in the end
         self.count_percentile_threshold = cperc             # initial thresholding of counts for bins
+        self.pair_search = pair_search                      # 'numpy' or 'loops', see above
+        self.num_bin_pairs = 0                              # number of bin pairs passing the distance filters
 
         self.bin_size_tol = 5                               # nt size tolerance of cluster binning
         self.bins = 0                                       # what we eventually settled on for bins
@@ -190,6 +373,8 @@ class Cluster:
         self.best_nt_pair = [(-1, 0), (-1, 0)]              # best scoring nucleotide pair with counts
         self.best_nt_pair_dist = 0                          # number of nt apart the pair is
         self.best_nt_pair_sum = 0                           # sum of scores of the best nt pair
+        self.top_pairs = top_pairs                          # how many non-overlapping pairs to look for
+        self.more_nt_pairs = list()                         # (nt pair, dist, sum) of the further true pairs
 
         self.graph_nt_stream = 1000                         # amount of nt upstream and downstream when drawing
 
@@ -210,28 +395,35 @@ class Cluster:
         # filter the dictionary by the cperc
         self.filter_by_read_count(self.count_percentile_threshold)
 
-        # generate cluster bin pairs
-        self.generate_cluster_bin_pairs()
+        if self.pair_search == 'numpy':
+
+            # score every bin pair at once, keeping the best
+            self.score_bin_pairs()
+
+        else:
+
+            # generate cluster bin pairs
+            self.generate_cluster_bin_pairs()
 
-        # filter the cluster bin pairs
-        self.filter_bin_pairs()
+            # filter the cluster bin pairs
+            self.filter_bin_pairs()
+            self.num_bin_pairs = len(self.filtered_cluster_bin_pairs)
 
         # if we are out of bin pairs, don't bother...
-        if len(self.filtered_cluster_bin_pairs) == 0:
+        if self.num_bin_pairs == 0:
             self.is_single_signal = 1
             self.signal = (self.pos_freq_max, self.freq_max)
             pass
 
         else:
 
-            # find the best cluster bin pair
-            self.find_max_pair()
+            # find the best cluster bin pair (score_bin_pairs already has)
+            if self.pair_search != 'numpy':
+                self.find_max_pair()
 
             # find the best nucleotides in there
-            self.best_nt_pair[0] = self.find_best_nucleotide(self.sub_array(
-                self.best_bin_pair[0][0], self.best_bin_pair[0][1]))
-            self.best_nt_pair[1] = self.find_best_nucleotide(self.sub_array(
-                self.best_bin_pair[1][0], self.best_bin_pair[1][1]))
+            self.best_nt_pair[0] = self.range_max.max_in(self.best_bin_pair[0][0], self.best_bin_pair[0][1])
+            self.best_nt_pair[1] = self.range_max.max_in(self.best_bin_pair[1][0], self.best_bin_pair[1][1])
 
             self.best_nt_pair_sum = self.best_nt_pair[0][1] + self.best_nt_pair[1][1]
             self.best_nt_pair_dist = abs(self.best_nt_pair[0][0] - self.best_nt_pair[1][0])
@@ -239,17 +431,16 @@ class Cluster:
             # take a glance at the pair to see if we have a true inversion
             self.assess_nt_pair()
 
+            # then look for more pairs in the bins left over
+            if self.top_pairs > 1:
+                self.find_more_pairs()
+
     # returns a frequency np histogram of a pos_freq_dict...so (10 10 10 10 20 20 30 30 30 30...etc.)
     def make_freq_histogram(self):
 
-        data = list()
-        for pos in self.pos_array:
-            for i in range(0, self.pos_freq_dict[pos]):
-                data.append(pos)
-        data = np.array(data)
         bins = int((self.pos_max - self.pos_min) / self.bin_size)
 
-        counts, edges = np.histogram(data, bins=bins)
+        edges = histogram_edges(self.pos_min, self.pos_max, bins)
 
         # check to make sure the bin size is right...sometimes, based on the pos array, it gets a bit small
         bin_size = edges[1] - edges[0]
@@ -261,21 +452,21 @@ class Cluster:
             else:
                 bins += 1
 
-            counts, edges = np.histogram(data, bins=bins)
+            edges = histogram_edges(self.pos_min, self.pos_max, bins)
             bin_size = edges[1] - edges[0]
 
+        # only the edges move while settling the bin size, so the counts are binned once at the end
+        counts = binned_counts(self.positions, self.cum_counts, edges)
+
         # now that everything should be good, return the data array and the array of edges along with a
         # dictionary tying the two
 
-        cbin_dict = dict()
-        for i in range(0, len(counts)):
-            cbin_dict[edges[i]] = counts[i]
+        cbin_dict = dict(zip(edges[:-1], counts))
 
         self.final_cbin_size = bin_size
         self.bins = bins
 
-        for count in counts:
-            self.data_sum += count
+        self.data_sum += int(counts.sum())
 
         return counts, edges, cbin_dict
 
@@ -342,6 +533,39 @@ class Cluster:
 
         return
 
+    # vectorized generate_cluster_bin_pairs, filter_bin_pairs and find_max_pair in one go, see score_bin_pairs
+    def score_bin_pairs(self):
+
+        edges = np.array(list(self.filtered_cluster_bin_dictionary), dtype=np.float64)
+        counts = np.array(list(self.filtered_cluster_bin_dictionary.values()), dtype=np.int64)
+
+        i, j, self.num_bin_pairs = score_bin_pairs(edges, counts, self.c_sep_min, self.c_sep_max)
+        if self.num_bin_pairs == 0:
+            return
+
+        bin_max_pair = (edges[i], edges[j]) if i >= 0 else (-1, -1)
+        bin1_lb, bin1_ub = bin_max_pair[0], bin_max_pair[0] + self.final_cbin_size
+        bin2_lb, bin2_ub = bin_max_pair[1], bin_max_pair[1] + self.final_cbin_size
+        self.best_bin_pair = ((bin1_lb, bin1_ub), (bin2_lb, bin2_ub))
+
+        return
+
+    # finds the next best top_pairs - 1 bin pairs sharing no bin with the best pair, keeping the nucleotide pairs
+    # that look like true inversions. Unlike the best pair, these are strictly held to the bin separation limits.
+    def find_more_pairs(self):
+
+        edges = np.array(list(self.filtered_cluster_bin_dictionary), dtype=np.float64)
+        counts = np.array(list(self.filtered_cluster_bin_dictionary.values()), dtype=np.int64)
+        used = np.flatnonzero(np.isin(edges, (self.best_bin_pair[0][0], self.best_bin_pair[1][0])))
+
+        for i, j in top_bin_pairs(edges, counts, self.c_sep_min, self.c_sep_max, self.top_pairs - 1, used):
+            nt_pair = [self.range_max.max_in(edges[i], edges[i] + self.final_cbin_size),
+                       self.range_max.max_in(edges[j], edges[j] + self.final_cbin_size)]
+            if self.judge_nt_pair(nt_pair)[0] == 0:
+                self.more_nt_pairs.append((nt_pair, abs(nt_pair[0][0] - nt_pair[1][0]),
+                                           nt_pair[0][1] + nt_pair[1][1]))
+        return
+
     # finds the best nucleotides in this cluster region
     def find_best_nucleotide(self, arr):
 
@@ -366,79 +590,462 @@ class Cluster:
     # looks at the nt pair and gives and idea of the legitness of the cluster based on class parameters.
     def assess_nt_pair(self):
 
-        pos1 = self.best_nt_pair[0][0]
-        pos2 = self.best_nt_pair[1][0]
+        self.is_single_signal, self.signal = self.judge_nt_pair(self.best_nt_pair)
+        return
+
+    # returns (is_single_signal, signal) for a nucleotide pair [(pos1, count1), (pos2, count2)]
+    def judge_nt_pair(self, nt_pair):
+
+        pos1 = nt_pair[0][0]
+        pos2 = nt_pair[1][0]
 
-        score1 = self.best_nt_pair[0][1]
-        score2 = self.best_nt_pair[1][1]
+        score1 = nt_pair[0][1]
+        score2 = nt_pair[1][1]
 
         pos_dif = abs(pos1 - pos2)
         per_dif = 100 * (abs(score1 - score2) / (score1 + score2))
+        is_single_signal, signal = 0, 0
 
         # now, is one of the nucleotides scoring nearly 100% of the data?
         if per_dif > self.per_dif_threshold:
-            self.is_single_signal = 1
+            is_single_signal = 1
 
         # or, are the nts waaay too close or far somehow despite our cluster distance thresholding?
         if (pos_dif >= self.n_sep_max) or (pos_dif <= self.n_sep_min):
-            self.is_single_signal = 1
+            is_single_signal = 1
 
         # if the signal is up, find the offending nucleotide
-        if self.is_single_signal == 1:
+        if is_single_signal == 1:
 
             if score2 > score1:
-                self.signal = (pos2, score2)
+                signal = (pos2, score2)
             else:
-                self.signal = (pos1, score1)
-        return
+                signal = (pos1, score1)
+        return is_single_signal, signal
 
     # uses matplotlib and sns to draw and save an illustration of the histogram data of the suggested inversion cluster
     def draw_inversion_site(self, save_path, show_fig='n'):
 
-        # generate histogram data over this pos_array
-        # first make a sub_array a little upstream and downstream of our positions
-        pos1 = self.best_nt_pair[0][0]
-        pos2 = self.best_nt_pair[1][0]
+        draw_inversion_site(self.pos_freq_dict, self.best_nt_pair[0][0], self.best_nt_pair[1][0], save_path,
+                            nt_stream=self.graph_nt_stream, show_fig=show_fig)
+        return
 
-        start = pos1 - self.graph_nt_stream
-        end = pos2 + self.graph_nt_stream
-        arr = self.sub_array(start, end)
 
-        # now make the frequency histogram
-        dx = self.make_freq_array(arr)
+# function draw_inversion_site draws the read histogram around an inversion pair from a position:frequency dict.
+# Cluster uses this after its analysis, and the render stage uses it with pairs loaded back from the cluster file.
+def draw_inversion_site(pos_freq_dict, pos1, pos2, save_path, nt_stream=1000, show_fig='n'):
 
-        # use seabourn to draw our initial density histogram with a gaussian fit
-        sns.distplot(dx, bins=30)
+    import seaborn as sns
+    import matplotlib.pyplot as plt
 
-        # write vertical lines where we suspect the inversion pair to be
-        plt.axvline(pos1, color='r')
-        plt.axvline(pos2, color='r')
+    # generate histogram data over this pos_array
+    # first make a sub_array a little upstream and downstream of our positions
+    start = pos1 - nt_stream
+    end = pos2 + nt_stream
+    arr = np.array(sorted(pos for pos in pos_freq_dict if start <= pos <= end))
 
-        # label our axes
-        plt.xlabel('Nucleotide position')
-        plt.ylabel('Read density')
+    # now make the frequency histogram
+    dx = np.repeat(arr, [pos_freq_dict[pos] for pos in arr])
 
-        # draw arrows to annotate the vertical lines so you can see the exact position
-        c_start = 'Cluster start: ' + str(pos1)
-        c_end = 'Cluster end: ' + str(pos2)
-        ymin, ymax = plt.ylim()
-        plt.annotate(c_start, xy=(pos1, ymax), xycoords='data', xytext=(0.15, 0.95),
-                     textcoords='figure fraction', arrowprops=dict(facecolor='black', shrink=0.05))
+    # use seabourn to draw our initial density histogram with a gaussian fit
+    sns.distplot(dx, bins=30)
 
-        plt.annotate(c_end, xy=(pos2, ymax), xycoords='data', xytext=(0.75, 0.95),
-                     textcoords='figure fraction', arrowprops=dict(facecolor='black', shrink=0.05))
+    # write vertical lines where we suspect the inversion pair to be
+    plt.axvline(pos1, color='r')
+    plt.axvline(pos2, color='r')
 
-        # save our figure before showing
-        plt.savefig(save_path)
+    # label our axes
+    plt.xlabel('Nucleotide position')
+    plt.ylabel('Read density')
 
-        # show our figure if desired
-        if show_fig == 'y':
-            plt.show()
+    # draw arrows to annotate the vertical lines so you can see the exact position
+    c_start = 'Cluster start: ' + str(pos1)
+    c_end = 'Cluster end: ' + str(pos2)
+    ymin, ymax = plt.ylim()
+    plt.annotate(c_start, xy=(pos1, ymax), xycoords='data', xytext=(0.15, 0.95),
+                 textcoords='figure fraction', arrowprops=dict(facecolor='black', shrink=0.05))
 
-        # clear the figure
-        plt.close()
+    plt.annotate(c_end, xy=(pos2, ymax), xycoords='data', xytext=(0.75, 0.95),
+                 textcoords='figure fraction', arrowprops=dict(facecolor='black', shrink=0.05))
 
-        return
+    # save our figure before showing
+    plt.savefig(save_path)
+
+    # show our figure if desired
+    if show_fig == 'y':
+        plt.show()
+
+    # clear the figure
+    plt.close()
+
+    return
+
+
+# The binning functions below work on a sorted position array and its running sum of counts (cum_counts[i] is
+# the number of reads at positions[:i]), so the reads never have to be expanded into one array entry per read.
+# They are shared by SOR for the genome-wide screen and by Cluster for its cluster bins.
+
+# function histogram_edges returns the nbins + 1 evenly spaced edges np.histogram would use between pos_min and
+# pos_max
+def histogram_edges(pos_min, pos_max, nbins):
+
+    if nbins < 1:
+        raise ValueError('`bins` must be positive, when an integer')
+
+    first_edge, last_edge = pos_min, pos_max
+    if first_edge == last_edge:
+        first_edge, last_edge = first_edge - 0.5, last_edge + 0.5
+
+    return np.linspace(first_edge, last_edge, nbins + 1, endpoint=True, dtype=np.float64)
+
+
+# function range_counts returns the number of reads in each half-open window [starts[k], ends[k]). Each window
+# costs two binary searches no matter how wide it is.
+def range_counts(positions, cum_counts, starts, ends):
+
+    i = np.searchsorted(positions, starts, side='left')
+    j = np.searchsorted(positions, ends, side='left')
+    return cum_counts[j] - cum_counts[i]
+
+
+# function binned_counts returns the read count in each bin between consecutive edges, the same way np.histogram
+# counts: every bin is half-open except the last, which also holds reads sitting on the final edge
+def binned_counts(positions, cum_counts, edges):
+
+    idx = np.searchsorted(positions, edges, side='left')
+    idx[-1] = np.searchsorted(positions, edges[-1], side='right')
+    return np.asarray(cum_counts)[idx[1:]] - np.asarray(cum_counts)[idx[:-1]]
+
+
+# function signal_significance scores signals against their local background, for arrays of signals at once. The
+# reads within flank nt of a signal, other than its own, spread evenly over those nucleotides give a background
+# rate per nucleotide (plus one pseudo-read, so an empty neighbourhood does not give a rate of zero). By chance, the
+# nucleotides of the signal (two for a pair, one for a spike) would hold rate * 2 (or 1) reads. Returns the
+# enrichment (observed / expected reads) and log10 of the Poisson probability of at least the observed reads.
+def signal_significance(positions, cum_counts, starts, ends, reads, flank=SIGNAL_FLANK):
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    reads = np.asarray(reads, dtype=np.int64)
+
+    signal_nts = np.where(ends != starts, 2, 1)
+    lo, hi = starts - flank, ends + flank + 1
+    background = np.maximum(range_counts(positions, cum_counts, lo, hi) - reads, 0) + 1
+    expected = background / (hi - lo - signal_nts) * signal_nts
+
+    return reads / expected, poisson_log10_sf(reads, expected)
+
+
+# function poisson_log10_sf returns log10 P(X >= k) for X ~ Poisson(mu), for arrays of k and mu. The probability is
+# the regularized lower incomplete gamma function P(k, mu), which is summed as a series where that converges
+# quickly (mu < k + 1) and otherwise taken as 1 - Q(k, mu) from a continued fraction. The series is kept in logs,
+# since strong signals have probabilities far below the smallest float.
+def poisson_log10_sf(k, mu, eps=1e-15, max_terms=100000):
+
+    k = np.asarray(k, dtype=np.int64)
+    mu = np.asarray(mu, dtype=np.float64)
+    log_p = np.zeros(len(k), dtype=np.float64)     # P(X >= 0) = 1
+
+    # log gamma of the counts, from a running sum of logs
+    log_factorials = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, max(int(k.max(initial=0)), 1) + 1)))))
+
+    use = k > 0
+    a, x = k[use].astype(np.float64), mu[use]
+    log_prefix = -x + a * np.log(x) - log_factorials[k[use] - 1]
+    result = np.zeros(len(a), dtype=np.float64)
+
+    # series: P(a, x) = e^-x x^a / gamma(a) * sum x^n / (a (a + 1) ... (a + n))
+    series = x < a + 1
+    sa, sx = a[series], x[series]
+    term = 1 / sa
+    total = term.copy()
+    for n in range(1, max_terms):
+        term = term * sx / (sa + n)
+        total += term
+        if np.all(term < total * eps):
+            break
+    result[series] = log_prefix[series] + np.log(total)
+
+    # continued fraction (modified Lentz) for Q(a, x) = 1 - P(a, x)
+    ca, cx = a[~series], x[~series]
+    tiny = 1e-300
+    b = cx + 1 - ca
+    c = np.full(len(ca), 1 / tiny)
+    d = 1 / b
+    h = d.copy()
+    for i in range(1, max_terms):
+        an = -i * (i - ca)
+        b = b + 2
+        d = an * d + b
+        d = np.where(np.abs(d) < tiny, tiny, d)
+        c = b + an / c
+        c = np.where(np.abs(c) < tiny, tiny, c)
+        d = 1 / d
+        delta = d * c
+        h = h * delta
+        if np.all(np.abs(delta - 1) < eps):
+            break
+    result[~series] = np.log1p(-np.minimum(np.exp(log_prefix[~series]) * h, 1.0))
+
+    log_p[use] = result
+    return log_p / np.log(10)
+
+
+# function score_bin_pairs finds the best pair of bins (left edges sorted ascending, with their read counts) the way
+# generate_cluster_bin_pairs, filter_bin_pairs and find_max_pair do, without building the list of pairs. Returns the
+# indices (i, j) of the pair with the most reads combined (the first in (i, j) order on ties), or (-1, -1) if none
+# has any reads, and the number of pairs that pass the filter.
+#
+# filter_bin_pairs drops pairs whose edges are sep_min or less or sep_max or more apart, but it removes them from
+# the list it is looping over, so the pair after each removed one is never looked at and stays in: of a run of
+# consecutive failing pairs, every second one is kept. That is reproduced here so both searches give the same pair.
+#
+# The separations and combined counts of a block of rows of the pair matrix are worked out at once by broadcasting;
+# blocks are kept to about tile_cells pairs so memory stays bounded however many bins pass, and the length of the
+# current run of failing pairs is carried from one block to the next.
+def score_bin_pairs(edges, counts, sep_min, sep_max, tile_cells=PAIR_TILE_CELLS):
+
+    edges = np.asarray(edges, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    n = len(edges)
+
+    best, best_i, best_j, num_pairs = 0, -1, -1, 0
+    fail_run = 0    # failing pairs in a row at the end of the previous block
+    rows_per_tile = max(1, tile_cells // max(1, n))
+    cols = np.arange(n)
+
+    for r0 in range(0, max(n - 1, 0), rows_per_tile):
+        rows = np.arange(r0, min(r0 + rows_per_tile, n - 1))
+
+        # the pairs of these rows, in the order generate_cluster_bin_pairs lists them
+        upper = cols[None, :] > rows[:, None]
+        pair_i = np.broadcast_to(rows[:, None], upper.shape)[upper]
+        pair_j = np.broadcast_to(cols[None, :], upper.shape)[upper]
+        if len(pair_i) == 0:
+            continue
+
+        sep = np.abs(edges[pair_j] - edges[pair_i])
+        fail = (sep >= sep_max) | (sep <= sep_min)
+
+        # position of each pair within its run of failing pairs; odd ones were skipped over and kept
+        k = np.arange(len(fail))
+        last_pass = np.maximum.accumulate(np.where(fail, -fail_run - 1, k))
+        run_offset = k - last_pass - 1
+        keep = ~fail | (run_offset % 2 == 1)
+        fail_run = int(run_offset[-1]) + 1 if fail[-1] else 0
+
+        num_pairs += int(keep.sum())
+        score = np.where(keep, counts[pair_i] + counts[pair_j], -1)
+        top = int(np.argmax(score))
+        if score[top] > best:
+            best, best_i, best_j = int(score[top]), int(pair_i[top]), int(pair_j[top])
+
+    return best_i, best_j, num_pairs
+
+
+# function top_bin_pairs returns up to n pairs of bins (indices (i, j), i < j, best first) with the most reads
+# combined whose edges are more than sep_min and less than sep_max apart, no two sharing a bin and none using a bin
+# in used. Ties go to the first pair in (i, j) order. The separation limits are applied to every pair, without the
+# skipped-pair quirk score_bin_pairs keeps for the best pair.
+#
+# The partners of bin i are a contiguous run of bins, so its best partner is one RangeMax query. A heap holds the
+# best pair of every bin; when the top pair turns out to use a bin taken since it was pushed, bin i's best partner
+# among the bins still free is looked up again (one query per stretch between taken bins) and pushed back. That is
+# O(b log b) for b bins plus O(n) queries per lookup, however many pairs there are.
+def top_bin_pairs(edges, counts, sep_min, sep_max, n, used=()):
+
+    edges = np.asarray(edges, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    used = set(int(k) for k in used)
+    b = len(edges)
+    if n < 1 or b < 2:
+        return list()
+
+    range_max = RangeMax(edges, counts)
+    lo = np.maximum(np.searchsorted(edges, edges + sep_min, side='right'), np.arange(1, b + 1))
+    hi = np.searchsorted(edges, edges + sep_max, side='left')
+
+    # best partner of bin i among the bins not taken, or -1
+    def best_partner(i):
+        best_j, start = -1, int(lo[i])
+        for stop in sorted(k for k in used if k >= start) + [int(hi[i])]:
+            stop = min(stop, int(hi[i]))
+            if stop > start:
+                j = int(range_max.argmax(start, stop))
+                if best_j < 0 or counts[j] > counts[best_j]:
+                    best_j = j
+            start = max(start, stop + 1)
+            if start >= hi[i]:
+                break
+        return best_j
+
+    rows = np.flatnonzero(hi > lo)
+    partners = range_max.argmax(lo[rows], hi[rows]) if len(rows) > 0 else rows
+    heap = [(-int(counts[i] + counts[j]), int(i), int(j)) for i, j in zip(rows, partners)]
+    heapq.heapify(heap)
+
+    pairs = list()
+    while len(heap) > 0 and len(pairs) < n:
+        score, i, j = heapq.heappop(heap)
+        if -score <= 0:
+            break
+        if i in used:
+            continue
+        if j in used:
+            j = best_partner(i)
+            if j >= 0:
+                heapq.heappush(heap, (-int(counts[i] + counts[j]), i, j))
+            continue
+        pairs.append((i, j))
+        used.update((i, j))
+
+    return pairs
+
+
+# class RangeMax answers "which position holds the most reads between a and b" in constant time, from a sparse
+# table: level k holds, for every index i, the index of the largest count in counts[i:i + 2**k], so any range is
+# covered by two overlapping power-of-two blocks. Building it takes O(n log n) time and n * log2(n) int32s of memory
+# (about 2 MB for 30000 positions). Ties go to the leftmost position, like a left to right scan would.
+class RangeMax:
+
+    def __init__(self, positions, counts):
+
+        self.positions = np.asarray(positions, dtype=np.int64)     # sorted positions
+        self.counts = np.asarray(counts, dtype=np.int64)           # read count at each position
+
+        n = len(self.counts)
+        dtype = np.int32 if n < 2 ** 31 else np.int64
+        self.table = np.zeros((max(n.bit_length(), 1), n), dtype=dtype)
+        self.table[0] = np.arange(n, dtype=dtype)
+        for k in range(1, len(self.table)):
+            m = n - (1 << k) + 1    # blocks of length 2**k that fit
+            left, right = self.table[k - 1, :m], self.table[k - 1, (1 << (k - 1)):(1 << (k - 1)) + m]
+            self.table[k, :m] = np.where(self.counts[left] >= self.counts[right], left, right)
+
+    # returns the index of the largest count in counts[i:j] for arrays of index ranges (j > i)
+    def argmax(self, i, j):
+
+        i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+        k = np.frexp(j - i)[1] - 1      # floor(log2(j - i))
+        left, right = self.table[k, i], self.table[k, j - (1 << k)]
+        return np.where(self.counts[left] >= self.counts[right], left, right)
+
+    # returns the positions and counts of the maxima between starts and ends (inclusive), for arrays of ranges.
+    # Ranges holding no positions give position -1 and count 0.
+    def max_in_ranges(self, starts, ends):
+
+        i = np.searchsorted(self.positions, starts, side='left')
+        j = np.searchsorted(self.positions, ends, side='right')
+        found = j > i
+        if len(self.counts) == 0:
+            return np.full(len(found), -1, dtype=np.int64), np.zeros(len(found), dtype=np.int64)
+
+        best = self.argmax(np.where(found, i, 0), np.where(found, j, 1))
+        return np.where(found, self.positions[best], -1), np.where(found, self.counts[best], 0)
+
+    # returns the (position, count) with the most reads between pos_start and pos_end (inclusive), or (-1, 0)
+    def max_in(self, pos_start, pos_end):
+
+        positions, counts = self.max_in_ranges(np.array([pos_start]), np.array([pos_end]))
+        return int(positions[0]), int(counts[0])
+
+
+# function candidate_windows returns the (left edge, right edge) of every bin whose value reaches cutoff
+def candidate_windows(values, edges, cutoff):
+
+    bin_size = edges[1] - edges[0]
+    return [(float(edges[i]), float(edges[i]) + bin_size) for i in np.nonzero(values >= cutoff)[0]]
+
+
+# function merged_regions merges windows of the given width starting at the sorted passing starts into regions,
+# joining windows that overlap or touch, and returns the (start, end) of each region
+def merged_regions(passing, width):
+
+    if len(passing) == 0:
+        return list()
+
+    # a new region starts wherever a passing window does not touch the one before it
+    breaks = np.nonzero(np.diff(passing) > width)[0]
+    region_starts = np.concatenate(([passing[0]], passing[breaks + 1]))
+    region_ends = np.concatenate((passing[breaks], [passing[-1]])) + width
+    return list(zip(region_starts.tolist(), region_ends.tolist()))
+
+
+# function sor_index_path names the folder the binary index of a SOR file is kept in
+def sor_index_path(sor_file):
+    return sor_file + '.index'
+
+
+# function contig_running_sums makes the running sums of counts for every contig, each starting again at 0: contig
+# k (positions bounds[k] to bounds[k + 1]) gets bounds[k + 1] - bounds[k] + 1 entries, at bounds[k] + k onwards.
+def contig_running_sums(counts, bounds):
+
+    sums = list()
+    for k in range(0, len(bounds) - 1):
+        sums.append(np.concatenate(([0], np.cumsum(counts[bounds[k]:bounds[k + 1]]))))
+    return np.concatenate(sums).astype(np.int64)
+
+
+# function write_sor_index saves the position, count and running sum arrays of a SOR file as .npy files, along with
+# the size and modification time of the SOR file so a changed file is noticed. Failing to write the index (say, a
+# read-only data folder) is not a problem; the SOR file just gets parsed again next time. For SAM/BAM files the flag
+# mask the reads were filtered with is recorded too.
+def write_sor_index(index_path, sor_file, positions, counts, cum_counts, contig_names, contig_bounds,
+                    flag_mask=None):
+
+    try:
+        if not os.path.exists(index_path):
+            os.makedirs(index_path)
+
+        np.save(os.path.join(index_path, 'positions.npy'), positions)
+        np.save(os.path.join(index_path, 'counts.npy'), counts)
+        np.save(os.path.join(index_path, 'cum_counts.npy'), cum_counts)
+        np.save(os.path.join(index_path, 'contig_bounds.npy'), contig_bounds)
+        with open(os.path.join(index_path, 'contigs.json'), 'w') as f:
+            json.dump(list(contig_names), f)
+
+        with open(os.path.join(index_path, 'source.json'), 'w') as f:
+            json.dump(index_source(sor_file, flag_mask), f)
+
+    except OSError as e:
+        print("Could not write SOR index", index_path, ":", e)
+
+    return
+
+
+# function load_sor_index memory-maps the index of a SOR file. Returns (positions, counts, cum_counts, contig names,
+# contig bounds), or None if there is no index or it was made from a different version of the SOR file (or with a
+# different flag mask).
+def load_sor_index(index_path, sor_file, flag_mask=None):
+
+    source_file = os.path.join(index_path, 'source.json')
+    if not os.path.exists(source_file):
+        return None
+
+    try:
+        with open(source_file, 'r') as f:
+            source = json.load(f)
+        if source != index_source(sor_file, flag_mask):
+            return None
+
+        arrays = tuple(np.load(os.path.join(index_path, name + '.npy'), mmap_mode='r')
+                       for name in ('positions', 'counts', 'cum_counts'))
+        with open(os.path.join(index_path, 'contigs.json'), 'r') as f:
+            contig_names = json.load(f)
+        return arrays + (contig_names, np.load(os.path.join(index_path, 'contig_bounds.npy')))
+
+    except (OSError, ValueError):
+        return None
+
+
+# function index_source describes the SOR file an index is made from
+def index_source(sor_file, flag_mask=None):
+
+    st = os.stat(sor_file)
+    source = {'version': SOR_INDEX_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if flag_mask is not None:
+        source['flag_mask'] = flag_mask
+    return source
 
 
 # append_to_csv takes a data tuple and appends to some csv file.
@@ -0,0 +1,142 @@
+#! usr/bin/python
+
+"""gene_service answers "which genes are near position X of accession Y" for any position, not just the clusters
+in a cluster file. The gene files of the accessions are loaded into Bug classes once, and each query then runs
+find_nearby_genes, so the answers are the loci and products the annotate stage would report for a cluster there.
+
+Queries come in one per line, on stdin or over a small HTTP server bound to localhost:
+
+    FN545816 32557                          accession and position
+    FN545816 32280 32835 FN545816.1         a cluster range, and a contig for genomes with several
+    {"accession": "FN545816", "position": 32557, "ntol": 2000, "max_genes": 6}
+
+    GET /genes?accession=FN545816&position=32557&ntol=2000
+
+and every answer is one line of json. Accessions not loaded up front are loaded the first time they are asked for,
+if their gene file exists.
+"""
+
+import os
+import sys
+import json
+
+from .cluster_tools import Bug, find_nearby_genes
+from .compressed import find_variant
+
+
+# class GeneService holds the preloaded genes of every accession and answers queries on them
+class GeneService:
+
+    def __init__(self, gene_path, ntol=2000, max_genes=6):
+
+        self.gene_path = gene_path      # folder holding the <acc>.csv gene files
+        self.ntol = ntol                # default nucleotides around a position to look for genes in
+        self.max_genes = max_genes      # default maximum number of genes per answer
+        self.bugs = dict()              # accession number: Bug with its genes loaded
+
+    # loads the genes of an accession, returning its Bug (None if it has no gene file)
+    def load(self, acc_num):
+
+        if acc_num not in self.bugs:
+            gene_file = find_variant(os.path.join(self.gene_path, acc_num + '.csv'))
+            if not os.path.exists(gene_file):
+                return None
+            bug = Bug(accession_num=acc_num)
+            bug.load_genes_from_file(gene_file)
+            self.bugs[acc_num] = bug
+        return self.bugs[acc_num]
+
+    # answers a query dictionary with the accession, a position (or start and end) and optionally a contig, ntol
+    # and max_genes. Returns the answer as a dictionary, with an 'error' if the query could not be answered.
+    def lookup(self, query):
+
+        try:
+            acc_num = str(query['accession'])
+            start = int(query['start'] if 'start' in query else query['position'])
+            end = int(query.get('end', start))
+            ntol = int(query.get('ntol', self.ntol))
+            max_genes = int(query.get('max_genes', self.max_genes))
+        except (KeyError, TypeError, ValueError):
+            return {'error': "a query needs an accession and a position", 'query': query}
+
+        bug = self.load(acc_num)
+        if bug is None:
+            return {'error': "no gene file for " + acc_num, 'query': query}
+
+        cluster = (start, end) if query.get('contig') is None else (start, end, str(query['contig']))
+        loci, products, translations = find_nearby_genes(bug, cluster, ntol, max_genes)
+        if loci == ['No nearby loci']:
+            loci, products = list(), list()
+
+        answer = {'accession': acc_num, 'start': start, 'end': end, 'ntol': ntol, 'loci': loci,
+                  'products': products}
+        if len(cluster) > 2:
+            answer['contig'] = cluster[2]
+        return answer
+
+
+# function parse_query reads one query line: json, or whitespace separated accession, start, [end], [contig]
+def parse_query(line):
+
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return {'line': line}
+
+    fields = line.split()
+    query = {'line': line}
+    for key, value in zip(('accession', 'start', 'end', 'contig'), fields):
+        query[key] = value
+    return query
+
+
+# function serve_stream answers the queries on lines of infile, writing one json answer per line to outfile
+def serve_stream(service, infile=sys.stdin, outfile=sys.stdout):
+
+    for line in infile:
+        if line.strip() == '':
+            continue
+        outfile.write(json.dumps(service.lookup(parse_query(line))) + '\n')
+        outfile.flush()
+    return
+
+
+# function serve_http answers GET /genes?accession=..&position=.. requests (also start, end, contig, ntol and
+# max_genes) on the given localhost port until interrupted
+def serve_http(service, port, host='127.0.0.1'):
+
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qsl
+
+    class GeneHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            url = urlparse(self.path)
+            if url.path != '/genes':
+                self.send_error(404, "Ask for /genes?accession=...&position=...")
+                return
+
+            answer = service.lookup(dict(parse_qsl(url.query)))
+            body = json.dumps(answer).encode()
+            self.send_response(400 if 'error' in answer else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # keeps the request log off the terminal
+        def log_message(self, format, *args):
+            return
+
+    server = ThreadingHTTPServer((host, port), GeneHandler)
+    print("Answering gene queries on http://{0}:{1}/genes".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return
@@ -0,0 +1,188 @@
+"""ingest turns SOR exports into per-position read counts without ever holding the whole file (or one entry per
+read) in memory. The csv is read in fixed-size chunks and every chunk is added to a CountAccumulator, a uint32
+count per genome position, so peak memory depends on the genome length and not on the number of reads.
+
+Genomes with more than one chromosome or plasmid keep one count array per contig (see ContigAccumulator). A csv
+export names the contig of each read in an optional RNAME column; without one, the whole file is a single contig
+named None. The csv may be compressed (see compressed).
+"""
+
+import csv
+import sys
+import itertools
+import numpy as np
+
+from .compressed import open_text
+
+CHUNK_ROWS = 1 << 16    # csv rows parsed per chunk; keeps the python row objects of a chunk small
+DENSE_SPAN = 8          # chunks spanning fewer than this many positions per read are counted with bincount
+
+
+# class CountAccumulator adds up reads per position in a preallocated uint32 array. If the genome length is not
+# known up front, the array grows (doubling) to fit the largest position seen.
+class CountAccumulator:
+
+    def __init__(self, genome_length=0):
+
+        self.counts = np.zeros(max(int(genome_length), 1) + 1, dtype=np.uint32)   # index is the position
+        self.reads = 0                                                          # reads added so far
+
+    # adds one read at each position in the array (positions may repeat)
+    def add(self, positions):
+
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return
+
+        if positions.min() < 0:
+            positions = positions[positions >= 0]
+            if len(positions) == 0:
+                return
+
+        top = int(positions.max())
+        if top >= len(self.counts):
+            grown = np.zeros(max(top + 1, 2 * len(self.counts)), dtype=np.uint32)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+
+        # only the span of positions the chunk covers is counted, so a chunk never costs a genome-length array.
+        # Sorted input (most SAM/BAM files) covers a narrow span that bincount handles fastest; a chunk scattered
+        # across the genome is added in place instead.
+        lo = int(positions.min())
+        if top - lo < DENSE_SPAN * len(positions):
+            chunk_counts = np.bincount(positions - lo, minlength=top - lo + 1)
+            self.counts[lo:top + 1] += chunk_counts.astype(np.uint32)
+        else:
+            np.add.at(self.counts, positions, np.uint32(1))
+        self.reads += len(positions)
+        return
+
+    # adds another accumulator's counts to this one
+    def merge(self, other):
+
+        if len(other.counts) > len(self.counts):
+            self.counts, other_counts = other.counts.copy(), self.counts
+        else:
+            other_counts = other.counts
+        self.counts[:len(other_counts)] += other_counts
+        self.reads += other.reads
+        return
+
+    # returns the sorted positions holding reads and their counts
+    def finish(self):
+
+        positions = np.flatnonzero(self.counts).astype(np.int64)
+        return positions, self.counts[positions].astype(np.int64)
+
+    # bytes held by the count array
+    def nbytes(self):
+        return self.counts.nbytes
+
+
+# class ContigAccumulator keeps a CountAccumulator per contig, in the order the contigs are first seen. lengths
+# (contig name: length), if known, lets each count array be allocated at its final size.
+class ContigAccumulator:
+
+    def __init__(self, lengths=None, genome_length=0):
+
+        self.contigs = dict()                               # contig name: CountAccumulator
+        self.lengths = lengths if lengths is not None else dict()
+        self.genome_length = genome_length                  # size to start contigs of unknown length at
+
+    def accumulator(self, contig):
+
+        if contig not in self.contigs:
+            self.contigs[contig] = CountAccumulator(self.lengths.get(contig, self.genome_length))
+        return self.contigs[contig]
+
+    # adds one read at each position, contig_names[k] naming the contig of positions[k]. contig_names may be None
+    # when every read is on the same unnamed contig.
+    def add(self, contig_names, positions):
+
+        if contig_names is None:
+            self.accumulator(None).add(positions)
+            return
+
+        # np.unique sorts the names; going through them by first row keeps the contigs in file order
+        names, first, which = np.unique(contig_names, return_index=True, return_inverse=True)
+        for k in np.argsort(first).tolist():
+            self.accumulator(names[k].item()).add(positions[which == k])
+        return
+
+    @property
+    def reads(self):
+        return sum(a.reads for a in self.contigs.values())
+
+    def nbytes(self):
+        return sum(a.nbytes() for a in self.contigs.values())
+
+    # returns the contig names, the positions and counts of every contig one after the other, and the bounds:
+    # contig k holds positions[bounds[k]:bounds[k + 1]]
+    def finish(self):
+
+        names = list(self.contigs) if len(self.contigs) > 0 else [None]
+        parts = [self.contigs[name].finish() if name in self.contigs else (np.array([], dtype=np.int64),) * 2
+                 for name in names]
+        bounds = np.concatenate(([0], np.cumsum([len(p[0]) for p in parts]))).astype(np.int64)
+        positions = np.concatenate([p[0] for p in parts]).astype(np.int64)
+        counts = np.concatenate([p[1] for p in parts]).astype(np.int64)
+        return names, positions, counts, bounds
+
+
+# function iter_sor_chunks reads a SOR csv and yields, per chunk of rows, the contig names (None if the csv has no
+# RNAME column) and the positions of the reads to count: reads with a TLEN of zero are skipped, as they always have
+# been.
+def iter_sor_chunks(sor_file, chunk_rows=CHUNK_ROWS):
+
+    with open_text(sor_file, 'r', newline='') as f:
+        reader = csv.reader(f)
+
+        try:
+            header = next(reader)
+            pos_col, tlen_col = header.index('POS'), header.index('TLEN')
+        except (StopIteration, ValueError):
+            print("Error occurred! Please ensure headers on file include TLEN and POS.")
+            sys.exit('file {}: missing POS or TLEN header'.format(sor_file))
+        contig_col = header.index('RNAME') if 'RNAME' in header else None
+
+        while True:
+            try:
+                rows = list(itertools.islice(reader, chunk_rows))
+            except csv.Error as e:
+                print("Error occurred! Please ensure headers on file include TLEN and POS.")
+                sys.exit('file {}, line {}: {}'.format(sor_file, reader.line_num, e))
+
+            if len(rows) == 0:
+                return
+
+            pos = np.array([row[pos_col] for row in rows], dtype=np.int64)
+            tlen = np.array([row[tlen_col] for row in rows], dtype=np.int64)
+            keep = tlen != 0
+            if contig_col is None:
+                yield None, pos[keep]
+            else:
+                yield np.array([row[contig_col] for row in rows])[keep], pos[keep]
+
+
+# function stream_sor_counts reads a SOR csv chunk by chunk into a ContigAccumulator and returns it
+def stream_sor_counts(sor_file, genome_length=0, chunk_rows=CHUNK_ROWS):
+
+    accumulator = ContigAccumulator(genome_length=genome_length)
+    for contig_names, positions in iter_sor_chunks(sor_file, chunk_rows):
+        accumulator.add(contig_names, positions)
+    return accumulator
+
+
+# function peak_memory_mb returns the peak resident memory of this process in MB, or None where that cannot be read
+def peak_memory_mb():
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
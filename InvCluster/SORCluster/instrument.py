@@ -0,0 +1,213 @@
+"""instrument records how long each part of a run takes and how much memory it needs. Code to be measured is
+wrapped in a span:
+
+    with span('load', acc_num):
+        SOR_bug = SOR(acc_num, sor_file)
+
+Spans nest, and are named by their path (a 'load' inside the 'detect' stage is 'detect/load'). Each records its
+wall time, CPU time and the peak resident memory of the process so far, and the run report lists every span plus
+a summary per accession and stage (see write_report).
+
+For a closer look at one stage, configure can turn on cProfile for every span of that name (the statistics are
+added up over all of them) and tracemalloc for every span of another, adding the peak traced allocation to each
+span. Both are off by default, and spans cost next to nothing without them.
+"""
+
+import os
+import io
+import csv
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+from .ingest import peak_memory_mb
+
+_spans = list()         # finished spans of this process, in the order they finished
+_stack = list()         # names of the spans currently open
+_settings = {'profile': None, 'trace_memory': None}
+_profiler = list()      # holds the cProfile.Profile once profiling has started
+
+
+# function configure sets which stage (a span name or path, e.g. 'cluster' or 'detect/cluster') is profiled with
+# cProfile and which has its allocations traced with tracemalloc
+def configure(profile_stage=None, trace_memory_stage=None):
+
+    _settings['profile'] = profile_stage
+    _settings['trace_memory'] = trace_memory_stage
+    return
+
+
+# function settings returns the current configuration, for handing on to worker processes
+def settings():
+    return dict(_settings)
+
+
+def _matches(stage, path):
+    return stage is not None and (stage == path or stage == path.split('/')[-1])
+
+
+# context manager span measures the code it wraps. info is any extra detail worth keeping with the span.
+@contextmanager
+def span(name, accession=None, **info):
+
+    _stack.append(name)
+    path = '/'.join(_stack)
+
+    profile = _matches(_settings['profile'], path)
+    if profile:
+        if len(_profiler) == 0:
+            import cProfile
+            _profiler.append(cProfile.Profile())
+        _profiler[0].enable()
+
+    trace = _matches(_settings['trace_memory'], path)
+    started_tracing = False
+    if trace:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        tracemalloc.reset_peak()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        record = {'accession': accession, 'stage': path, 'wall_s': time.perf_counter() - wall,
+                  'cpu_s': time.process_time() - cpu, 'peak_rss_mb': peak_memory_mb(), 'pid': os.getpid()}
+        if profile:
+            _profiler[0].disable()
+        if trace:
+            import tracemalloc
+            record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            if started_tracing:
+                tracemalloc.stop()
+        record.update(info)
+        _spans.append(record)
+        _stack.pop()
+
+
+# function spans returns the spans recorded so far
+def spans():
+    return list(_spans)
+
+
+# function current_path returns the path of the innermost open span ('' outside any)
+def current_path():
+    return '/'.join(_stack)
+
+
+# function add_spans takes in spans recorded by another process. With a parent path (see current_path), the spans
+# are filed under it, as if they had been opened inside that span in this process.
+def add_spans(records, parent=''):
+
+    for r in records:
+        if parent != '':
+            r = dict(r, stage=parent + '/' + r['stage'])
+        _spans.append(r)
+    return
+
+
+# function start_worker readies a pool worker to record spans for its parent: a forked worker starts out with a
+# copy of the parent's spans and open spans, which are not its own to report. Memory tracing follows the parent's
+# settings (config, see settings); profiles stay in the process that made them, so profile with a single job.
+def start_worker(config):
+
+    del _spans[:]
+    del _stack[:]
+    del _profiler[:]
+    configure(None, config['trace_memory'])
+    return
+
+
+# function take_spans hands over (and forgets) the spans this process recorded since they were last taken, so a
+# pool worker running many tasks sends each of its spans to the parent once
+def take_spans():
+
+    records = list(_spans)
+    del _spans[:]
+    return records
+
+
+# function reset forgets every recorded span and profile
+def reset():
+
+    del _spans[:]
+    del _profiler[:]
+    return
+
+
+# function recorded_call runs func in a worker process, in a span of the given name, and returns its result along
+# with the spans it recorded so the parent can add them to its report. Memory tracing follows the parent's
+# settings; profiles stay in the process that made them, so profile with a single job.
+def recorded_call(config, name, accession, func, *args):
+
+    configure(None, config['trace_memory'])
+    first = len(_spans)
+    with span(name, accession):
+        result = func(*args)
+    return result, _spans[first:]
+
+
+# function summarize adds the spans up per accession and stage: how many there were, their total wall and CPU time
+# and the largest peak memory seen. That peak is of the whole process up to the end of the span (see span), not of
+# the stage alone.
+def summarize(records):
+
+    summary = dict()
+    for r in records:
+        key = (r['accession'], r['stage'])
+        if key not in summary:
+            summary[key] = {'accession': r['accession'], 'stage': r['stage'], 'count': 0, 'wall_s': 0.0,
+                            'cpu_s': 0.0, 'peak_rss_mb': 0.0}
+        s = summary[key]
+        s['count'] += 1
+        s['wall_s'] += r['wall_s']
+        s['cpu_s'] += r['cpu_s']
+        s['peak_rss_mb'] = max(s['peak_rss_mb'], r['peak_rss_mb'] or 0.0)
+        if 'traced_peak_mb' in r:
+            s['traced_peak_mb'] = max(s.get('traced_peak_mb', 0.0), r['traced_peak_mb'])
+    return list(summary.values())
+
+
+# function write_report writes the run report: report_file (json) holds every span and the summary, and a csv of
+# the summary is written next to it. If a stage was profiled, its statistics are saved as <report>.prof.
+def write_report(report_file):
+
+    records = spans()
+    summary = summarize(records)
+
+    with open(report_file, 'w') as f:
+        json.dump({'summary': summary, 'spans': records}, f, indent=1)
+
+    # the resident memory peak is the process's so far, whatever stage it happened in, and is headed as such
+    csv_file = os.path.splitext(report_file)[0] + '.csv'
+    columns = ['accession', 'stage', 'count', 'wall_s', 'cpu_s', 'peak_rss_mb', 'traced_peak_mb']
+    labels = ['accession', 'stage', 'count', 'wall_s', 'cpu_s', 'process_peak_rss_mb_so_far', 'traced_peak_mb']
+    with open(csv_file, 'w', newline='') as f:
+        csv.writer(f).writerow(labels)
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writerows(summary)
+
+    if len(_profiler) > 0:
+        _profiler[0].dump_stats(os.path.splitext(report_file)[0] + '.prof')
+
+    return csv_file
+
+
+# function print_summary prints the time and memory of every stage, and the top of the profile if there is one
+def print_summary(out=sys.stdout):
+
+    out.write("{0:<14}{1:<24}{2:>7}{3:>10}{4:>10}{5:>18}\n".format('accession', 'stage', 'count', 'wall s', 'cpu s',
+                                                                 'process peak MB'))
+    for s in summarize(spans()):
+        out.write("{0:<14}{1:<24}{2:>7}{3:>10.3f}{4:>10.3f}{5:>18.1f}\n".format(
+            str(s['accession']), s['stage'], s['count'], s['wall_s'], s['cpu_s'], s['peak_rss_mb']))
+
+    if len(_profiler) > 0:
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(_profiler[0], stream=stream).sort_stats('cumulative').print_stats(15)
+        out.write("Profile of " + str(_settings['profile']) + ":\n" + stream.getvalue())
+    return
@@ -0,0 +1,120 @@
+"""manifest keeps track of what each pipeline stage was last run on, so stages whose inputs and parameters have not
+changed can be skipped. Every accession gets one manifest file in its results folder holding, per stage, the
+digests of the input files, the parameter values and whatever small results the stage wants to keep around.
+"""
+
+import os
+import json
+import hashlib
+
+manifest_filename = '.manifest.json'
+
+
+# function file_digest returns the sha1 of a file's contents, read in chunks so big SOR files are fine
+def file_digest(path, chunk_size=1 << 20):
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            h.update(chunk)
+            chunk = f.read(chunk_size)
+    return h.hexdigest()
+
+
+# class Manifest is the record of stage runs for one accession
+class Manifest:
+
+    def __init__(self, acc_results_path):
+
+        self.path = os.path.join(acc_results_path, manifest_filename)
+        self.stages = dict()        # stage name: {'inputs': {...}, 'params': {...}, 'outputs': [...], 'data': ...}
+        self.files = dict()         # file path: [size, mtime_ns, digest], so unchanged files are not rehashed
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+                self.stages = saved.get('stages', dict())
+                self.files = saved.get('files', dict())
+            except ValueError:
+                # a half-written manifest just means everything gets redone
+                print("Manifest", self.path, "is unreadable; starting over.")
+
+    # returns the digest of a file, reusing the recorded one if the file's size and mtime have not moved
+    def digest(self, path):
+
+        if not os.path.exists(path):
+            return None
+
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        known = self.files.get(key)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+
+        d = file_digest(path)
+        self.files[key] = [st.st_size, st.st_mtime_ns, d]
+        return d
+
+    # digests a name:path dictionary of input files
+    def digest_inputs(self, input_files):
+
+        return dict((name, self.digest(path)) for name, path in input_files.items())
+
+    # True if the stage was last run on the same inputs and parameters
+    def matches(self, stage, inputs, params):
+
+        entry = self.stages.get(stage)
+        if entry is None:
+            return False
+        return entry['inputs'] == inputs and entry['params'] == _jsonable(params)
+
+    # True if the stage was last run on the same inputs and parameters and all of its outputs still exist
+    def is_current(self, stage, inputs, params):
+
+        if not self.matches(stage, inputs, params):
+            return False
+        entry = self.stages[stage]
+        for path in entry['outputs']:
+            if not os.path.exists(path):
+                return False
+        return True
+
+    # returns whatever data a stage stored with its last run
+    def data(self, stage):
+
+        entry = self.stages.get(stage)
+        return None if entry is None else entry.get('data')
+
+    # records a stage run and saves the manifest straight away, so an interrupted run keeps finished stages
+    def record(self, stage, inputs, params, outputs=(), data=None):
+
+        self.stages[stage] = {'inputs': inputs, 'params': _jsonable(params), 'outputs': list(outputs),
+                              'data': _jsonable(data)}
+        self.save()
+        return
+
+    def save(self):
+
+        folder = os.path.dirname(self.path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'stages': self.stages, 'files': self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        return
+
+
+# function _jsonable turns numpy scalars and tuples into plain json types so manifests compare equal after a reload
+def _jsonable(obj):
+
+    if isinstance(obj, dict):
+        return dict((str(k), _jsonable(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return obj
@@ -0,0 +1,80 @@
+#! usr/bin/python
+
+"""orchestrate runs the whole pipeline with the stages of different accessions overlapping, instead of one stage
+after the other over all accessions. Each accession needs two things before its genes can be matched: its
+detection results and its gene file. While detection runs on a process pool, the GenBank files of every
+accession are downloaded on a few threads and parsed on the same pool, and each accession is annotated (then
+rendered) as soon as both of its inputs are ready. The Entrez downloads are thereby off the critical path.
+
+An asyncio event loop does the bookkeeping. The work sent to the process pool goes through a priority queue, so
+parsing and annotation, which someone is waiting on, go ahead of the detection and drawing still queued up.
+"""
+
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .instrument import settings, recorded_call, add_spans
+
+# the order pool work is taken up in when several are waiting, most urgent first
+STAGE_PRIORITY = {'parse': 0, 'annotate': 1, 'detect': 2, 'render': 3}
+
+
+# function run_overlapped runs the fetch, parse, detect, annotate and render stage functions (stage: function, see
+# cli.STAGE_FUNCTIONS) of every accession, with jobs processes for the parsing, detection, annotation and drawing
+# and fetch_jobs threads for the downloads
+def run_overlapped(ws, accessions, options, stage_functions, jobs=1, fetch_jobs=4):
+
+    asyncio.run(_pipeline(ws, accessions, options, stage_functions, max(1, jobs), max(1, fetch_jobs)))
+    return
+
+
+async def _pipeline(ws, accessions, options, stage_functions, jobs, fetch_jobs):
+
+    loop = asyncio.get_running_loop()
+    config = settings()
+    queue = asyncio.PriorityQueue()
+    order = itertools.count()       # keeps equal priorities first come, first served
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool, ThreadPoolExecutor(max_workers=fetch_jobs) as threads:
+
+        # each dispatcher keeps one pool process busy with the most urgent work waiting
+        async def dispatcher():
+            while True:
+                priority, n, stage, acc_num, done = await queue.get()
+                try:
+                    result, records = await loop.run_in_executor(pool, recorded_call, config, stage, acc_num,
+                                                                 stage_functions[stage], ws, acc_num, options)
+                    add_spans(records)
+                    done.set_result(result)
+                except Exception as e:
+                    done.set_exception(e)
+                queue.task_done()
+
+        # runs a stage of an accession on the pool, once its turn comes
+        async def in_pool(stage, acc_num):
+            done = loop.create_future()
+            queue.put_nowait((STAGE_PRIORITY[stage], next(order), stage, acc_num, done))
+            await done
+
+        # downloads the GenBank file, then parses its genes
+        async def gene_file(acc_num):
+            await loop.run_in_executor(threads, stage_functions['fetch'], ws, acc_num, options)
+            print("Entrez data for", acc_num, "is ready.")
+            await in_pool('parse', acc_num)
+
+        async def accession(acc_num):
+            await asyncio.gather(in_pool('detect', acc_num), gene_file(acc_num))
+            await in_pool('annotate', acc_num)
+            await in_pool('render', acc_num)
+            print("Finished", acc_num)
+
+        dispatchers = [asyncio.ensure_future(dispatcher()) for _ in range(jobs)]
+        try:
+            await asyncio.gather(*[accession(acc_num) for acc_num in accessions])
+        finally:
+            for d in dispatchers:
+                d.cancel()
+            await asyncio.gather(*dispatchers, return_exceptions=True)
+
+    return
@@ -0,0 +1,157 @@
+#! usr/bin/python
+
+"""results_db keeps the results of every accession in one SQLite database, so questions across many genomes are a
+query instead of a trawl through csv and tsv files. The tables are:
+
+    signals     one row per signal (pairs and spikes, see is_pair), as in the cluster analysis file
+    pairs       a view of the signals that are true inversion pairs
+    genes       every CDS of the gene file, with its position, strand and product
+    gene_hits   one row per gene near each inversion pair, as in the tsv (rank is its order there)
+    parameters  the settings each stage last ran with
+
+All of them are keyed on the accession number and indexed on it and the positions, and the gene tables also on
+the locus tag. An accession's rows are replaced in a single transaction each time a stage stores them. The
+database runs in WAL mode, so worker processes storing different accessions at once wait on each other briefly
+instead of failing. For example, every inversion pair within 2 kb of a glycosyltransferase:
+
+    SELECT p.accession, p.start, p."end", g.locus_tag, g.product FROM pairs p JOIN genes g
+    ON g.accession = p.accession AND g.start <= p."end" + 2000 AND g."end" >= p.start - 2000
+    WHERE g.product LIKE '%glycosyl%transferase%'
+
+genes_near_pairs runs this, also making sure the gene and the pair are on the same contig.
+"""
+
+import sqlite3
+
+DB_FILENAME = '__results.sqlite'    # default database name, in the results folder
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS signals (
+    accession TEXT NOT NULL, contig TEXT, start INTEGER NOT NULL, "end" INTEGER NOT NULL, is_pair INTEGER NOT NULL,
+    length INTEGER, reads INTEGER, cluster_reads INTEGER, percent_cluster REAL, percent_total REAL,
+    enrichment REAL, log10_p REAL);
+CREATE INDEX IF NOT EXISTS signals_position ON signals (accession, start);
+CREATE VIEW IF NOT EXISTS pairs AS SELECT * FROM signals WHERE is_pair = 1;
+
+CREATE TABLE IF NOT EXISTS genes (
+    accession TEXT NOT NULL, contig TEXT, locus_tag TEXT, name TEXT, start INTEGER NOT NULL, "end" INTEGER NOT NULL,
+    is_complement TEXT, product TEXT);
+CREATE INDEX IF NOT EXISTS genes_position ON genes (accession, start);
+CREATE INDEX IF NOT EXISTS genes_locus ON genes (locus_tag);
+
+CREATE TABLE IF NOT EXISTS gene_hits (
+    accession TEXT NOT NULL, contig TEXT, start INTEGER NOT NULL, "end" INTEGER NOT NULL, cluster_pos REAL,
+    rank INTEGER, locus_tag TEXT, product TEXT);
+CREATE INDEX IF NOT EXISTS gene_hits_position ON gene_hits (accession, start);
+CREATE INDEX IF NOT EXISTS gene_hits_locus ON gene_hits (locus_tag);
+
+CREATE TABLE IF NOT EXISTS parameters (
+    accession TEXT NOT NULL, stage TEXT NOT NULL, name TEXT NOT NULL, value TEXT);
+CREATE INDEX IF NOT EXISTS parameters_accession ON parameters (accession, stage);
+'''
+
+# SQL condition for gene g lying on the contig of signal p. As in Bug.contig_genes, a missing contig on either side
+# means any, and names match with or without a version suffix (FN545816 and FN545816.1).
+SAME_CONTIG = ('(p.contig IS NULL OR g.contig IS NULL OR g.contig = p.contig '
+               "OR substr(g.contig, 1, length(p.contig) + 1) = p.contig || '.' "
+               "OR substr(p.contig, 1, length(g.contig) + 1) = g.contig || '.')")
+
+
+# function connect opens (and if need be creates) the results database
+def connect(db_file, timeout=60):
+
+    conn = sqlite3.connect(db_file, timeout=timeout)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# function has_stage tells whether a stage has stored the results of an accession yet
+def has_stage(db_file, acc_num, stage):
+
+    conn = connect(db_file)
+    try:
+        found = conn.execute('SELECT 1 FROM parameters WHERE accession = ? AND stage = ? LIMIT 1',
+                             (acc_num, stage)).fetchone()
+    finally:
+        conn.close()
+    return found is not None
+
+
+# function _replace swaps an accession's rows of some tables for new ones, all in one transaction. rows is a
+# table: list of row tuples dictionary, and params the stage: {name: value} parameters to record along with them.
+def _replace(db_file, acc_num, rows, params):
+
+    conn = connect(db_file)
+    try:
+        with conn:
+            for table in rows:
+                conn.execute('DELETE FROM ' + table + ' WHERE accession = ?', (acc_num,))
+                if len(rows[table]) > 0:
+                    marks = ', '.join(['?'] * len(rows[table][0]))
+                    conn.executemany('INSERT INTO ' + table + ' VALUES (' + marks + ')', rows[table])
+            for stage in params:
+                conn.execute('DELETE FROM parameters WHERE accession = ? AND stage = ?', (acc_num, stage))
+                conn.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?)',
+                                 [(acc_num, stage, name, str(value)) for name, value in params[stage].items()])
+    finally:
+        conn.close()
+    return
+
+
+# function store_detection stores the signals of a Detection (see cluster_detect) and the detection settings
+def store_detection(db_file, detection):
+
+    acc_num = detection.accession_num
+    rows = [(acc_num, str(s['contig']) if s['contig'] != '' else None, int(s['start']), int(s['end']),
+             int(s['is_pair']), int(s['length']), int(s['reads']), int(s['cluster_reads']),
+             float(s['percent_cluster']), float(s['percent_total']), float(s['enrichment']), float(s['log10_p']))
+            for s in detection.signals]
+
+    params = dict(detection.params)
+    params.update({'read_cutoff': detection.threshold['read_cutoff'],
+                   'final_bin_size': detection.threshold['final_bin_size'],
+                   'data_sum': detection.threshold['data_sum']})
+
+    _replace(db_file, acc_num, {'signals': rows}, {'detect': params})
+    return len(rows)
+
+
+# function store_annotation stores the genes of a Bug and the gene hits returned by match_clusters_to_genes, with
+# the ntol and max_genes they were found with
+def store_annotation(db_file, bug, hits, ntol, max_genes):
+
+    acc_num = bug.accession_num
+    genes = [(acc_num, g.contig, g.locus_tag, g.name, g.seq_start, g.seq_end, g.is_complement, g.function)
+             for g in bug.genes]
+
+    gene_hits = list()
+    for hit in hits:
+        cluster = hit['cluster']
+        if hit['loci'] == ['No nearby loci']:
+            continue
+        for rank, (locus, product) in enumerate(zip(hit['loci'], hit['products'])):
+            gene_hits.append((acc_num, cluster[2] if len(cluster) > 2 else None, cluster[0], cluster[1],
+                              (cluster[0] + cluster[1]) / 2, rank, locus, product))
+
+    _replace(db_file, acc_num, {'genes': genes, 'gene_hits': gene_hits},
+             {'annotate': {'ntol': ntol, 'max_genes': max_genes}})
+    return len(gene_hits)
+
+
+# function genes_near_pairs finds, over every accession, the inversion pairs with a gene whose product matches
+# product_pattern (an SQL LIKE pattern, e.g. '%glycosyl%transferase%') within distance nt of them. Returns
+# (accession, contig, pair start, pair end, locus tag, product, gene start, gene end) tuples.
+def genes_near_pairs(db_file, product_pattern, distance=2000):
+
+    conn = connect(db_file)
+    try:
+        return conn.execute(
+            'SELECT p.accession, p.contig, p.start, p."end", g.locus_tag, g.product, g.start, g."end" '
+            'FROM pairs p JOIN genes g ON g.accession = p.accession '
+            'AND g.start <= p."end" + ? AND g."end" >= p.start - ? '
+            'WHERE g.product LIKE ? AND ' + SAME_CONTIG + ' ORDER BY p.accession, p.start, g.start',
+            (distance, distance, product_pattern)).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,99 @@
+#! usr/bin/python
+
+"""sweep tries out a whole grid of detection settings on one SOR file, to help pick config.txt values for a new
+organism without a full detection run per setting.
+
+The SOR data is loaded once. The density histogram is made once per nbin_size and shared by every read cutoff,
+and the Cluster analysis of a candidate window is done once per set of cluster parameters, however many
+settings produced that window. The analyses are spread over a process pool. The result is a single table with
+the number of true pairs and spikes (and the pair positions) for every setting.
+"""
+
+import os
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from .detect_inversions import SOR
+from .cluster_detect import analyze_window, worker_args, merge_task_results, _init_worker, _analyze_task
+
+# the order grid parameters are listed in; the first two decide the windows, the rest the cluster analysis (in the
+# order analyze_window takes them)
+SWEEP_KEYS = ('nbin_size', 'read_cutoff', 'cbin_size', 'cbin_cutoff', 'cluster_min_sep', 'cluster_max_sep',
+              'ntpair_min_sep', 'ntpair_max_sep')
+
+
+# function expand_grid turns a parameter:list-of-values dictionary into every setting, as tuples in SWEEP_KEYS order
+def expand_grid(grid):
+
+    return list(itertools.product(*[grid[key] for key in SWEEP_KEYS]))
+
+
+# function sweep_accession runs every setting in grid (see SWEEP_KEYS) over one SOR file and returns one result
+# dictionary per setting, holding the setting plus the signal, pair and spike counts and the pair positions.
+def sweep_accession(acc_num, sor_file, grid, jobs=1):
+
+    settings = expand_grid(grid)
+    print("Sweeping", len(settings), "settings for", acc_num, "...")
+
+    SOR_bug = SOR(acc_num, sor_file)
+
+    # candidate windows for each (nbin_size, read_cutoff), one histogram per nbin_size and contig
+    windows = dict()
+    for nbin_size in grid['nbin_size']:
+        SOR_bug.bin_size = nbin_size
+        for contig in SOR_bug.contig_names:
+            SOR_bug.select_contig(contig)
+            h_densities, den_bin_edges = SOR_bug.make_density_histogram()
+            for read_cutoff in grid['read_cutoff']:
+                SOR_bug.apply_read_cutoff(read_cutoff, h_densities, den_bin_edges)
+                windows.setdefault((nbin_size, read_cutoff), list()).extend(SOR_bug.clusters)
+
+    # every distinct (window, cluster parameters) analysis the grid needs, done once
+    tasks = list()
+    for setting in settings:
+        cluster_setting = setting[2:]
+        for window in windows[setting[:2]]:
+            tasks.append((window, cluster_setting))
+    tasks = list(dict.fromkeys(tasks))
+    print("Analyzing", len(tasks), "distinct windows...")
+
+    if jobs <= 1:
+        analyses = [analyze_window(SOR_bug, window, *cluster_setting, verbose='n')
+                    for window, cluster_setting in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=worker_args(SOR_bug, sor_file)) as pool:
+            analyses = merge_task_results(pool.map(_analyze_task, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+    analysis = dict(zip(tasks, analyses))
+
+    results = list()
+    for setting in settings:
+        window_results = [analysis[(window, setting[2:])] for window in windows[setting[:2]]]
+        pairs = [tuple(r['signal']) + ((r['contig'],) if 'contig' in r else ())
+                 for r in window_results if r['is_pair'] == 'Y']
+        result = dict(zip(SWEEP_KEYS, setting))
+        result['signals'] = len(window_results)
+        result['true_pairs'] = len(pairs)
+        result['spikes'] = len(window_results) - len(pairs)
+        result['pair_positions'] = pairs
+        results.append(result)
+
+    return results
+
+
+# function write_sweep_results writes the sweep table, one row per setting
+def write_sweep_results(results, sweep_file):
+
+    with open(sweep_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_KEYS + ('Signals', 'True Pairs', 'Spikes', 'Pair Positions'))
+        for r in results:
+            pairs = '; '.join((('{2}:' if len(p) > 2 else '') + '{0}-{1}').format(*p) for p in r['pair_positions'])
+            writer.writerow([r[key] for key in SWEEP_KEYS] + [r['signals'], r['true_pairs'], r['spikes'], pairs])
+    return
+
+
+# function sweep_file_path names the sweep table of an accession
+def sweep_file_path(acc_results_path, acc_num):
+    return os.path.join(acc_results_path, acc_num + ' parameter sweep.csv')
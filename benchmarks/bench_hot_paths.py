@@ -0,0 +1,303 @@
+#! usr/bin/python
+
+"""bench_hot_paths times the detection and annotation hot paths on synthetic data of growing size, and keeps a
+history of the results so a change can be checked against the commits before it. Run it from the repo root:
+
+$ python3 benchmarks/bench_hot_paths.py                                 # 10^4 to 10^6 reads, 10^3 to 10^4 CDS
+$ python3 benchmarks/bench_hot_paths.py --reads 1e4 1e6 1e8 --cds 1e3 1e5 --cases load_sor cluster
+
+Cases (reads or CDS decide the size):
+
+    load_sor         SOR of a csv export, parsed from scratch            reads
+    load_sor_index   SOR of a csv export, memory-mapped from its index   reads
+    subset           SOR.subset of 1000 windows of 5000 nt                reads
+    cluster          Cluster.__init__ end to end on every planted pair    reads
+    parse_genes      parse_gbflat_genes of a GenBank flat file            CDS
+    load_genes       Bug.load_genes_from_file                             CDS
+    match_genes      match_clusters_to_genes of 200 clusters, no drawing  CDS
+
+The synthetic SOR files have reads spread evenly over a 4 Mb genome plus a planted inversion pair every 200 kb,
+and the GenBank files have a CDS every kb with multi-line products and translations, the way NCBI writes them.
+Generated data is kept in --data (default: a folder in the temp directory) and reused by later runs.
+
+Each case runs in a child interpreter of its own, so its peak memory is its own; the best wall and CPU time and
+the highest peak resident memory of --repeats runs are reported. Every run is appended to
+benchmarks/results/history.jsonl along with the git commit, and each case is compared to the last time it ran.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(REPO_PATH, 'benchmarks', 'results', 'history.jsonl')
+
+GENOME_LENGTH = 4000000     # nt of the synthetic genomes
+PAIR_SPACING = 200000       # a planted inversion pair every this many nt
+PAIR_SIZE = 400             # nt between the two sites of a planted pair
+PAIR_SHARE = 0.01           # share of the reads sitting on each site of the planted pairs
+GENE_SPACING = 1000         # a CDS starts every this many nt
+WRITE_ROWS = 1 << 20        # rows of a synthetic SOR csv written at once
+
+CASES = ('load_sor', 'load_sor_index', 'subset', 'cluster', 'parse_genes', 'load_genes', 'match_genes')
+READ_CASES = CASES[:4]
+
+
+# function make_sor_csv writes a synthetic SOR csv with the columns of a real export, n_reads reads in all
+def make_sor_csv(sor_file, n_reads, seed=0):
+
+    rng = np.random.default_rng(seed)
+    sites = pair_sites()
+    site_reads = int(n_reads * PAIR_SHARE)
+    planted = np.repeat(sites, site_reads)
+    background = n_reads - len(planted)
+
+    with open(sor_file, 'w') as f:
+        f.write('"","colors","POS","CIGAR","TLEN"\n')
+        row = 1
+        for start in range(0, background + len(planted), WRITE_ROWS):
+            n = min(WRITE_ROWS, background + len(planted) - start)
+            # the planted reads go last, so the background is drawn chunk by chunk
+            drawn = max(0, min(n, background - start))
+            pos = np.concatenate((rng.integers(1, GENOME_LENGTH, drawn),
+                                  planted[max(0, start - background):max(0, start - background) + n - drawn]))
+            tlen = rng.integers(100, 300, n)
+            lines = ['"{0}",99,{1},"75M",{2}\n'.format(row + k, p, t)
+                     for k, (p, t) in enumerate(zip(pos.tolist(), tlen.tolist()))]
+            f.write(''.join(lines))
+            row += n
+    return
+
+
+# function pair_sites returns the positions of the planted inversion sites, both sites of every pair
+def pair_sites():
+
+    starts = np.arange(PAIR_SPACING // 2, GENOME_LENGTH, PAIR_SPACING)
+    return np.sort(np.concatenate((starts, starts + PAIR_SIZE)))
+
+
+# function make_genbank writes a synthetic GenBank flat file holding n_cds CDS records
+def make_genbank(gb_file, n_cds, seed=0):
+
+    rng = np.random.default_rng(seed)
+    length = max(GENOME_LENGTH, n_cds * GENE_SPACING + GENE_SPACING)
+    amino = np.array(list('ACDEFGHIKLMNPQRSTVWY'))
+    q = '                     '     # qualifier indent
+
+    with open(gb_file, 'w') as f:
+        f.write('LOCUS       SYN000001  {0} bp    DNA     circular BCT 01-JAN-2020\n'.format(length))
+        f.write('FEATURES             Location/Qualifiers\n')
+        for k in range(0, n_cds):
+            start, end = k * GENE_SPACING + 1, k * GENE_SPACING + 900
+            loc = 'complement({0}..{1})'.format(start, end) if k % 2 else '{0}..{1}'.format(start, end)
+            tag = 'SYN_{0:06d}'.format(k)
+            f.write('     gene            {0}\n{1}/locus_tag="{2}"\n'.format(loc, q, tag))
+            f.write('     CDS             {0}\n{1}/locus_tag="{2}"\n'.format(loc, q, tag))
+            f.write('{0}/product="synthetic protein number {1} of a rather long\n{0}product name"\n'.format(q, k))
+            f.write('{0}/protein_id="SYN{1:06d}.1"\n'.format(q, k))
+            protein = 'M' + ''.join(rng.choice(amino, 299).tolist())
+            lines = [protein[i:i + 58] for i in range(0, len(protein), 58)]
+            lines[0] = '/translation="' + lines[0]
+            lines[-1] += '"'
+            f.write(''.join(q + line + '\n' for line in lines))
+        f.write('ORIGIN\n//\n')
+    return
+
+
+# function make_cluster_file writes a cluster file with n clusters spread over the genome
+def make_cluster_file(cluster_file, n, length):
+
+    with open(cluster_file, 'w') as f:
+        f.write('Signal Start,Signal End,True Pair?\n')
+        for start in np.linspace(1000, length - 2000, n).astype(int).tolist():
+            f.write('{0},{1},Y\n'.format(start, start + PAIR_SIZE))
+    return
+
+
+# function prepare makes (or reuses) the data files a case needs and returns their paths
+def prepare(case, size, data_path):
+
+    if not os.path.exists(data_path):
+        os.makedirs(data_path)
+
+    if case in READ_CASES:
+        sor_file = os.path.join(data_path, 'SYN_{0}_reads.csv'.format(size))
+        if not os.path.exists(sor_file):
+            print("Writing", size, "synthetic reads to", sor_file, "...")
+            make_sor_csv(sor_file + '.tmp', size)
+            os.replace(sor_file + '.tmp', sor_file)
+        return {'sor': sor_file}
+
+    gb_file = os.path.join(data_path, 'SYN_{0}_cds.txt'.format(size))
+    if not os.path.exists(gb_file):
+        print("Writing", size, "synthetic CDS to", gb_file, "...")
+        make_genbank(gb_file + '.tmp', size)
+        os.replace(gb_file + '.tmp', gb_file)
+
+    gene_file = gb_file[:-4] + '.csv'
+    cluster_file = os.path.join(data_path, 'SYN_{0}_clusters.csv'.format(size))
+    if case != 'parse_genes' and not os.path.exists(gene_file):
+        run_child('parse_genes', {'gb': gb_file, 'genes': gene_file})
+    if case == 'match_genes' and not os.path.exists(cluster_file):
+        make_cluster_file(cluster_file, 200, size * GENE_SPACING)
+    return {'gb': gb_file, 'genes': gene_file, 'clusters': cluster_file}
+
+
+# function run_case is what the child interpreter runs: sets a case up, then times it alone
+def run_case(case, files):
+
+    sys.path.insert(0, REPO_PATH)
+    from InvCluster.SORCluster.detect_inversions import SOR, Cluster, sor_index_path
+    from InvCluster.SORCluster.cluster_tools import Bug, parse_gbflat_genes, match_clusters_to_genes
+    from InvCluster.SORCluster.ingest import peak_memory_mb
+
+    scratch = tempfile.mkdtemp()
+    devnull = open(os.devnull, 'w')
+
+    if case == 'load_sor':
+        def work():
+            SOR('SYN', files['sor'], index='n')
+    elif case == 'load_sor_index':
+        if not os.path.exists(os.path.join(sor_index_path(files['sor']), 'source.json')):
+            SOR('SYN', files['sor'])
+        def work():
+            SOR('SYN', files['sor'])
+    elif case == 'subset':
+        SOR_bug = SOR('SYN', files['sor'])
+        starts = np.random.default_rng(0).integers(1, GENOME_LENGTH - 5000, 1000).tolist()
+        def work():
+            for start in starts:
+                SOR_bug.subset(start, start + 5000)
+    elif case == 'cluster':
+        SOR_bug = SOR('SYN', files['sor'])
+        windows = [SOR_bug.subset(start - 2000, start + PAIR_SIZE + 2000)
+                   for start in pair_sites()[::2].tolist()]
+        def work():
+            for data_subset in windows:
+                Cluster(data_subset, cbinsize=40, cperc=98, clustersepmin=100, clustersepmax=1000, ntsepmin=50,
+                        ntsepmax=1000, range_max=SOR_bug.range_max())
+    elif case == 'parse_genes':
+        gene_file = files.get('genes', os.path.join(scratch, 'genes.csv'))
+        def work():
+            parse_gbflat_genes(files['gb'], gene_file)
+    elif case == 'load_genes':
+        def work():
+            Bug(accession_num='SYN').load_genes_from_file(files['genes'])
+    elif case == 'match_genes':
+        bug = Bug(accession_num='SYN')
+        bug.load_genes_from_file(files['genes'])
+        def work():
+            match_clusters_to_genes(bug, files['clusters'], os.path.join(scratch, 'SYN.tsv'),
+                                    os.path.join(scratch, 'SYN.fasta'), scratch, ntol=2000, max_genes=6,
+                                    draw_graphs='n')
+    else:
+        sys.exit("Unknown case " + case)
+
+    # the pipeline functions talk a lot; keep that out of the timing output
+    stdout, sys.stdout = sys.stdout, devnull
+    wall, cpu = time.perf_counter(), time.process_time()
+    work()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    sys.stdout = stdout
+
+    peak = peak_memory_mb()
+    print(json.dumps({'wall': wall, 'cpu': cpu, 'peak_mb': peak}))
+    return
+
+
+# function run_child runs one case in a fresh interpreter and returns its timing
+def run_child(case, files):
+
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', case, json.dumps(files)],
+                         check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().split('\n')[-1])
+
+
+# function git_commit returns the short hash of the checked out commit, marking uncommitted changes
+def git_commit():
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_PATH, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_PATH,
+                               check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+        return commit + ('+' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# function load_history returns the recorded runs, oldest first
+def load_history():
+
+    if not os.path.exists(HISTORY_FILE):
+        return list()
+    with open(HISTORY_FILE, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_history(entries):
+
+    folder = os.path.dirname(HISTORY_FILE)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(HISTORY_FILE, 'a') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+    return
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Time the detection and annotation hot paths.")
+    parser.add_argument('--reads', type=float, nargs='+', default=[1e4, 1e5, 1e6], help="synthetic SOR sizes")
+    parser.add_argument('--cds', type=float, nargs='+', default=[1e3, 1e4], help="synthetic GenBank sizes")
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'invcluster_bench'),
+                        help="folder the synthetic data is kept in")
+    parser.add_argument('--no-history', action='store_true', help="do not record this run")
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_case(args.child[0], json.loads(args.child[1]))
+        return
+
+    history = load_history()
+    commit = git_commit()
+    entries = list()
+
+    print("{0:<16}{1:>12}{2:>12}{3:>12}{4:>12}   {5}".format('case', 'size', 'wall s', 'cpu s', 'peak MB',
+                                                            'vs last run'))
+    for case in args.cases:
+        sizes = args.reads if case in READ_CASES else args.cds
+        for size in [int(s) for s in sizes]:
+            files = prepare(case, size, args.data)
+            runs = [run_child(case, files) for i in range(0, args.repeats)]
+            entry = {'case': case, 'size': size, 'commit': commit, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                     'wall': min(r['wall'] for r in runs), 'cpu': min(r['cpu'] for r in runs),
+                     'peak_mb': max(r['peak_mb'] or 0 for r in runs)}
+            entries.append(entry)
+
+            last = [h for h in history if h['case'] == case and h['size'] == size]
+            change = ''
+            if len(last) > 0:
+                change = '{0:+.0%} time, {1:+.0%} memory (at {2})'.format(
+                    entry['wall'] / last[-1]['wall'] - 1, entry['peak_mb'] / max(last[-1]['peak_mb'], 1e-9) - 1,
+                    last[-1]['commit'])
+            print("{0:<16}{1:>12}{2:>12.4f}{3:>12.4f}{4:>12.1f}   {5}".format(case, size, entry['wall'], entry['cpu'],
+                                                                          entry['peak_mb'], change))
+
+    if not args.no_history:
+        save_history(entries)
+        print("Recorded in", HISTORY_FILE)
+
+
+if __name__ == "__main__":
+    main()
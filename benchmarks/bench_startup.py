@@ -0,0 +1,66 @@
+#! usr/bin/python
+
+"""bench_startup times how long it takes a fresh interpreter to import the compute side of SORCluster
+(SOR, Cluster, parse_gbflat_genes, match_clusters_to_genes) and makes sure none of the plotting or network
+modules get dragged in along the way. Run it from the repo root:
+
+$ python3 benchmarks/bench_startup.py
+
+It exits with a non-zero status if a heavy module is imported or the import takes longer than the budget.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+# modules that should only ever be loaded when something is drawn or fetched
+HEAVY_MODULES = ('seaborn', 'matplotlib', 'reportlab', 'Bio', 'requests')
+
+# seconds a compute-only import is allowed to take (numpy alone is most of this)
+IMPORT_BUDGET = 1.5
+
+REPEATS = 5
+
+# the script each child interpreter runs; prints elapsed time and any heavy modules that slipped through
+CHILD_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {path!r})
+t = time.perf_counter()
+from InvCluster.SORCluster.detect_inversions import SOR, Cluster
+from InvCluster.SORCluster.cluster_tools import parse_gbflat_genes, match_clusters_to_genes, Bug
+elapsed = time.perf_counter() - t
+heavy = sorted(set(m.split('.')[0] for m in sys.modules) & set({heavy!r}))
+print(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+"""
+
+
+# function time_import runs one cold import of the compute modules in a child interpreter
+def time_import(repo_path):
+
+    script = CHILD_SCRIPT.format(path=repo_path, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', script], check=True, stdout=subprocess.PIPE,
+                         universal_newlines=True).stdout
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main():
+
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    results = [time_import(repo_path) for i in range(0, REPEATS)]
+    best = min(r['elapsed'] for r in results)
+    heavy = sorted(set(m for r in results for m in r['heavy']))
+
+    print("Compute import time (best of {0}): {1:.3f} s".format(REPEATS, best))
+
+    if len(heavy) > 0:
+        sys.exit("Heavy modules imported at startup: " + ', '.join(heavy))
+    if best > IMPORT_BUDGET:
+        sys.exit("Import took longer than the {0} s budget.".format(IMPORT_BUDGET))
+
+    print("No plotting or network modules loaded.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+#! usr/bin/python
+
+"""check_golden makes sure the fast paths give exactly the results of the plain ones. Run it from the repo root:
+
+$ python3 benchmarks/check_golden.py                    # the bundled FN545816 data plus 5 synthetic genomes
+$ python3 benchmarks/check_golden.py --synthetic 20 --seed 7 --keep /tmp/golden
+
+Every genome is run twice, through the pipeline as it is (detect_accession, annotate_accession) and through a
+reference written as plainly as possible, the way the original scripts worked:
+
+    reads        counted from the csv into a position:count dict
+    screen       np.histogram(..., density=True) over one array entry per read
+    windows      dict comprehension over every position, then the original Cluster analysis written out again
+                 (np.histogram over one entry per read, every bin pair listed and filtered one by one, the best
+                 nucleotide of a bin found by scanning its positions), so none of the pipeline's binning, pair
+                 scoring or RangeMax code is used
+    significance the Poisson tail summed term by term with math.lgamma
+    files        written row by row with csv.writer
+    genes        read from the gene csv with csv.DictReader and matched by walking the genes from the first one,
+                 with the original three loc_start/loc_end tests, so Bug, its bisection over the gene ends and
+                 find_nearby_genes are not used. Genes are matched within 100 kb of the clusters and once more
+                 within 2 kb, where trimming to max_genes no longer hides a gene that was missed
+
+Both write the analysis csv, cluster csv, tsv and translation fasta, which are compared field by field (numbers
+to a relative tolerance of 1e-9, so the float formatting of an older python does not count). For FN545816 the
+pipeline's files are also compared to the outputs committed in 'Cluster Data/FN545816'. Every divergence is
+listed, the time each side took is printed next to it, and the exit status is non-zero if anything diverged.
+"""
+
+import os
+import re
+import sys
+import csv
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+sys.path.insert(0, os.path.join(REPO_PATH, 'benchmarks'))
+
+from InvCluster.SORCluster.config import load_config
+from InvCluster.SORCluster.detect_inversions import SIGNAL_FLANK
+from InvCluster.SORCluster.cluster_detect import detect_accession
+from InvCluster.SORCluster.cluster_tools import parse_gbflat_genes
+from InvCluster.SORCluster.analyze_clusters import annotate_accession
+from bench_hot_paths import make_genbank
+
+BUNDLED = 'FN545816'
+BUNDLED_CUTOFF = 2.3558627474e-06
+NTOL = 100000
+NEAR_NTOL = 2000      # a second, tight gene matching pass, where the genes nearest a cluster are all kept
+REL_TOL = 1e-9
+
+NUMBER = re.compile(r'-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?')
+
+
+# function make_synthetic_sor writes a SOR csv of a random genome: reads spread evenly, a few inversion pairs with
+# random sizes and strengths, and a few solitary spikes. Returns the read density cutoff to screen it with.
+def make_synthetic_sor(sor_file, rng):
+
+    length = int(rng.integers(1000000, 3000000))
+    background = int(rng.integers(20000, 100000))
+    pos = [rng.integers(1, length, background)]
+    for k in range(0, int(rng.integers(1, 8))):
+        start = int(rng.integers(10000, length - 10000))
+        size = int(rng.integers(120, 950))
+        pos.append(np.repeat([start, start + size], rng.integers(50, 600, 2)))
+    for k in range(0, int(rng.integers(0, 5))):
+        pos.append(np.repeat(int(rng.integers(10000, length - 10000)), int(rng.integers(100, 800))))
+    pos = np.concatenate(pos)
+    tlen = rng.integers(100, 300, len(pos))
+
+    with open(sor_file, 'w') as f:
+        f.write('"","colors","POS","CIGAR","TLEN"\n')
+        f.write(''.join('"{0}",99,{1},"75M",{2}\n'.format(k + 1, p, t)
+                        for k, (p, t) in enumerate(zip(pos.tolist(), tlen.tolist()))))
+
+    # three times the density of an evenly spread genome
+    return 3.0 / length
+
+
+# function reference_counts reads a SOR csv into a position:count dict, skipping reads with a TLEN of zero
+def reference_counts(sor_file):
+
+    counts = dict()
+    with open(sor_file, 'r') as f:
+        for row in csv.DictReader(f):
+            if int(row['TLEN']) != 0:
+                pos = int(row['POS'])
+                counts[pos] = counts.get(pos, 0) + 1
+    return counts
+
+
+# function reference_log10_p is log10 P(X >= k) for X ~ Poisson(mu), summing the tail term by term
+def reference_log10_p(k, mu):
+
+    if k == 0:
+        return 0.0
+    terms = [-mu + j * math.log(mu) - math.lgamma(j + 1) for j in range(k, k + 5000)]
+    top = max(terms)
+    return (top + math.log(sum(math.exp(t - top) for t in terms))) / math.log(10)
+
+
+# function reference_best_nucleotide returns the position with the most reads between lo and hi (inclusive) and its
+# count, the leftmost on ties, by looking at every position
+def reference_best_nucleotide(counts, positions, lo, hi):
+
+    best_nt, read_max = -1, 0
+    for pos in positions:
+        if lo <= pos <= hi and counts[pos] > read_max:
+            best_nt, read_max = pos, counts[pos]
+    return best_nt, read_max
+
+
+# function reference_cluster analyzes one window the way the original Cluster did and returns its result as
+# analyze_window does: bins of about cbin_size nt from np.histogram over one entry per read, the bins at or above
+# the cbin_cutoff percentile, all pairs of them filtered on their separation, the pair with the most reads and
+# the best nucleotide of each of its bins, and finally the check that the two look like an inversion pair
+def reference_cluster(counts, params, tol=5):
+
+    positions = sorted(counts)
+    reads = np.repeat(positions, [counts[p] for p in positions])
+
+    bins = int((positions[-1] - positions[0]) / params['cbin_size'])
+    bin_counts, edges = np.histogram(reads, bins=bins)
+    bin_size = edges[1] - edges[0]
+    while abs(params['cbin_size'] - bin_size) > tol:
+        bins += -1 if params['cbin_size'] > bin_size else 1
+        bin_counts, edges = np.histogram(reads, bins=bins)
+        bin_size = edges[1] - edges[0]
+    result = {'cluster_reads': int(bin_counts.sum()), 'final_cbin_size': float(bin_size)}
+
+    cutoff = np.percentile(bin_counts, params['cbin_cutoff'])
+    passing = [(edges[i], int(bin_counts[i])) for i in range(0, len(bin_counts)) if bin_counts[i] >= cutoff]
+    pairs = [(passing[a], passing[b]) for a in range(0, len(passing)) for b in range(a + 1, len(passing))]
+
+    # removing from the list being looped over, exactly as the original filter_bin_pairs did
+    for pair in pairs:
+        sep = abs(pair[1][0] - pair[0][0])
+        if sep >= params['c_max_sep'] or sep <= params['c_min_sep']:
+            pairs.remove(pair)
+
+    if len(pairs) == 0:
+        peak = max(counts[p] for p in positions)
+        result.update({'signal': (positions[[counts[p] for p in positions].index(peak)],) * 2, 'is_pair': 'N',
+                       'dist': 0, 'reads': peak})
+        return result
+
+    best, best_pair = 0, ((-1, 0), (-1, 0))
+    for pair in pairs:
+        if pair[0][1] + pair[1][1] > best:
+            best, best_pair = pair[0][1] + pair[1][1], pair
+    nt1 = reference_best_nucleotide(counts, positions, best_pair[0][0], best_pair[0][0] + bin_size)
+    nt2 = reference_best_nucleotide(counts, positions, best_pair[1][0], best_pair[1][0] + bin_size)
+
+    dist = abs(nt1[0] - nt2[0])
+    per_dif = 100 * (abs(nt1[1] - nt2[1]) / (nt1[1] + nt2[1]))
+    if per_dif > 95 or dist >= params['n_max_sep'] or dist <= params['n_min_sep']:
+        spike = nt2 if nt2[1] > nt1[1] else nt1
+        result.update({'signal': (spike[0], spike[0]), 'is_pair': 'N', 'dist': 0, 'reads': spike[1]})
+    else:
+        result.update({'signal': (nt1[0], nt2[0]), 'is_pair': 'Y', 'dist': dist, 'reads': nt1[1] + nt2[1]})
+    return result
+
+
+# function reference_detect runs detection the plain way and writes the analysis and cluster files
+def reference_detect(acc_num, sor_file, acc_path, params, read_cutoff):
+
+    counts = reference_counts(sor_file)
+    positions = sorted(counts)
+    reads = np.repeat(positions, [counts[p] for p in positions])
+
+    nbins = int((positions[-1] - positions[0]) / params['nbin_size'])
+    densities, edges = np.histogram(reads, bins=nbins, density=True)
+    bin_size = float(edges[1] - edges[0])
+    windows = [(float(edges[i]), float(edges[i]) + bin_size) for i in range(0, nbins) if densities[i] >= read_cutoff]
+
+    results = list()
+    for start, end in windows:
+        r = reference_cluster(dict((p, counts[p]) for p in positions if start <= p <= end), params)
+
+        # background: every other read within SIGNAL_FLANK nt, spread over those nucleotides, plus one
+        lo, hi = r['signal'][0] - SIGNAL_FLANK, r['signal'][1] + SIGNAL_FLANK
+        signal_nts = 2 if r['signal'][0] != r['signal'][1] else 1
+        nearby = sum(counts[p] for p in positions if lo <= p <= hi)
+        expected = (max(nearby - r['reads'], 0) + 1) / (hi - lo + 1 - signal_nts) * signal_nts
+        r['enrichment'] = r['reads'] / expected
+        r['log10_p'] = reference_log10_p(r['reads'], expected)
+        results.append(r)
+
+    write_reference_results(acc_num, acc_path, results, params, read_cutoff, bin_size, len(reads))
+    return
+
+
+# function write_reference_results writes the analysis and cluster files of the reference results with csv.writer
+def write_reference_results(acc_num, acc_path, results, params, read_cutoff, bin_size, data_sum):
+
+    pairs = [r for r in results if r['is_pair'] == 'Y']
+    header = ['Signal Start', 'Signal End', 'True Pair?', 'Inversion Length', 'Combined Read Count',
+              'Percent Read to Cluster', 'Percent Read to All SORs', 'Enrichment', 'Log10 P-value']
+
+    rows = list()
+    for r in results:
+        rows.append([r['signal'][0], r['signal'][1], r['is_pair'], r['dist'], r['reads'],
+                     '{:.4}'.format(100 * (r['reads'] / r['cluster_reads'])),
+                     '{:.4}'.format(100 * (r['reads'] / data_sum)),
+                     '{:.1f}'.format(r['enrichment']), '{:.1f}'.format(r['log10_p'])])
+
+    with open(os.path.join(acc_path, acc_num + ' cluster analysis.csv'), 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Accession Number:', acc_num])
+        writer.writerow(['Number of signals detected', len(results)])
+        writer.writerow(['Number of inversion pairs detected', len(pairs)])
+        writer.writerow(['Number of signal peaks detected', len(results) - len(pairs)])
+        writer.writerow([''])
+        writer.writerow(header)
+        writer.writerows(rows)
+        writer.writerow([''])
+        writer.writerow(['RUN PARAMETERS:'])
+        writer.writerow(['Initial Density Cutoff', read_cutoff])
+        writer.writerow(['nt bin target for initial screen', params['nbin_size']])
+        writer.writerow(['nt bin achieved', bin_size])
+        writer.writerow(['nt cluster bin target', params['cbin_size']])
+        writer.writerow(['nt cluster bins achieved', [r['final_cbin_size'] for r in results]])
+        writer.writerow(['Minimum cluster bin distance', params['c_min_sep']])
+        writer.writerow(['Maximum cluster bin distance', params['c_max_sep']])
+        writer.writerow(['Cluster bin count percentile cutoff', params['cbin_cutoff']])
+        writer.writerow(['Minimum inversion size', params['n_min_sep']])
+        writer.writerow(['Maximum inversion size', params['n_max_sep']])
+
+    with open(os.path.join(acc_path, acc_num + '.csv'), 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(row for row in rows if row[2] == 'Y')
+    return
+
+
+# function reference_genes reads a gene csv into a list of dicts with integer locations, in file order
+def reference_genes(gene_file):
+
+    genes = list()
+    with open(gene_file, 'r') as f:
+        for row in csv.DictReader(f):
+            try:
+                row['loc_start'], row['loc_end'] = int(row['loc_start']), int(row['loc_end'])
+            except ValueError:
+                continue
+            row['segments'] = [tuple(int(x) for x in part.split('..')) for part in row['segments'].split(';')] \
+                if row.get('segments') else list()
+            genes.append(row)
+    return genes
+
+
+# function reference_nearby_genes finds the genes near a (start, end[, contig]) cluster the way the original
+# match_clusters_to_genes did: from the first gene on, until a gene starts past the cluster range, each gene is
+# added once for every one of the three tests it passes (end reaching into the range, lying inside it, start
+# reaching into it), and the genes furthest from the middle of the cluster are dropped down to max_genes.
+# A gene in pieces only counts if one of its pieces reaches into the range, and is looked at wherever it is listed.
+def reference_nearby_genes(genes, cluster, ntol, max_genes):
+
+    if len(cluster) > 2 and any(g.get('contig') for g in genes):
+        genes = [g for g in genes if g.get('contig') and g['contig'].split('.')[0] == cluster[2].split('.')[0]]
+
+    cluster_pos = (cluster[1] + cluster[0]) / 2
+    cluster_min, cluster_max = cluster[0] - ntol, cluster[1] + ntol
+
+    hits = list()   # (score, gene)
+    walking = True
+    for gene in genes:
+        loc_start, loc_end = gene['loc_start'], gene['loc_end']
+        walking = walking and loc_start <= cluster_max
+        if not walking and len(gene['segments']) <= 1:
+            continue
+        if len(gene['segments']) > 1 and \
+                not any(min(seg) <= cluster_max and max(seg) >= cluster_min for seg in gene['segments']):
+            continue
+        loc_avg = loc_start + ((loc_end - loc_start) / 2)
+        if loc_end >= cluster_min and loc_start <= cluster_min:
+            hits.append((cluster_pos - loc_avg, gene))
+        if loc_start >= cluster_min and loc_end <= cluster_max:
+            hits.append((abs(cluster_pos - loc_avg), gene))
+        if loc_start <= cluster_max and loc_end >= cluster_max:
+            hits.append((loc_avg - cluster_pos, gene))
+
+    while len(hits) > max_genes:
+        scores = [score for score, gene in hits]
+        hits.pop(scores.index(max(scores)))
+    return hits
+
+
+# function reference_annotate matches the reference clusters to genes within ntol and writes the tsv and
+# translation fasta
+def reference_annotate(acc_num, gene_file, acc_path, ntol, max_genes):
+
+    genes = reference_genes(gene_file)
+    with open(os.path.join(acc_path, acc_num + '.csv'), 'r') as f:
+        rows = list(csv.DictReader(f))
+    clusters = sorted((int(row['Signal Start']), int(row['Signal End'])) + ((row['Contig'],) if 'Contig' in row else ())
+                      for row in rows)
+    contigs = len(clusters) > 0 and len(clusters[0]) > 2
+
+    trans_file = os.path.join(acc_path, acc_num + '_translations_fasta.txt')
+    if os.path.exists(trans_file):
+        os.remove(trans_file)
+
+    with open(os.path.join(acc_path, acc_num + '.tsv'), 'w') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(("Cluster Pos", "Number Nearby Genes", "Loci", "Products") + (("Contig",) if contigs else ()))
+        for cluster in clusters:
+            hits = reference_nearby_genes(genes, cluster, ntol, max_genes)
+            if len(hits) == 0:
+                loci, products, translations = ['No nearby loci'], ['N/A'], ['N/A']
+            else:
+                loci = [gene['locus_tag'] for score, gene in hits]
+                products = [gene['product'] for score, gene in hits]
+                translations = [gene['translation'] for score, gene in hits]
+            row = ((cluster[1] + cluster[0]) / 2, str(len(loci)), '; '.join(loci), '; '.join(products))
+            writer.writerow(row + (cluster[2],) if contigs else row)
+            with open(trans_file, 'a') as h:
+                for locus, translation in zip(loci, translations):
+                    h.write('>' + acc_num + '_' + locus + '\n' + translation + '\n')
+    return
+
+
+# function pipeline_run runs the pipeline itself on one genome
+def pipeline_run(acc_num, sor_file, gene_file, acc_path, params, read_cutoff, max_genes):
+
+    detect_accession(acc_num, sor_file, acc_path, params['nbin_size'], params['cbin_cutoff'], params['cbin_size'],
+                     params['c_min_sep'], params['c_max_sep'], params['n_min_sep'], params['n_max_sep'],
+                     read_cutoff=read_cutoff, draw_graphs='n', force='y')
+    annotate_accession(acc_num, gene_file, acc_path, NTOL, max_genes, draw_graphs='n', force='y')
+    return
+
+
+# function output_files lists the result files of an accession that are compared
+def output_files(acc_num):
+    return (acc_num + ' cluster analysis.csv', acc_num + '.csv', acc_num + '.tsv', acc_num + '_translations_fasta.txt')
+
+
+# function read_fields splits a result file into rows of fields (tab separated for the tsv, fasta lines as they are)
+def read_fields(path):
+
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.tsv'):
+            return [row for row in csv.reader(f, delimiter='\t')]
+        if path.endswith('.txt'):
+            return [[line.rstrip('\r\n')] for line in f]
+        return [row for row in csv.reader(f)]
+
+
+# function same_field compares two fields, numbers (including those inside lists) to REL_TOL
+def same_field(a, b):
+
+    if a == b:
+        return True
+    na, nb = NUMBER.findall(a), NUMBER.findall(b)
+    if len(na) == 0 or len(na) != len(nb) or NUMBER.sub('#', a) != NUMBER.sub('#', b):
+        return False
+    return all(math.isclose(float(x), float(y), rel_tol=REL_TOL, abs_tol=1e-12) for x, y in zip(na, nb))
+
+
+# function compare_files lists the divergences between two result files, one line each
+def compare_files(expected_path, actual_path, label):
+
+    # no translations are written for a genome without pairs
+    if not os.path.exists(expected_path) and not os.path.exists(actual_path):
+        return list()
+    if not os.path.exists(expected_path) or not os.path.exists(actual_path):
+        missing = expected_path if not os.path.exists(expected_path) else actual_path
+        return ["{0}: {1} is missing".format(label, missing)]
+
+    expected, actual = read_fields(expected_path), read_fields(actual_path)
+    diffs = list()
+    for i in range(0, max(len(expected), len(actual))):
+        row_e = expected[i] if i < len(expected) else []
+        row_a = actual[i] if i < len(actual) else []
+        for j in range(0, max(len(row_e), len(row_a))):
+            e = row_e[j] if j < len(row_e) else '<none>'
+            a = row_a[j] if j < len(row_a) else '<none>'
+            if not same_field(e, a):
+                diffs.append("{0}: {1} row {2} field {3}: expected {4!r}, got {5!r}".format(
+                    label, os.path.basename(actual_path), i + 1, j + 1, e, a))
+    return diffs
+
+
+# function check_genome runs one genome through both sides and returns the divergences and the time of each side
+def check_genome(acc_num, sor_file, gene_file, work_path, params, read_cutoff, max_genes, golden_path=None):
+
+    ref_path = os.path.join(work_path, 'reference', acc_num)
+    opt_path = os.path.join(work_path, 'pipeline', acc_num)
+    for path in (ref_path, opt_path):
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        t = time.perf_counter()
+        reference_detect(acc_num, sor_file, ref_path, params, read_cutoff)
+        reference_annotate(acc_num, gene_file, ref_path, NTOL, max_genes)
+        ref_time = time.perf_counter() - t
+
+        t = time.perf_counter()
+        pipeline_run(acc_num, sor_file, gene_file, opt_path, params, read_cutoff, max_genes)
+        opt_time = time.perf_counter() - t
+
+        # the tight pass matches the same clusters again in a folder of its own on each side
+        near_ref, near_opt = os.path.join(ref_path, 'near'), os.path.join(opt_path, 'near')
+        for path in (near_ref, near_opt):
+            if not os.path.exists(path):
+                os.makedirs(path)
+            shutil.copyfile(os.path.join(ref_path, acc_num + '.csv'), os.path.join(path, acc_num + '.csv'))
+        reference_annotate(acc_num, gene_file, near_ref, NEAR_NTOL, max_genes)
+        annotate_accession(acc_num, gene_file, near_opt, NEAR_NTOL, max_genes, draw_graphs='n', force='y')
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    diffs = list()
+    for name in output_files(acc_num):
+        diffs += compare_files(os.path.join(ref_path, name), os.path.join(opt_path, name), 'reference')
+        if golden_path is not None and os.path.exists(os.path.join(golden_path, name)):
+            diffs += compare_files(os.path.join(golden_path, name), os.path.join(opt_path, name), 'committed')
+    for name in output_files(acc_num)[2:]:
+        diffs += compare_files(os.path.join(near_ref, name), os.path.join(near_opt, name), 'ntol ' + str(NEAR_NTOL))
+    return diffs, ref_time, opt_time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Check the pipeline's results against a plain reference.")
+    parser.add_argument('--synthetic', type=int, default=5, help="number of random genomes to check")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', default=None, help="folder to leave the outputs in (default: a temp folder)")
+    args = parser.parse_args()
+
+    config = load_config(os.path.join(REPO_PATH, 'config.txt'))
+    params = {'nbin_size': config['nbin_size'], 'cbin_size': config['cbin_size'],
+              'cbin_cutoff': config['cbin_cutoff'], 'c_min_sep': config['cluster_min_sep'],
+              'c_max_sep': config['cluster_max_sep'], 'n_min_sep': config['ntpair_min_sep'],
+              'n_max_sep': config['ntpair_max_sep']}
+    max_genes = config['max_genes']
+
+    work_path = args.keep if args.keep is not None else tempfile.mkdtemp(prefix='invcluster_golden_')
+    data_path = os.path.join(work_path, 'data')
+    if not os.path.exists(data_path):
+        os.makedirs(data_path)
+
+    # the bundled genome, copied so its SOR index is not written into the repo
+    genomes = list()
+    sor_file = os.path.join(data_path, BUNDLED + '.csv')
+    shutil.copyfile(os.path.join(REPO_PATH, 'SOR Data', BUNDLED + '.csv'), sor_file)
+    genomes.append((BUNDLED, sor_file, os.path.join(REPO_PATH, 'Gene Data', BUNDLED + '.csv'), BUNDLED_CUTOFF,
+                    os.path.join(REPO_PATH, 'Cluster Data', BUNDLED)))
+
+    rng = np.random.default_rng(args.seed)
+    for k in range(0, args.synthetic):
+        acc_num = 'SYN{0:04d}'.format(k)
+        sor_file = os.path.join(data_path, acc_num + '.csv')
+        read_cutoff = make_synthetic_sor(sor_file, rng)
+        gb_file = os.path.join(data_path, acc_num + '.txt')
+        gene_file = os.path.join(data_path, acc_num + '_genes.csv')
+        make_genbank(gb_file, int(rng.integers(500, 3000)), seed=k)
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        parse_gbflat_genes(gb_file, gene_file)
+        sys.stdout.close()
+        sys.stdout = stdout
+        genomes.append((acc_num, sor_file, gene_file, read_cutoff, None))
+
+    print("{0:<12}{1:>12}{2:>12}{3:>10}{4:>12}".format('genome', 'reference s', 'pipeline s', 'speedup',
+                                                      'divergences'))
+    all_diffs = list()
+    for acc_num, sor_file, gene_file, read_cutoff, golden_path in genomes:
+        diffs, ref_time, opt_time = check_genome(acc_num, sor_file, gene_file, work_path, params, read_cutoff,
+                                                 max_genes, golden_path)
+        print("{0:<12}{1:>12.3f}{2:>12.3f}{3:>9.1f}x{4:>12}".format(acc_num, ref_time, opt_time,
+                                                                   ref_time / max(opt_time, 1e-9), len(diffs)))
+        all_diffs += [acc_num + ' ' + d for d in diffs]
+
+    for d in all_diffs:
+        print(d)
+    if args.keep is None:
+        shutil.rmtree(work_path, ignore_errors=True)
+    if len(all_diffs) > 0:
+        sys.exit("{0} divergences found.".format(len(all_diffs)))
+    print("All outputs match.")
+
+
+if __name__ == "__main__":
+    main()
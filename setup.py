@@ -69,7 +69,7 @@ setup(
     # your project is installed. For an analysis of "install_requires" vs pip's
     # requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
-    install_requires=['seaborn', 'matplotlib', 'Biopython', 'reportlab'],
+    install_requires=['numpy', 'seaborn', 'matplotlib', 'Biopython', 'reportlab', 'requests'],
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). You can install these using the following syntax,
@@ -89,5 +89,10 @@ setup(
     # To provide executable scripts, use entry points in preference to the
     # "scripts" keyword. Entry points provide cross-platform support and allow
     # pip to create the appropriate form of executable for the target platform.
+    entry_points={
+        'console_scripts': [
+            'invcluster=InvCluster.SORCluster.cli:main',
+        ],
+    },
 
 )
@@ -0,0 +1,204 @@
+"""Tests for bam: small SAM and BGZF BAM files are written on the fly, with two references, mixed flags and some
+reads with a TLEN of 0, and the reads counted per contig are checked against what the files hold.
+"""
+
+import gzip
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from InvCluster.SORCluster.bam import BamReader, SamReader, stream_alignment_counts, DEFAULT_FLAG_MASK
+from InvCluster.SORCluster.detect_inversions import SOR
+from InvCluster.SORCluster import cluster_detect
+
+REFERENCES = [('chrI', 5000), ('pB1', 800)]
+
+# (reference, 1-based position, flag, tlen) of every read; reads are named r0, r1, ...
+READS = [('chrI', 100, 99, 250), ('chrI', 100, 147, -250), ('chrI', 101, 0, 0), ('chrI', 350, 83, 180),
+         ('chrI', 350, 0x100 | 83, 180), ('chrI', 350, 0x800 | 83, 180), ('chrI', 4999, 163, 300),
+         ('chrI', 1200, 0x4 | 0x8, 40), ('pB1', 1, 99, 120), ('pB1', 1, 99, 120), ('pB1', 640, 0x400 | 147, -90),
+         ('pB1', 700, 0, 0), ('chrI', 350, 0x10, 50)]
+
+
+# the counts a flag mask should give: reads with a TLEN of 0 or a masked flag bit are skipped
+def expected_counts(flag_mask):
+
+    counts = dict()
+    for name, pos, flag, tlen in READS:
+        if tlen == 0 or flag & flag_mask:
+            continue
+        counts.setdefault(name, dict())
+        counts[name][pos] = counts[name].get(pos, 0) + 1
+    return counts
+
+
+def counts_of(accumulator):
+
+    names, positions, counts, bounds = accumulator.finish()
+    return {name: dict(zip(positions[bounds[k]:bounds[k + 1]].tolist(), counts[bounds[k]:bounds[k + 1]].tolist()))
+            for k, name in enumerate(names) if bounds[k + 1] > bounds[k]}
+
+
+def write_sam(path, reads=READS):
+
+    with open(path, 'w') as f:
+        f.write('@HD\tVN:1.6\tSO:unsorted\n')
+        for name, length in REFERENCES:
+            f.write('@SQ\tSN:{0}\tLN:{1}\n'.format(name, length))
+        for k, (name, pos, flag, tlen) in enumerate(reads):
+            f.write('\t'.join(['r' + str(k), str(flag), name, str(pos), '60', '36M', '=', str(pos), str(tlen),
+                               'ACGT', 'IIII']) + '\n')
+    return path
+
+
+# one BGZF block: a gzip member with the BC extra field holding the block size
+def bgzf_block(data):
+
+    deflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = deflater.compress(data) + deflater.flush()
+    header = struct.pack('<4BI2BH', 31, 139, 8, 4, 0, 0, 255, 6) + b'BC' + struct.pack('<HH', 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def bam_record(ref_id, pos, flag, tlen, read_name):
+
+    name = read_name.encode() + b'\x00'
+    cigar = struct.pack('<I', (4 << 4) | 0)     # 4M
+    seq = b'\x12\x48'                          # ACGT, two bases a byte
+    qual = b'\x28' * 4
+    body = struct.pack('<iiBBHHHiiii', ref_id, pos - 1, len(name), 60, 4680, 1, flag, 4, ref_id, pos - 1, tlen)
+    body += name + cigar + seq + qual
+    return struct.pack('<i', len(body)) + body
+
+
+# writes a BAM whose records are spread over BGZF blocks of block_records records each, so records sit at every
+# offset within the decompressed stream
+def write_bam(path, reads=READS, block_records=3):
+
+    text = ''.join('@SQ\tSN:{0}\tLN:{1}\n'.format(name, length) for name, length in REFERENCES).encode()
+    header = b'BAM\x01' + struct.pack('<i', len(text)) + text + struct.pack('<i', len(REFERENCES))
+    for name, length in REFERENCES:
+        header += struct.pack('<i', len(name) + 1) + name.encode() + b'\x00' + struct.pack('<i', length)
+
+    ref_ids = dict((name, k) for k, (name, length) in enumerate(REFERENCES))
+    records = [bam_record(ref_ids[name], pos, flag, tlen, 'r' + str(k))
+               for k, (name, pos, flag, tlen) in enumerate(reads)]
+
+    with open(path, 'wb') as f:
+        f.write(bgzf_block(header))
+        for i in range(0, len(records), block_records):
+            f.write(bgzf_block(b''.join(records[i:i + block_records])))
+        f.write(bgzf_block(b''))    # the BGZF end-of-file marker
+    return path
+
+
+@pytest.fixture
+def bam_file(tmp_path):
+    return str(write_bam(str(tmp_path / 'SYN.bam')))
+
+
+@pytest.fixture
+def sam_file(tmp_path):
+    return str(write_sam(str(tmp_path / 'SYN.sam')))
+
+
+def test_bam_references(bam_file):
+
+    assert BamReader(bam_file).references == REFERENCES
+
+
+def test_sam_references(sam_file):
+
+    assert SamReader(sam_file).references == REFERENCES
+
+
+@pytest.mark.parametrize('flag_mask', [DEFAULT_FLAG_MASK, 0, 0x400, 0x10 | 0x100])
+def test_bam_counts_per_contig(bam_file, flag_mask):
+
+    accumulator = stream_alignment_counts(bam_file, flag_mask=flag_mask)
+    assert counts_of(accumulator) == expected_counts(flag_mask)
+
+
+@pytest.mark.parametrize('flag_mask', [DEFAULT_FLAG_MASK, 0, 0x400, 0x10 | 0x100])
+def test_sam_counts_per_contig(sam_file, flag_mask):
+
+    accumulator = stream_alignment_counts(sam_file, flag_mask=flag_mask)
+    assert counts_of(accumulator) == expected_counts(flag_mask)
+
+
+def test_count_arrays_sized_from_header(bam_file):
+
+    accumulator = stream_alignment_counts(bam_file)
+    assert len(accumulator.contigs['chrI'].counts) == 5001
+    assert len(accumulator.contigs['pB1'].counts) == 801
+
+
+def test_flag_mask_applied(bam_file, sam_file):
+
+    # the default mask drops the secondary, supplementary and unmapped reads; no mask keeps them
+    for path in (bam_file, sam_file):
+        assert counts_of(stream_alignment_counts(path))['chrI'][350] == 2
+        assert counts_of(stream_alignment_counts(path, flag_mask=0))['chrI'][350] == 4
+        assert 1200 not in counts_of(stream_alignment_counts(path))['chrI']
+
+
+# chunk sizes that split records anywhere, down to a byte at a time: every record is still counted exactly once
+@pytest.mark.parametrize('chunk_bytes', [1, 7, 37, 61, 100, 1 << 22])
+def test_bam_record_split_across_chunks(bam_file, chunk_bytes):
+
+    reader = BamReader(bam_file, chunk_bytes=chunk_bytes)
+    ref_ids, positions = zip(*reader.chunks())
+    ref_ids, positions = np.concatenate(ref_ids), np.concatenate(positions)
+
+    kept = [(name, pos) for name, pos, flag, tlen in READS if tlen != 0 and not flag & DEFAULT_FLAG_MASK]
+    assert sorted(zip([REFERENCES[r][0] for r in ref_ids.tolist()], positions.tolist())) == sorted(kept)
+
+
+def test_truncated_bam(tmp_path):
+
+    # a file cut off partway through its last record
+    path = str(tmp_path / 'SYN.bam')
+    write_bam(path, READS[:4], block_records=4)
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(bgzf_block(data[:-10]))
+
+    reader = BamReader(path, chunk_bytes=16)
+    with pytest.raises(ValueError, match='Truncated'):
+        list(reader.chunks())
+
+
+@pytest.mark.parametrize('chunk_lines', [1, 2, 5, 1 << 16])
+def test_sam_chunk_lines(sam_file, chunk_lines):
+
+    reader = SamReader(sam_file, chunk_lines=chunk_lines)
+    total = sum(len(positions) for ref_ids, positions in reader.chunks())
+    assert total == sum(sum(c.values()) for c in expected_counts(DEFAULT_FLAG_MASK).values())
+
+
+def test_sam_reference_missing_from_header(tmp_path):
+
+    path = write_sam(str(tmp_path / 'SYN.sam'), READS + [('pX', 12, 99, 60), ('*', 0, 4, 60)])
+    counts = counts_of(stream_alignment_counts(path))
+    assert counts['pX'] == {12: 1}
+    assert '*' not in counts
+
+
+# pool workers load the SOR again on their own; they have to use the flag mask and ignored positions of the SOR
+# they stand in for
+def test_worker_loads_with_caller_settings(bam_file):
+
+    SOR_bug = SOR('SYN', bam_file, index='n', flag_mask=0, ignore=[4999])
+    cluster_detect._init_worker(*cluster_detect.worker_args(SOR_bug, bam_file))
+    worker = cluster_detect._worker_sor
+
+    assert worker.flag_mask == 0 and worker.index == 'n'
+    for contig in SOR_bug.contig_names:
+        SOR_bug.select_contig(contig)
+        worker.select_contig(contig)
+        assert worker.positions.tolist() == SOR_bug.positions.tolist()
+        assert worker.counts.tolist() == SOR_bug.counts.tolist()
+    assert 4999 not in worker.positions.tolist()
@@ -0,0 +1,94 @@
+"""Tests for ingest: per-position counts built chunk by chunk must equal counting all the reads at once.
+"""
+
+import numpy as np
+import pytest
+
+from InvCluster.SORCluster.ingest import CountAccumulator, ContigAccumulator, stream_sor_counts
+
+
+def all_at_once(chunks):
+
+    positions = np.concatenate([np.asarray(c, dtype=np.int64) for c in chunks])
+    return np.bincount(positions[positions >= 0])
+
+
+def test_chunk_of_negative_positions_only():
+
+    accumulator = CountAccumulator(10)
+    accumulator.add(np.array([-5, -1]))
+    assert accumulator.reads == 0
+    assert accumulator.counts.sum() == 0
+
+
+def test_negative_positions_dropped():
+
+    accumulator = CountAccumulator(10)
+    accumulator.add(np.array([-3, 4, 4, 7]))
+    assert accumulator.reads == 3
+    assert accumulator.counts[4] == 2 and accumulator.counts[7] == 1
+
+
+def test_empty_chunk():
+
+    accumulator = CountAccumulator(10)
+    accumulator.add(np.array([], dtype=np.int64))
+    assert accumulator.reads == 0
+
+
+# sorted narrow chunks go through bincount over their span, scattered ones through np.add.at; both have to agree
+# with counting everything at once, including chunks past the end of the array that make it grow
+@pytest.mark.parametrize('genome_length', [0, 1000, 10 ** 6])
+def test_chunks_match_counting_at_once(genome_length):
+
+    rng = np.random.default_rng(7)
+    chunks = list()
+    for k in range(0, 12):
+        if k % 3 == 0:
+            chunks.append(rng.integers(0, 10 ** 6, 2000))
+        else:
+            start = int(rng.integers(0, 10 ** 6 - 5000))
+            chunks.append(np.sort(rng.integers(start, start + 5000, 2000)))
+
+    accumulator = CountAccumulator(genome_length)
+    for chunk in chunks:
+        accumulator.add(chunk)
+
+    expected = all_at_once(chunks)
+    assert accumulator.reads == expected.sum()
+    assert np.array_equal(accumulator.counts[:len(expected)], expected)
+    assert accumulator.counts[len(expected):].sum() == 0
+    assert accumulator.counts.dtype == np.uint32
+
+
+def test_merge():
+
+    a, b = CountAccumulator(5), CountAccumulator(50)
+    a.add([1, 2, 2])
+    b.add([2, 40])
+    a.merge(b)
+    positions, counts = a.finish()
+    assert positions.tolist() == [1, 2, 40] and counts.tolist() == [1, 3, 1]
+    assert a.reads == 5
+
+
+# contigs are kept in the order the file first names them, not sorted, so the first contig is the file's first
+def test_contigs_in_first_seen_order():
+
+    accumulator = ContigAccumulator()
+    accumulator.add(np.array(['pB1', 'chrII', 'pB1', 'chrI']), np.array([5, 6, 7, 8]))
+    accumulator.add(np.array(['chrI', 'aux']), np.array([9, 10]))
+    names, positions, counts, bounds = accumulator.finish()
+    assert names == ['pB1', 'chrII', 'chrI', 'aux']
+    assert positions[bounds[0]:bounds[1]].tolist() == [5, 7]
+    assert positions[bounds[2]:bounds[3]].tolist() == [8, 9]
+
+
+def test_stream_sor_counts_contig_order(tmp_path):
+
+    sor_file = str(tmp_path / 'SYN.csv')
+    with open(sor_file, 'w') as f:
+        f.write('"","RNAME","POS","TLEN"\n"1","plasmid",10,100\n"2","chromosome",20,100\n"3","plasmid",10,0\n')
+    names, positions, counts, bounds = stream_sor_counts(sor_file).finish()
+    assert names == ['plasmid', 'chromosome']
+    assert counts.tolist() == [1, 1]
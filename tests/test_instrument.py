@@ -0,0 +1,76 @@
+"""Tests for instrument: spans recorded in pool workers end up in the parent's report, filed under the parent's
+open span.
+"""
+
+import os
+import csv
+
+import numpy as np
+import pytest
+
+from InvCluster.SORCluster import instrument
+from InvCluster.SORCluster.instrument import span, spans, reset, write_report
+from InvCluster.SORCluster.detect_inversions import SOR
+from InvCluster.SORCluster.cluster_detect import analyze_windows
+
+CLUSTER_SETTING = (40, 98, 100, 1000, 50, 1000, 1)
+
+
+# a SOR csv with an inversion pair in each of three 5 kb windows, over light background reads
+def write_sor(path):
+
+    rng = np.random.default_rng(3)
+    pos = [rng.integers(1, 15000, 600)]
+    for start in (1200, 6300, 11800):
+        pos.append(np.repeat([start, start + 400], [120, 110]))
+    pos = np.concatenate(pos)
+    with open(path, 'w') as f:
+        f.write('"","POS","TLEN"\n')
+        f.write(''.join('"{0}",{1},150\n'.format(k, p) for k, p in enumerate(pos.tolist())))
+    return path
+
+
+@pytest.fixture
+def sor_bug(tmp_path):
+
+    reset()
+    sor_file = write_sor(str(tmp_path / 'SYN.csv'))
+    yield SOR('SYN', sor_file, index='n', verbose='n'), sor_file
+    reset()
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_cluster_spans_reported(sor_bug, jobs):
+
+    SOR_bug, sor_file = sor_bug
+    windows = [(0.0, 5000.0), (5000.0, 10000.0), (10000.0, 15000.0)]
+    with span('detect', 'SYN'):
+        results = analyze_windows(SOR_bug, sor_file, windows, CLUSTER_SETTING, jobs, verbose='n')
+
+    assert [r['is_pair'] for r in results] == ['Y', 'Y', 'Y']
+    cluster = [r for r in spans() if r['stage'] == 'detect/cluster']
+    assert len(cluster) == len(windows)
+    assert all(r['accession'] == 'SYN' for r in cluster)
+    if jobs > 1:
+        assert all(r['pid'] != os.getpid() for r in cluster)
+
+
+def test_add_spans_under_parent():
+
+    reset()
+    instrument.add_spans([{'accession': 'A', 'stage': 'cluster', 'wall_s': 1.0, 'cpu_s': 1.0, 'peak_rss_mb': 1.0}],
+                         'detect')
+    assert [r['stage'] for r in spans()] == ['detect/cluster']
+    reset()
+
+
+def test_report_heads_peak_as_process_wide(tmp_path):
+
+    reset()
+    with span('detect', 'SYN'):
+        pass
+    csv_file = write_report(str(tmp_path / '__run_report.json'))
+    with open(csv_file, 'r', newline='') as f:
+        header = next(csv.reader(f))
+    assert 'process_peak_rss_mb_so_far' in header and 'peak_rss_mb' not in header
+    reset()
@@ -0,0 +1,127 @@
+"""Tests for GenBank locations: parse_location on the location forms CDS records use, parse_gbflat_genes on a
+location written over several lines, and gene matching for a gene in pieces across the origin of a circular genome.
+"""
+
+import csv
+
+import pytest
+
+from InvCluster.SORCluster.cluster_tools import Bug, parse_location, parse_gbflat_genes, find_nearby_genes
+
+GENOME_LENGTH = 100000
+
+# location: (segments, is_complement, partial)
+LOCATIONS = [
+    ('100..200', ([(100, 200)], 'N', '')),
+    ('complement(100..200)', ([(100, 200)], 'Y', '')),
+    ('467', ([(467, 467)], 'N', '')),
+    ('102^103', ([(102, 103)], 'N', '')),
+    ('102.110', ([(102, 110)], 'N', '')),
+    ('<1..206', ([(1, 206)], 'N', '<')),
+    ('100..>200', ([(100, 200)], 'N', '>')),
+    ('complement(<100..>200)', ([(100, 200)], 'Y', '<>')),
+    ('join(1..100,200..300)', ([(1, 100), (200, 300)], 'N', '')),
+    ('join(<1..206,4000..4312)', ([(1, 206), (4000, 4312)], 'N', '<')),
+    ('complement(join(1..100,200..300))', ([(1, 100), (200, 300)], 'Y', '')),
+    ('join(complement(200..300),complement(1..100))', ([(200, 300), (1, 100)], 'Y', '')),
+    ('order(1..100,200..>300)', ([(1, 100), (200, 300)], 'N', '>')),
+    ('join(4000..4641652,1..200)', ([(4000, 4641652), (1, 200)], 'N', '')),
+    # pieces on other records are left out
+    ('order(1..100,AB000001.1:5..50,200..300)', ([(1, 100), (200, 300)], 'N', '')),
+    ('join(AB000001.1:5..50,200..300)', ([(200, 300)], 'N', '')),
+]
+
+BAD_LOCATIONS = ['', 'foo', 'complement(100..200', 'join(1..100,)', 'join 1..100', 'AB000001.1:5..50']
+
+
+@pytest.mark.parametrize('location, expected', LOCATIONS)
+def test_parse_location(location, expected):
+    assert parse_location(location) == expected
+
+
+@pytest.mark.parametrize('location', BAD_LOCATIONS)
+def test_parse_location_unreadable(location):
+    assert parse_location(location) is None
+
+
+# a GenBank file with one CDS per location; each location is given as the lines it is written over
+def write_genbank(path, locations):
+
+    q = '                     '     # qualifier indent
+    with open(path, 'w') as f:
+        f.write('LOCUS       SYN000001  {0} bp    DNA     circular BCT 01-JAN-2020\n'.format(GENOME_LENGTH))
+        f.write('FEATURES             Location/Qualifiers\n')
+        for k, lines in enumerate(locations):
+            tag = 'SYN_{0:04d}'.format(k)
+            f.write('     gene            {0}\n{1}/locus_tag="{2}"\n'.format(''.join(lines), q, tag))
+            f.write('     CDS             {0}\n'.format(lines[0]))
+            f.write(''.join(q + line + '\n' for line in lines[1:]))
+            f.write('{0}/locus_tag="{1}"\n{0}/product="protein {2}"\n'.format(q, tag, k))
+            f.write('{0}/protein_id="SYN{1:04d}.1"\n{0}/translation="MKV"\n'.format(q, k))
+        f.write('ORIGIN\n//\n')
+    return path
+
+
+def parsed_genes(tmp_path, locations):
+
+    gene_file = str(tmp_path / 'SYN_genes.csv')
+    parse_gbflat_genes(write_genbank(str(tmp_path / 'SYN.txt'), locations), gene_file)
+    with open(gene_file, 'r') as f:
+        return list(csv.DictReader(f))
+
+
+def test_location_over_several_lines(tmp_path):
+
+    rows = parsed_genes(tmp_path, [['complement(join(1000..1200,1300..1400,', '1500..1600,<1700..1800,',
+                                    '1900..>2000))'],
+                                   ['3000..3900']])
+
+    assert [row['locus_tag'] for row in rows] == ['SYN_0000', 'SYN_0001']
+    assert (rows[0]['loc_start'], rows[0]['loc_end'], rows[0]['is_complement']) == ('1000', '2000', 'Y')
+    assert rows[0]['segments'] == '1000..1200;1300..1400;1500..1600;1700..1800;1900..2000'
+    assert rows[0]['partial'] == '<>'
+    assert (rows[1]['loc_start'], rows[1]['loc_end'], rows[1]['segments']) == ('3000', '3900', '3000..3900')
+
+
+def test_gene_across_origin_parsed(tmp_path):
+
+    rows = parsed_genes(tmp_path, [['join(99001..{0},1..600)'.format(GENOME_LENGTH)]])
+    assert (rows[0]['loc_start'], rows[0]['loc_end']) == ('1', str(GENOME_LENGTH))
+    assert rows[0]['segments'] == '99001..{0};1..600'.format(GENOME_LENGTH)
+
+
+# a circular genome with a gene across the origin, listed first or last, and single genes every 10 kb
+def origin_bug(tmp_path, origin_first):
+
+    header = ['loc_start', 'loc_end', 'is_complement', 'locus_tag', 'gene', 'protein_id', 'product', 'translation',
+              'contig', 'segments', 'partial']
+    origin = [1, GENOME_LENGTH, 'N', 'ORI', 'dnaX', 'P0', 'origin protein', 'MKV', '',
+              '99001..{0};1..600'.format(GENOME_LENGTH), '']
+    genes = [[k * 10000 + 1000, k * 10000 + 1900, 'N', 'G{0}'.format(k), 'N/A', 'P{0}'.format(k), 'protein', 'MKV',
+              '', '{0}..{1}'.format(k * 10000 + 1000, k * 10000 + 1900), ''] for k in range(1, 9)]
+
+    gene_file = str(tmp_path / 'SYN_genes.csv')
+    with open(gene_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows([origin] + genes if origin_first else genes + [origin])
+    bug = Bug(accession_num='SYN')
+    bug.load_genes_from_file(gene_file)
+    return bug
+
+
+# the gene across the origin spans loc_start 1 to loc_end at the genome end, but is only near the clusters close to
+# one of its two pieces; wherever it is listed in the file, it must not hide the genes in between either
+@pytest.mark.parametrize('origin_first', [True, False])
+@pytest.mark.parametrize('cluster, loci', [
+    ((300, 400), ['ORI']),                          # near the piece after the origin
+    ((99500, 99600), ['ORI']),                      # near the piece before it
+    ((1500, 1600), ['ORI']),                        # within ntol of the end of the 1..600 piece
+    ((50000, 50100), ['G5']),                       # in the middle of the genome, inside loc_start..loc_end
+    ((20500, 20600), ['G2']),
+    ((5000, 5100), ['No nearby loci']),
+])
+def test_gene_across_origin_hits(tmp_path, origin_first, cluster, loci):
+
+    bug = origin_bug(tmp_path, origin_first)
+    assert find_nearby_genes(bug, cluster, ntol=2000, max_genes=5)[0] == loci
@@ -0,0 +1,77 @@
+"""Tests for poisson_log10_sf against the Poisson tail summed term by term with math, in the series region (mu below
+k + 1), the continued fraction region, right at the switch between them, and deep in the tail where 1 - CDF is far
+below the smallest float.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from InvCluster.SORCluster.detect_inversions import poisson_log10_sf
+
+
+# log10 P(X >= k) for X ~ Poisson(mu): one minus the CDF when the CDF is small enough to sum exactly, otherwise the
+# tail terms added up in logs
+def reference_log10_sf(k, mu):
+
+    if k == 0:
+        return 0.0
+    if mu > k:
+        cdf = math.fsum(math.exp(-mu + j * math.log(mu) - math.lgamma(j + 1)) for j in range(0, k))
+        return math.log1p(-cdf) / math.log(10)
+
+    terms = [-mu + j * math.log(mu) - math.lgamma(j + 1) for j in range(k, k + int(mu) + 2000)]
+    top = max(terms)
+    return (top + math.log(math.fsum(math.exp(t - top) for t in terms))) / math.log(10)
+
+
+def sf(k, mu):
+    return float(poisson_log10_sf(np.array([k]), np.array([mu]))[0])
+
+
+@pytest.mark.parametrize('k', [0, 1, 2, 3, 5, 8, 13])
+@pytest.mark.parametrize('mu', [0.01, 0.3, 1.0, 2.5, 6.0, 20.0])
+def test_small_counts(k, mu):
+
+    assert sf(k, mu) == pytest.approx(reference_log10_sf(k, mu), rel=1e-9, abs=1e-12)
+
+
+# the series is used for mu < k + 1 and the continued fraction from there on; both sides of the switch must agree
+# with the reference and with each other
+@pytest.mark.parametrize('k', [1, 4, 30, 250, 2000])
+def test_switch_boundary(k):
+
+    for mu in (k + 1 - 1e-9, k + 1.0, k + 1 + 1e-9, k + 0.5, k + 1.5):
+        assert sf(k, mu) == pytest.approx(reference_log10_sf(k, mu), rel=1e-9, abs=1e-12)
+    assert sf(k, k + 1 - 1e-9) == pytest.approx(sf(k, k + 1 + 1e-9), rel=1e-6, abs=1e-9)
+
+
+# strong signals: the probability underflows a float, but its log is still exact
+@pytest.mark.parametrize('k, mu', [(400, 1.0), (1000, 0.05), (5000, 12.0), (3000, 300.0), (300, 1e-4)])
+def test_deep_tail(k, mu):
+
+    direct = math.fsum(math.exp(-mu + j * math.log(mu) - math.lgamma(j + 1)) for j in range(k, k + 200))
+    expected = reference_log10_sf(k, mu)
+    assert direct == 0.0 or expected < -300
+    assert sf(k, mu) == pytest.approx(expected, rel=1e-9)
+
+
+# counts far below the mean: P(X >= k) is nearly one and its log nearly zero
+@pytest.mark.parametrize('k, mu', [(1, 50.0), (3, 40.0), (10, 200.0), (100, 400.0)])
+def test_far_below_mean(k, mu):
+
+    result = sf(k, mu)
+    assert result <= 0.0
+    assert result == pytest.approx(reference_log10_sf(k, mu), rel=1e-9, abs=1e-15)
+
+
+# a mix of both regions and of zero counts in one call gives what each does on its own
+def test_arrays_mix_regions():
+
+    k = np.array([0, 3, 500, 7, 1, 60, 0])
+    mu = np.array([2.0, 0.5, 3.0, 7.5, 9.0, 61.0, 0.1])
+    result = poisson_log10_sf(k, mu)
+    assert result.tolist() == pytest.approx([reference_log10_sf(int(a), float(b)) for a, b in zip(k, mu)],
+                                            rel=1e-9, abs=1e-12)
+    assert result[0] == 0.0 and result[6] == 0.0